@@ -1,9 +1,17 @@
-from flask import Flask
-from views import views
-
-app = Flask(__name__)
-app.register_blueprint(views, url_prefix="/")
-
-if __name__ == '__main__':
-    app.run(debug=True)
-
+import os
+
+from flask import Flask
+from views import views
+
+#DND_DATABASE=sqlite runs against the SQL dumps loaded into memory instead of a MySQL server
+if os.environ.get("DND_DATABASE") == "sqlite":
+    from connections import configure_pool
+    from sql_loader import load_dumps
+    configure_pool(connect=load_dumps().connect)
+
+app = Flask(__name__)
+app.register_blueprint(views, url_prefix="/")
+
+if __name__ == '__main__':
+    app.run(debug=True)
+
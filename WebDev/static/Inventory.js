@@ -20,21 +20,22 @@ armorButton.onclick = function() {
 
     if (newArmor.trim() !== "") {
 
-        fetch('/api/armordata')
+        fetch(`/api/armordata?armorInput=${encodeURIComponent(newArmor)}`)
             .then(response => response.json())
             .then(data => {
-            let newArmorData = `Result:${data.result}`;
-        })
+            //result is the best matching row as an array (id, name, ...), null when nothing matched
+            let newArmorData = data.result;
 
-        let newItem = document.createElement("li");
-        newItem.textContent = newArmorData[1];
+            let newItem = document.createElement("li");
+            newItem.textContent = newArmorData ? newArmorData[1] : newArmor;
+            armorList.append(newItem);
+        })
         
 /*
         let newItem = document.createElement("li");
         newItem.textContent = newArmor;
 */
 
-        armorList.append(newItem);
 
         armorInput.value = "";
 
@@ -55,22 +56,23 @@ weaponButton.onclick = function() {
     
     if (newWeapon.trim() !== "") {
 
-        fetch('/api/weapondata')
+        fetch(`/api/weapondata?weaponInput=${encodeURIComponent(newWeapon)}`)
             .then(response => response.json())
             .then(data => {
-            let newWeaponData = `Result:${data.result}`;
-        })
+            //result is the best matching row as an array (id, name, ...), null when nothing matched
+            let newWeaponData = data.result;
 
+            let newItem = document.createElement("li");
+            newItem.textContent = newWeaponData ? newWeaponData[1] : newWeapon;
+            weaponList.append(newItem);
+        })
         
-        let newItem = document.createElement("li");
-        newItem.textContent = newWeaponData[1];
         
 
 /*
         let newItem = document.createElement("li");
         newItem.textContent = newWeapon;
 */
-        weaponList.append(newItem);
 
         weaponInput.value = "";
 
@@ -92,15 +94,17 @@ consumableButton.onclick = function() {
     
     if (newConsumable.trim() !== "") {
 
-        fetch('/api/consumabledata')
+        fetch(`/api/consumabledata?consumableInput=${encodeURIComponent(newConsumable)}`)
             .then(response => response.json())
             .then(data => {
-            let newConsumableData = `Result:${data.result}`;
-        })
+            //result is the best matching row as an array (id, name, ...), null when nothing matched
+            let newConsumableData = data.result;
 
+            let newItem = document.createElement("li");
+            newItem.textContent = newConsumableData ? newConsumableData[1] : newConsumable;
+            consumableList.append(newItem);
+        })
         
-        let newItem = document.createElement("li");
-        newItem.textContent = newConsumableData[1];
         
 
 /*
@@ -108,7 +112,6 @@ consumableButton.onclick = function() {
         newItem.textContent = newConsumable;
 */
 
-        consumableList.append(newItem);
 
         consumableInput.value = "";
 
@@ -130,15 +133,17 @@ consumableButton.onclick = function() {
         
         if (newGear.trim() !== "") {
     
-            fetch('/api/equipmentdata')
+            fetch(`/api/equipmentdata?equipmentInput=${encodeURIComponent(newGear)}`)
             .then(response => response.json())
             .then(data => {
-            let newEquipmentData = `Result:${data.result}`;
-        })
+            //result is the best matching row as an array (id, name, ...), null when nothing matched
+            let newEquipmentData = data.result;
 
+            let newItem = document.createElement("li");
+            newItem.textContent = newEquipmentData ? newEquipmentData[1] : newGear;
+            gearList.append(newItem);
+        })
         
-        let newItem = document.createElement("li");
-        newItem.textContent = newEquipmentData[1];
         
 
 /*
@@ -146,7 +151,6 @@ consumableButton.onclick = function() {
             newItem.textContent = newGear;
 */
     
-            gearList.append(newItem);
     
             gearInput.value = "";
     
@@ -238,15 +242,17 @@ consumableButton.onclick = function() {
         
         if (newTools.trim() !== "") {
     
-            fetch('/api/magicdata')
+            fetch(`/api/magicdata?toolsInput=${encodeURIComponent(newTools)}`)
             .then(response => response.json())
             .then(data => {
-            let newMagicData = `Result:${data.result}`;
-        })
+            //result is the best matching row as an array (id, name, ...), null when nothing matched
+            let newMagicData = data.result;
 
+            let newItem = document.createElement("li");
+            newItem.textContent = newMagicData ? newMagicData[1] : newTools;
+            toolsList.append(newItem);
+        })
         
-        let newItem = document.createElement("li");
-        newItem.textContent = newMagicData[1];
         
 
 /*
@@ -254,7 +260,6 @@ consumableButton.onclick = function() {
             newItem.textContent = newTools;
 */
 
-            toolsList.append(newItem);
     
             toolsInput.value = "";
     
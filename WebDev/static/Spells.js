@@ -26,51 +26,55 @@ add.onclick = function() {
         let newSpellEntry = document.createElement("li");
 
         //this will fetch the python function
-       fetch('/api/spelldata')
+       fetch(`/api/spelldata?spellInput=${encodeURIComponent(newSpell)}`)
             .then(response => response.json())
             .then(data => {
-                let newSpellData = `Result:${data.result}`;
-            })
+            //result is the best matching row as an array (id, name, level, school, casting_time, range, duration, ...)
+            let newSpellData = data.result;
+            if (!newSpellData) {
+                alert("Spell not found.");
+                return;
+            }
 
-            
-        newSpellEntry.textContent = newSpellData[1]; //POSSIBLE FOR IF WE USE AN ARRAY FOR ONE 
-        spells.append(newSpellEntry);
+            newSpellEntry.textContent = newSpellData[1]; //POSSIBLE FOR IF WE USE AN ARRAY FOR ONE 
+            spells.append(newSpellEntry);
 
         
-        let newLevelEntry = document.createElement("li");
+            let newLevelEntry = document.createElement("li");
 
-        newLevelEntry.textContent = newSpellData[2];  
-        levels.append(newLevelEntry);
+            newLevelEntry.textContent = newSpellData[2];  
+            levels.append(newLevelEntry);
 
 
-        let newCastEntry = document.createElement("li");
+            let newCastEntry = document.createElement("li");
 
-        newCastEntry.textContent = newSpellData[4];  
-        casts.append(newCastEntry);
+            newCastEntry.textContent = newSpellData[4];  
+            casts.append(newCastEntry);
 
 
-        let newDurationEntry = document.createElement("li");
+            let newDurationEntry = document.createElement("li");
 
-        newDurationEntry.textContent = newSpellData[6];  
-        durations.append(newDurationEntry);
+            newDurationEntry.textContent = newSpellData[6];  
+            durations.append(newDurationEntry);
 
 
-        let newRangeEntry = document.createElement("li");
+            let newRangeEntry = document.createElement("li");
 
-        newRangeEntry.textContent = newSpellData[5];  
-        ranges.append(newRangeEntry);
+            newRangeEntry.textContent = newSpellData[5];  
+            ranges.append(newRangeEntry);
 
 
-        let newSaveEntry = document.createElement("li");
+            let newSaveEntry = document.createElement("li");
 
-        newSaveEntry.textContent = newSpellData[11];  
-        saves.append(newSaveEntry);
+            newSaveEntry.textContent = newSpellData[11];  
+            saves.append(newSaveEntry);
 
 
-        let newAffectEntry = document.createElement("li");
+            let newAffectEntry = document.createElement("li");
 
-        newAffectEntry.textContent = newSpellData[12];  
-        affects.append(newAffectEntry);
+            newAffectEntry.textContent = newSpellData[12];  
+            affects.append(newAffectEntry);
+        })
         
 
         newEntry.textContent = newSpell;
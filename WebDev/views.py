@@ -1,98 +1,449 @@
-from flask import Blueprint, render_template, redirect, url_for, jsonify, request
-
-'''importing database connections functions to access in the java script will go under here'''
-from connections import get_info_equipment, get_info_armor_shields, get_info_weapons, get_info_consumables, get_info_spells, get_info_magic_items
-from diceroller import roll_dice
-
-
-views = Blueprint(__name__, "views")
-
-'''Routes to different pages here'''
-
-
-'''home page'''
-@views.route("/")
-def home():
-    return render_template("Home.html")
-
-    '''spells page'''
-@views.route("/spells")
-def spells():
-    return render_template("Spells.html")
-
-    '''characters page
-@views.route("/characters")
-def characters():
-    return render_template("Characters.html")
-    '''
-
-    '''inventory page'''
-@views.route("/inventory")
-def inventory():
-    return render_template("Inventory.html")
-
-    '''encounters page'''
-@views.route("/encounters")
-def encounters():
-    return render_template("Encounters.html")
-
-    '''dice roller page'''
-@views.route("/diceroller")
-def diceRoller():
-    return render_template("DiceRoll.html")
-
-
-'''putting the routes to the connection functions here to access in js files'''
-
-@views.route("/api/equipmentdata" methods = ['GET'])
-def equipment():
-     data = request.get_json()
-     equipment = data.get('equipmentInput')
-     result = get_info_equipment()
-     return jsonify({'result' : result})
-
-@views.route("/api/armordata" methods = ['GET'])
-def armor():
-    data = request.get_json()
-    armor = data.get('armorInput')
-    result = get_info_armor_shields() 
-    return jsonify({'result' : result})
-
-@views.route("/api/weapondata" methods = ['GET'])
-def weapon():
-    data = request.get_json()
-    weapon = data.get('weaponInput')
-    result = get_info_weapons() 
-    return jsonify({'result' : result})
-
-@views.route("/api/consumabledata" methods = ['GET'])
-def consumable():
-    data = request.get_json()
-    consumable = data.get('consumableInput')
-    result = get_info_consumables()
-    return jsonify({'result' : result})
-
-@views.route("/api/spelldata" methods = ['GET'])
-def spell():
-    data = request.get_json()
-    spell = data.get('spellInput')
-    result = get_info_spells() 
-    return jsonify({'result' : result})
-
-@views.route("/api/magicdata" methods = ['GET'])
-def spell():
-    data = request.get_json()
-    spell = data.get('toolsInput')
-    result = get_info_magic_items() 
-    return jsonify({'result' : result})
-
-
-'''route to the diceroller function'''
-
-@views.route("/api/rollingdice" methods = ['GET'])
-def roll():
-    data = request.get_json()
-    dice = data.get('diceInput')
-    num = data.get('amountDice')
-    result = roll_dice(dice)
-    return jsonify({'result' : result})
\ No newline at end of file
+import time
+import zlib
+
+from flask import Blueprint, Response, render_template, redirect, url_for, request, stream_with_context, g
+
+'''importing database connections functions to access in the java script will go under here'''
+from connections import get_info_equipment, get_info_armor_shields, get_info_weapons, get_info_consumables, get_info_spells, get_info_magic_items, get_info_monsters
+from connections import iter_matches, page_matches, search_reference, find_by_name, monster_attacks
+from diceroller import roll_dice, dice_odds
+from encounter_sim import simulate, party_member, build_monsters
+from request_metrics import metrics, timed
+from concurrent_lookup import search_tables, ITEM_TABLES, SEARCHABLE_TABLES
+from character_store import store as character_store
+from encounter_builder import build_encounters, MAX_BUDGET
+from serialization import dumps, encodings, compress, encoded_row, result_body, table_version, encoded_snapshot, MIN_COMPRESS_SIZE
+import connections
+
+
+views = Blueprint(__name__, "views")
+
+'''page sizes for the paginated lookups'''
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+
+'''limits for the encounter simulator'''
+DEFAULT_COMBATS = 5000
+MAX_COMBATS = 100000
+MAX_SIMULATION_WORKERS = 8
+MONSTER_SUGGESTIONS = 5
+
+'''limits for the encounter builder'''
+DEFAULT_ENCOUNTERS = 20
+MAX_ENCOUNTERS = 200
+
+'''limits for the combined search'''
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 100
+
+'''browser caching of the reference data, it only changes when the dump is re-imported
+lookups and unversioned snapshots are kept a few minutes then revalidated with their ETag,
+a snapshot fetched with ?v=<current version> never changes'''
+LOOKUP_MAX_AGE = 300
+SNAPSHOT_MAX_AGE = 31536000
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css", "application/javascript")
+
+
+'''timing for every request on this blueprint, the phases inside it are timed where they happen
+streamed responses are timed up to the first byte, the rows are generated after this runs'''
+@views.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@views.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.observe('request', time.perf_counter() - start,
+                        endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+
+'''gzip (or brotli when installed) for anything big enough that the client accepts,
+streams and responses that already picked an encoding (snapshots) are left alone'''
+@views.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = request.accept_encodings.best_match(encodings())
+    if encoding is None:
+        return response
+
+    with timed('compress', encoding=encoding):
+        response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def render_page(template):
+    with timed('render_template', template=template):
+        return render_template(template)
+
+def respond(payload, status=200):
+    with timed('serialize', stage='response'):
+        return json_response(dumps(payload), status)
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype="application/json")
+
+'''ETag for a reference table response: the table's version plus what was asked for'''
+def reference_etag(table):
+    version = table_version(connections.reference.table(table))
+    asked = zlib.crc32(request.query_string + request.get_data(cache=True))
+    return f"{version}-{asked:08x}"
+
+def not_modified(etag, max_age):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+def cacheable(response, etag, max_age):
+    response.set_etag(etag, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+'''Routes to different pages here'''
+
+
+'''home page'''
+@views.route("/")
+def home():
+    return render_page("Home.html")
+
+    '''spells page'''
+@views.route("/spells")
+def spells():
+    return render_page("Spells.html")
+
+    '''characters page
+@views.route("/characters")
+def characters():
+    return render_template("Characters.html")
+    '''
+
+    '''inventory page'''
+@views.route("/inventory")
+def inventory():
+    return render_page("Inventory.html")
+
+    '''encounters page'''
+@views.route("/encounters")
+def encounters():
+    return render_page("Encounters.html")
+
+    '''dice roller page'''
+@views.route("/diceroller")
+def diceRoller():
+    return render_page("DiceRoll.html")
+
+
+'''reads a field from the query string, falling back to a json body'''
+def request_value(field, default=None):
+    return request.args.get(field, request_json().get(field, default))
+
+'''the json body parsed once per request'''
+def request_json():
+    if 'json_body' not in g:
+        with timed('parse_json'):
+            g.json_body = request.get_json(silent=True) or {}
+    return g.json_body
+
+
+'''
+shared by every lookup route
+    no paging options        -> {'result': best match as a row array}
+    page_size and/or after   -> {'results': [...], 'next': id to pass as after for the next page}
+    stream=1                 -> every match as json lines, read from the cursor as they come
+the reference tables answer with an ETag and can come back as 304 Not Modified
+'''
+def lookup(table, field, get_info):
+    user_input = request_value(field) or ""
+    after = request_value('after')
+    page_size = request_value('page_size')
+    stream = request_value('stream')
+
+    try:
+        after = int(after) if after not in (None, "") else None
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE)) if page_size not in (None, "") else None
+    except ValueError:
+        return respond({'error' : "after and page_size must be whole numbers."}, 400)
+
+    etag = None
+    if table in connections.reference.tables:
+        try:
+            etag = reference_etag(table)
+        except Exception:
+            #  the table didn't load, answer uncached so the lookup below reports it the way it always has
+            etag = None
+        if etag is not None and request.if_none_match.contains_weak(etag):
+            return not_modified(etag, LOOKUP_MAX_AGE)
+
+    if stream not in (None, "", "0", "false"):
+        def rows():
+            for row in iter_matches(table, user_input, after_id=after):
+                yield dumps(row) + b"\n"
+        response = Response(stream_with_context(rows()), mimetype="application/x-ndjson")
+    elif after is not None or page_size is not None:
+        with timed('lookup', table=table, mode='page'):
+            results, next_after = page_matches(table, user_input, after, page_size or DEFAULT_PAGE_SIZE)
+        response = respond({'results' : results, 'next' : next_after})
+    else:
+        #  the row was encoded once when the table loaded (consumables come back as json text),
+        #  either way it's spliced into the response without another round of encoding
+        with timed('lookup', table=table, mode='single'):
+            if etag is not None:
+                record = search_reference(table, user_input, limit=1)
+                encoded = encoded_row(connections.reference.table(table), record[0]) if record else None
+            else:
+                encoded = get_info(user_input)
+        response = json_response(result_body(encoded))
+
+    if etag is not None:
+        cacheable(response, etag, LOOKUP_MAX_AGE)
+    return response
+
+
+'''putting the routes to the connection functions here to access in js files'''
+
+@views.route("/api/equipmentdata", methods = ['GET'])
+def equipment():
+    return lookup('equipment', 'equipmentInput', get_info_equipment)
+
+@views.route("/api/armordata", methods = ['GET'])
+def armor():
+    return lookup('armor_shields', 'armorInput', get_info_armor_shields)
+
+@views.route("/api/weapondata", methods = ['GET'])
+def weapon():
+    return lookup('weapons', 'weaponInput', get_info_weapons)
+
+@views.route("/api/consumabledata", methods = ['GET'])
+def consumable():
+    return lookup('consumables', 'consumableInput', get_info_consumables)
+
+@views.route("/api/spelldata", methods = ['GET'])
+def spell():
+    return lookup('spells', 'spellInput', get_info_spells)
+
+@views.route("/api/magicdata", methods = ['GET'])
+def magic():
+    return lookup('magic_items', 'toolsInput', get_info_magic_items)
+
+@views.route("/api/monsterdata", methods = ['GET'])
+def monster():
+    return lookup('monsters', 'monsterInput', get_info_monsters)
+
+
+'''one search over several tables at once, the tables are queried concurrently and merged by score
+    /api/search?searchInput=sword                              -> the inventory item tables
+    /api/search?searchInput=fire&tables=spells,magic_items&limit=20
+returns {'results': [{'table', 'score', 'row'}, ...], 'errors': {table: message}}
+'''
+
+@views.route("/api/search", methods = ['GET'])
+def search():
+    user_input = request_value('searchInput') or ""
+    tables = request_value('tables') or ITEM_TABLES
+    if isinstance(tables, str):
+        tables = [table.strip() for table in tables.split(",") if table.strip()]
+    if not isinstance(tables, (list, tuple)) or not all(isinstance(table, str) for table in tables):
+        return respond({'error' : "tables must be a list of table names."}, 400)
+
+    unknown = [table for table in tables if table not in SEARCHABLE_TABLES]
+    if unknown:
+        return respond({'error' : f"Can't search {', '.join(unknown)}, pick from {', '.join(SEARCHABLE_TABLES)}."}, 400)
+
+    try:
+        limit = max(1, min(int(request_value('limit', DEFAULT_SEARCH_LIMIT)), MAX_SEARCH_LIMIT))
+    except (ValueError, TypeError):
+        return respond({'error' : "limit must be a whole number."}, 400)
+
+    with timed('lookup', table='search', mode='combined'):
+        result = search_tables(user_input, tuple(dict.fromkeys(tables)), limit)
+    return respond(result)
+
+
+'''server side characters and inventories, the pages send deltas and get the updated stats back
+    GET    /api/characters                      -> [{'id', 'name'}, ...]
+    POST   /api/characters                      {"name": "Tordek", "dex_modifier": 0}
+    GET    /api/characters/<id>                 -> items, coins and derived stats (weight, AC)
+    PATCH  /api/characters/<id>                 {"name": ..., "dex_modifier": ...}
+    DELETE /api/characters/<id>
+    POST   /api/characters/<id>/items           {"table": "armor_shields", "id": 13, "quantity": 1}
+    DELETE /api/characters/<id>/items           same body, removes that many
+    POST   /api/characters/<id>/coins           {"gp": 5, "sp": -2}
+'''
+
+def character_call(action, *args, **kwargs):
+    try:
+        return respond({'result' : action(*args, **kwargs)})
+    except KeyError as e:
+        return respond({'error' : e.args[0] if e.args else str(e)}, 404)
+    except (ValueError, TypeError) as e:
+        return respond({'error' : str(e)}, 400)
+
+@views.route("/api/characters", methods = ['GET', 'POST'])
+def characters_api():
+    if request.method == 'GET':
+        return character_call(character_store.list_characters)
+    data = request_json()
+    return character_call(character_store.create, data.get('name'), data.get('dex_modifier', 0))
+
+@views.route("/api/characters/<int:character_id>", methods = ['GET', 'PATCH', 'DELETE'])
+def character_api(character_id):
+    if request.method == 'GET':
+        return character_call(character_store.get, character_id)
+    if request.method == 'DELETE':
+        return character_call(character_store.delete, character_id)
+    data = request_json()
+    return character_call(character_store.update, character_id, data.get('name'), data.get('dex_modifier'))
+
+@views.route("/api/characters/<int:character_id>/items", methods = ['POST', 'DELETE'])
+def character_items_api(character_id):
+    data = request_json()
+    change = character_store.add_item if request.method == 'POST' else character_store.remove_item
+    return character_call(change, character_id, data.get('table'), data.get('id'), data.get('quantity', 1))
+
+@views.route("/api/characters/<int:character_id>/coins", methods = ['POST'])
+def character_coins_api(character_id):
+    data = request_json()
+    return character_call(character_store.add_coins, character_id,
+                          **{coin: data.get(coin) for coin in ('gp', 'sp', 'cp')})
+
+
+'''route to the diceroller function'''
+
+@views.route("/api/rollingdice", methods = ['GET'])
+def roll():
+    dice = request_value('diceInput', "")
+    num = request_value('amountDice')
+    result = roll_dice(dice)
+    return respond({'result' : result})
+
+'''exact odds for an expression instead of a roll, atLeast adds the chance of rolling that total or more'''
+@views.route("/api/diceodds", methods = ['GET'])
+def odds():
+    dice = request_value('diceInput', "")
+    at_least = request_value('atLeast')
+    try:
+        at_least = int(at_least) if at_least not in (None, "") else None
+    except (TypeError, ValueError):
+        return respond({'error' : "atLeast must be a whole number."}, 400)
+    return respond({'result' : dice_odds(dice, at_least)})
+
+
+'''route to the encounter simulator
+expects json like
+    {"party": [{"name": "Fighter", "hp": 44, "ac": 18, "attack_bonus": 7, "damage": "1d8+4", "attacks": 2}, ...],
+     "monsters": [{"name": "Goblin", "count": 4}, ...],
+     "combats": 5000, "workers": 1, "seed": 1}
+'''
+
+@views.route("/api/simulate", methods = ['POST'])
+def simulate_encounter():
+    data = request_json()
+
+    try:
+        party = [party_member(member) for member in data.get('party', [])]
+        monsters = build_monsters(data.get('monsters', []), find_monster, monster_attacks)
+        combats = max(1, min(int(data.get('combats', DEFAULT_COMBATS)), MAX_COMBATS))
+        workers = max(1, min(int(data.get('workers', 1)), MAX_SIMULATION_WORKERS))
+        seed = data.get('seed')
+        result = simulate(party, monsters, combats, workers, seed)
+    except (ValueError, TypeError, AttributeError) as e:
+        return respond({'error' : str(e)}, 400)
+
+    return respond({'result' : result})
+
+'''route to the encounter builder for the encounters page
+expects json like
+    {"party": [5, 5, 5, 5], "difficulty": "hard"}             budget from the party's XP thresholds
+    {"budget": 2400, "multiplier": false}                        or a raw XP budget
+optional: "types": ["undead"], "sizes": ["Medium"], "cr_min", "cr_max", "max_monsters", "max_kinds",
+          "limit", "sample": true, "seed"
+a budget above the biggest party threshold (12 level 20 characters, deadly) is lowered to it
+'''
+
+@views.route("/api/encounters", methods = ['POST'])
+def build_encounter():
+    data = request_json()
+
+    try:
+        options = {key: data[key] for key in ('types', 'sizes', 'cr_min', 'cr_max', 'seed') if data.get(key) is not None}
+        for key in ('max_monsters', 'max_kinds'):
+            if data.get(key) is not None:
+                options[key] = max(1, min(int(data[key]), 20))
+        options['limit'] = max(1, min(int(data.get('limit', DEFAULT_ENCOUNTERS)), MAX_ENCOUNTERS))
+        options['sample'] = bool(data.get('sample', False))
+        options['use_multiplier'] = bool(data.get('multiplier', True))
+        budget = min(int(data['budget']), MAX_BUDGET) if data.get('budget') is not None else None
+        result = build_encounters(data.get('party'), data.get('difficulty'), budget, **options)
+    except (ValueError, TypeError, OverflowError) as e:
+        return respond({'error' : str(e)}, 400)
+
+    return respond({'result' : result})
+
+'''monsters are matched on their exact name, a fuzzy match would quietly simulate a different monster
+("dragon" -> Dragon Turtle), so near misses come back as suggestions instead'''
+def find_monster(name):
+    row = find_by_name('monsters', name)
+    if row is None:
+        candidates = [match.name for match in search_reference('monsters', name, limit=MONSTER_SUGGESTIONS)]
+        if candidates:
+            raise ValueError(f"Monster '{name}' not found, did you mean one of: {', '.join(candidates)}?")
+    return row
+
+
+'''latency histograms for every phase timed above and in connections.py
+    /metrics               -> Prometheus text format
+    /metrics?format=json   -> percentiles per phase plus the connection pool and reference cache stats
+'''
+@views.route("/metrics", methods = ['GET'])
+def metrics_page():
+    if request.args.get('format') == 'json':
+        return respond({'phases' : metrics.snapshot(),
+                        'pool' : connections.pool.stats(),
+                        'reference' : connections.reference.stats()})
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+'''whole reference tables for the pages to keep client side
+    /api/snapshot            -> {'tables': {table: version}}, check this to know when to refetch
+    /api/snapshot/spells     -> {'table', 'version', 'columns', 'rows': [[...], ...]}
+    /api/snapshot/spells?v=<version>   -> same, cached by the browser for good
+each snapshot is encoded and compressed once per table load
+'''
+@views.route("/api/snapshot", methods = ['GET'])
+def snapshot_versions():
+    versions = {table: table_version(connections.reference.table(table)) for table in connections.reference.tables}
+    response = respond({'tables' : versions})
+    response.cache_control.no_cache = True
+    return response
+
+@views.route("/api/snapshot/<table>", methods = ['GET'])
+def snapshot(table):
+    if table not in connections.reference.tables:
+        return respond({'error' : f"No snapshot for {table}, pick from {', '.join(connections.reference.tables)}."}, 404)
+
+    reference_table = connections.reference.table(table)
+    version = table_version(reference_table)
+    max_age = SNAPSHOT_MAX_AGE if request.args.get('v') == version else LOOKUP_MAX_AGE
+    if request.if_none_match.contains_weak(version):
+        return not_modified(version, max_age)
+
+    encoding = request.accept_encodings.best_match(encodings())
+    with timed('serialize', stage='snapshot'):
+        response = json_response(encoded_snapshot(reference_table, encoding))
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if max_age == SNAPSHOT_MAX_AGE:
+        response.cache_control.immutable = True
+    return cacheable(response, version, max_age)
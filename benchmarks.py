@@ -0,0 +1,258 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+#  quick performance checks, run one with: python benchmarks.py <name>
+
+#  a level 5 party against two ogres and four goblins (stats copied from the monsters table)
+BENCH_PARTY = [
+    {"name": "Fighter", "hp": 44, "ac": 18, "attack_bonus": 7, "damage": "1d8+4", "attacks": 2},
+    {"name": "Wizard", "hp": 27, "ac": 12, "attack_bonus": 7, "damage": "2d10"},
+    {"name": "Cleric", "hp": 38, "ac": 18, "attack_bonus": 6, "damage": "1d8+3"},
+    {"name": "Rogue", "hp": 33, "ac": 15, "attack_bonus": 7, "damage": "3d6+4"},
+]
+BENCH_MONSTERS = (
+    [{"name": "Ogre", "hp": 59, "ac": 11, "attack_bonus": 6, "damage": "2d8+4", "attacks": 1}] * 2 +
+    [{"name": "Goblin", "hp": 7, "ac": 15, "attack_bonus": 4, "damage": "1d6+2", "attacks": 1}] * 4
+)
+
+
+def bench_encounter_sim(combats=100000):
+    from encounter_sim import simulate
+
+    print(f"encounter simulator, {combats} combats")
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        result = simulate(BENCH_PARTY, BENCH_MONSTERS, combats=combats, workers=workers, seed=1)
+        print(f"  workers={workers:<3} {result['seconds']:.2f}s  "
+              f"{result['rounds_per_second']:,.0f} rounds/s  win rate {result['win_rate']:.3f}")
+
+
+def bench_sql_load(repeat=5):
+    from sql_loader import load_dumps
+
+    print(f"SQL dump load into SQLite, best of {repeat}")
+    best = None
+    for _ in range(repeat):
+        database = load_dumps()
+        if best is None or database.stats["seconds"] < best["seconds"]:
+            best = database.stats
+        database.close()
+    rows = sum(best["tables"].values())
+    print(f"  {best['seconds'] * 1000:.0f} ms  {rows} rows in {len(best['tables'])} tables  "
+          f"{rows / best['seconds']:,.0f} rows/s  {len(best['indexes'])} indexes")
+
+
+#  requests per /api route, single row lookups rotate through a few names so the caches see a mix
+API_CASES = {
+    "/api/equipmentdata": [("GET", "equipmentInput", ["rope", "Torch", "backpack", "compass"])],
+    "/api/armordata": [("GET", "armorInput", ["Plate", "leather", "Shield", "chain"])],
+    "/api/weapondata": [("GET", "weaponInput", ["Longsword", "dagger", "bow", "axe"])],
+    "/api/consumabledata": [("GET", "consumableInput", ["potion", "scroll"])],
+    "/api/spelldata": [("GET", "spellInput", ["Fireball", "cure", "Magic Missile", "light"])],
+    "/api/magicdata": [("GET", "toolsInput", ["Bag of Holding", "ring", "+1", "wand"])],
+    "/api/monsterdata": [("GET", "monsterInput", ["Goblin", "dragon", "Ogre", "zombie"])],
+    "/api/rollingdice": [("GET", "diceInput", ["1d20+5", "8d6", "4d6kh3", "2d20kh1+7"])],
+    "/api/encounters": [("POST", None, [{"party": [5, 5, 5, 5], "difficulty": "hard"},
+                                         {"party": [3, 3, 3], "difficulty": "deadly", "types": ["humanoid"], "sample": True, "seed": 1}])],
+    "/api/search": [("GET", "searchInput", ["sword", "plate", "potion", "rope", "ring of"])],
+    "/api/simulate": [("POST", None, [{"party": BENCH_PARTY, "monsters": [{"name": "Goblin", "count": 4}],
+                                       "combats": 200, "seed": 1}])],
+}
+#  bulk variants of the lookup routes, a 100 row page and the full ndjson stream
+BULK_OPTIONS = {"page": {"page_size": 100}, "stream": {"stream": 1}}
+BULK_ROUTES = ("/api/equipmentdata", "/api/armordata", "/api/weapondata", "/api/consumabledata",
+               "/api/spelldata", "/api/magicdata", "/api/monsterdata")
+
+#  routes with their own benchmark (character_store drives the /api/characters deltas, serialization the snapshots)
+SEPARATE_ROUTES = ("/api/characters", "/api/snapshot")
+
+
+def bench_api(requests=300):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "WebDev"))
+    from flask import Flask
+
+    import connections
+    from request_metrics import metrics
+    from sql_loader import load_dumps
+    from views import views
+
+    database = load_dumps()
+    connections.configure_pool(connect=database.connect)
+    app = Flask(__name__)
+    app.register_blueprint(views, url_prefix="/")
+    client = app.test_client()
+
+    routes = sorted(rule.rule for rule in app.url_map.iter_rules()
+                    if rule.rule.startswith("/api/") and not rule.rule.startswith(SEPARATE_ROUTES))
+    missing = [route for route in routes if route not in API_CASES]
+    if missing:
+        print(f"  no benchmark case for {', '.join(missing)}")
+
+    print(f"API routes against the SQLite stand-in, {requests} requests each (loaded in {database.stats['seconds'] * 1000:.0f} ms)")
+    print(f"  {'route':<40} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>10}")
+    for route in routes:
+        for method, field, values in API_CASES.get(route, []):
+            variants = {"single": {}}
+            if route in BULK_ROUTES:
+                variants.update(BULK_OPTIONS)
+            for variant, options in variants.items():
+                count = requests if method == "GET" else max(1, requests // 10)
+                _drive(client, route, method, field, values, options, count)
+                latencies = _drive(client, route, method, field, values, options, count)
+                p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                print(f"  {route + ' ' + variant:<40} {p50:>8.3f} {p99:>8.3f} {count / latencies.sum():>10,.0f}")
+
+    phases = metrics.snapshot()
+    print("  time per phase (all requests, from /metrics)")
+    for phase in ("parse_json", "lookup", "table_search", "reference_search", "db_acquire", "db_query", "serialize", "request"):
+        for entry in phases.get(phase, []):
+            if entry["labels"].get("endpoint") == "views.metrics_page":
+                continue
+            labels = ",".join(f"{key}={value}" for key, value in entry["labels"].items())
+            p50, p99 = entry["percentiles"]["0.5"] * 1000, entry["percentiles"]["0.99"] * 1000
+            print(f"    {phase + ' ' + labels:<50} n={entry['count']:<6} p50 {p50:.3f} ms  p99 {p99:.3f} ms")
+    database.close()
+
+
+#  one timed pass over a route, first pass warms the caches and is thrown away by the caller
+def _drive(client, route, method, field, values, options, count):
+    latencies = np.empty(count)
+    for i in range(count):
+        value = values[i % len(values)]
+        start = time.perf_counter()
+        if method == "GET":
+            response = client.get(route, query_string=dict(options, **{field: value}))
+            response.get_data()
+        else:
+            response = client.post(route, json=value)
+        latencies[i] = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"{route} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return latencies
+
+
+def bench_character_store(characters=50, deltas=20000):
+    import random
+
+    import connections
+    from character_store import CharacterStore
+    from sql_loader import load_dumps
+
+    database = load_dumps()
+    connections.configure_pool(connect=database.connect)
+    store = CharacterStore(flush_interval=3600)
+    items = [(table, row.id) for table in ("armor_shields", "weapons", "equipment")
+             for row in connections.reference.table(table).rows]
+    ids = [store.create(f"Bench {i}", dex_modifier=i % 5)["id"] for i in range(characters)]
+    store.flush()
+
+    rng = random.Random(1)
+    changes = [(rng.choice(ids), *rng.choice(items)) for _ in range(deltas)]
+    start = time.perf_counter()
+    for character_id, table, item_id in changes:
+        store.add_item(character_id, table, item_id)
+    for character_id, table, item_id in changes:
+        store.remove_item(character_id, table, item_id)
+    seconds = time.perf_counter() - start
+
+    for character_id, table, item_id in changes[:deltas // 2]:
+        store.add_item(character_id, table, item_id)
+    pending = store.pending()
+    flush_start = time.perf_counter()
+    written = store.flush()
+    flush_seconds = time.perf_counter() - flush_start
+
+    print(f"character store, {characters} characters, {deltas} adds then removes")
+    print(f"  {2 * deltas / seconds:,.0f} deltas/s with weight and AC kept current")
+    print(f"  write-behind flush of {pending} pending changes: {written} rows in {flush_seconds * 1000:.1f} ms")
+    store.close()
+    database.close()
+
+
+def bench_encounter_builder(repeat=20):
+    import connections
+    from encounter_builder import build_encounters, encounter_index
+    from sql_loader import load_dumps
+
+    database = load_dumps()
+    connections.configure_pool(connect=database.connect)
+    start = time.perf_counter()
+    index = encounter_index()
+    print(f"encounter builder over {len(index.table.rows)} monsters (index built in {(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    cases = [
+        ("4 x level 5, 2,400 XP raw", dict(budget=2400, use_multiplier=False)),
+        ("4 x level 5, hard", dict(party_levels=[5] * 4, difficulty="hard")),
+        ("4 x level 5, deadly, sampled", dict(party_levels=[5] * 4, difficulty="deadly", sample=True, seed=1)),
+        ("5 x level 11, deadly, undead", dict(party_levels=[11] * 5, difficulty="deadly", types=["undead"])),
+        ("6 x level 20, deadly", dict(party_levels=[20] * 6, difficulty="deadly")),
+    ]
+    for label, options in cases:
+        timings = np.empty(repeat)
+        for i in range(repeat):
+            result = build_encounters(**options)
+            timings[i] = result["seconds"]
+        p50, p99 = np.percentile(timings, [50, 99]) * 1000
+        print(f"  {label:<32} {result['patterns']:>7} patterns  p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+    database.close()
+
+
+def bench_serialization(repeat=2000):
+    import gzip
+    import json
+
+    import connections
+    import serialization
+    from sql_loader import load_dumps
+
+    database = load_dumps()
+    connections.configure_pool(connect=database.connect)
+    table = connections.reference.table("spells")
+    rows = table.rows
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        json.dumps({"result": json.dumps(rows[i % len(rows)].as_tuple())})
+    double = (time.perf_counter() - start) / repeat
+
+    serialization.encoded_rows(table)
+    start = time.perf_counter()
+    for i in range(repeat):
+        serialization.result_body(serialization.encoded_row(table, rows[i % len(rows)]))
+    spliced = (time.perf_counter() - start) / repeat
+
+    body = serialization.snapshot(table)
+    print(f"serialization ({'orjson' if serialization.orjson else 'json'}, encodings: {', '.join(serialization.encodings())})")
+    print(f"  single spell result: json.dumps twice {double * 1e6:.1f} us, pre-encoded splice {spliced * 1e6:.1f} us")
+    print(f"  spells snapshot: {len(body):,} bytes, gzip {len(gzip.compress(body, 9)):,} bytes")
+    for encoding in serialization.encodings():
+        start = time.perf_counter()
+        compressed = serialization.compress(body, encoding)
+        print(f"  live {encoding}: {len(compressed):,} bytes in {(time.perf_counter() - start) * 1000:.1f} ms")
+    database.close()
+
+
+BENCHMARKS = {
+    "api": bench_api,
+    "character_store": bench_character_store,
+    "encounter_builder": bench_encounter_builder,
+    "encounter_sim": bench_encounter_sim,
+    "serialization": bench_serialization,
+    "sql_load": bench_sql_load,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, any of {', '.join(sorted(BENCHMARKS))} (all by default)")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+
+    for name in args.names or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
@@ -0,0 +1,433 @@
+import atexit
+import math
+import threading
+
+import connections
+
+#  characters and their inventories kept server side, the pages send small deltas
+#  (add 2 of weapon 3, remove armor 14) instead of rebuilding lists from full rows
+#
+#  state lives in memory and is written back in batches by a background thread (write-behind),
+#  derived stats (carried weight, AC) are updated per delta rather than recomputed from scratch
+#  the in-memory copy is the source of truth, so only one app process should own the store
+#
+#      store.create("Tordek", dex_modifier=0)
+#      store.add_item(1, "armor_shields", 13)      # -> {"quantity": 1, "stats": {"weight_lb": 65.0, "ac": 18, ...}}
+#      store.remove_item(1, "armor_shields", 13)
+
+#  tables a character can hold things from, they're all in the reference cache so
+#  weight/AC come straight from the typed columns
+ITEM_TABLES = ('armor_shields', 'weapons', 'equipment', 'magic_items', 'spells')
+COIN_TYPES = ('gp', 'sp', 'cp')
+
+#  written back every FLUSH_INTERVAL seconds, or straight away once this many changes are waiting
+FLUSH_INTERVAL = 2.0
+FLUSH_BATCH = 500
+UNARMORED_AC = 10
+
+#  MySQL and the SQLite stand-in both understand these (REPLACE INTO included)
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS characters (
+        id INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        dex_modifier INT NOT NULL DEFAULT 0,
+        gp INT NOT NULL DEFAULT 0,
+        sp INT NOT NULL DEFAULT 0,
+        cp INT NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS character_items (
+        character_id INT NOT NULL,
+        item_table VARCHAR(32) NOT NULL,
+        item_id INT NOT NULL,
+        quantity INT NOT NULL,
+        PRIMARY KEY (character_id, item_table, item_id)
+    )""",
+)
+
+
+class Character:
+    __slots__ = ('id', 'name', 'dex_modifier', 'coins', 'items',
+                 'weight', 'unknown_weight', 'armor', 'shield')
+
+    def __init__(self, character_id, name, dex_modifier=0, coins=(0, 0, 0)):
+        self.id = character_id
+        self.name = name
+        self.dex_modifier = dex_modifier
+        self.coins = list(coins)
+        #  table -> {item id: quantity}
+        self.items = {}
+        #  derived, kept up to date by the store
+        self.weight = 0.0
+        self.unknown_weight = 0
+        self.armor = None    # (ac, item id) of the best body armor carried
+        self.shield = None   # (bonus, item id) of the best shield carried
+
+    @property
+    def ac(self):
+        ac = self.armor[0] if self.armor else UNARMORED_AC + self.dex_modifier
+        return ac + (self.shield[0] if self.shield else 0)
+
+    def stats(self):
+        return {
+            "weight_lb": round(self.weight, 3),
+            #  items whose weight text couldn't be read, left out of weight_lb
+            "unknown_weight_items": self.unknown_weight,
+            "ac": self.ac,
+            "armor_id": self.armor[1] if self.armor else None,
+            "shield_id": self.shield[1] if self.shield else None,
+        }
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "dex_modifier": self.dex_modifier,
+            "coins": dict(zip(COIN_TYPES, self.coins)),
+            "items": {table: [{"id": item_id, "quantity": quantity} for item_id, quantity in items.items()]
+                      for table, items in self.items.items() if items},
+            "stats": self.stats(),
+        }
+
+
+class CharacterStore:
+
+    def __init__(self, connection=None, flush_interval=FLUSH_INTERVAL, flush_batch=FLUSH_BATCH):
+        #  connection() is a context manager handing out a DB-API connection,
+        #  by default whatever pool connections.py is currently using
+        self.connection = connection or (lambda: connections.pool.connection())
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        self.characters = {}
+        self._next_id = 1
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+
+        #  waiting to be written: character ids, (character id, table, item id), deleted character ids
+        self._dirty_characters = set()
+        self._dirty_items = set()
+        self._deleted = set()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._writer = None
+        #  reference tables the derived stats were computed from, a reload means recomputing them
+        self._reference_tables = None
+
+        self.metrics = {"flushes": 0, "rows_written": 0, "failed_flushes": 0}
+
+    #  --- loading ---------------------------------------------------------------------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with self.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    for statement in SCHEMA:
+                        cursor.execute(statement)
+                    connection.commit()
+                    cursor.execute("SELECT id, name, dex_modifier, gp, sp, cp FROM characters")
+                    for character_id, name, dex_modifier, gp, sp, cp in cursor.fetchall():
+                        self.characters[character_id] = Character(character_id, name, dex_modifier, (gp, sp, cp))
+                    cursor.execute("SELECT character_id, item_table, item_id, quantity FROM character_items")
+                    for character_id, table, item_id, quantity in cursor.fetchall():
+                        character = self.characters.get(character_id)
+                        if character is not None and table in ITEM_TABLES:
+                            character.items.setdefault(table, {})[item_id] = quantity
+                finally:
+                    cursor.close()
+
+            self._next_id = max(self.characters, default=0) + 1
+            self._recompute_all()
+            self._loaded = True
+
+    #  --- derived stats ---------------------------------------------------------------------
+
+    def _table(self, table):
+        return connections.reference.table(table)
+
+    #  weight of one item and what it does for AC: ('armor', ac), ('shield', bonus) or None
+    def _item_effects(self, table, item_id, dex_modifier):
+        reference = self._table(table)
+        position = reference.position(item_id)
+        if position is None:
+            raise KeyError(f"No {table} row with id {item_id}.")
+
+        typed = reference.typed
+        weight = float(typed['weight_lb'][position]) if 'weight_lb' in typed else 0.0
+        armor = None
+        if table == 'armor_shields':
+            if reference.rows[position].type == 'Shield':
+                bonus = typed['ac_bonus'][position]
+                armor = ('shield', 0 if math.isnan(bonus) else int(bonus))
+            elif typed['ac_base'][position] > 0:
+                ac = int(typed['ac_base'][position])
+                if typed['dex_bonus'][position]:
+                    cap = typed['dex_max'][position]
+                    ac += dex_modifier if math.isnan(cap) else min(dex_modifier, int(cap))
+                armor = ('armor', ac)
+        return weight, armor
+
+    #  every derived stat from scratch, only after loading, a reference reload or a dex change
+    def _recompute(self, character):
+        character.weight = 0.0
+        character.unknown_weight = 0
+        character.armor = character.shield = None
+        for table, items in character.items.items():
+            for item_id, quantity in items.items():
+                self._apply(character, table, item_id, quantity)
+
+    def _recompute_all(self):
+        self._reference_tables = tuple(id(self._table(table)) for table in ITEM_TABLES)
+        for character in self.characters.values():
+            self._recompute(character)
+
+    def _check_reference(self):
+        if self._reference_tables != tuple(id(self._table(table)) for table in ITEM_TABLES):
+            self._recompute_all()
+
+    #  adjust the derived stats for quantity (negative when removing) of one item
+    def _apply(self, character, table, item_id, quantity):
+        weight, armor = self._item_effects(table, item_id, character.dex_modifier)
+        if math.isnan(weight):
+            character.unknown_weight += quantity
+        else:
+            character.weight += weight * quantity
+
+        if armor is None:
+            return
+        kind, value = armor
+        slot = 'armor' if kind == 'armor' else 'shield'
+        best = getattr(character, slot)
+        if quantity > 0:
+            if best is None or value > best[0]:
+                setattr(character, slot, (value, item_id))
+        elif best is not None and best[1] == item_id and not character.items[table].get(item_id):
+            #  the best one just left the inventory, look for the next best among what's still carried
+            setattr(character, slot, self._best(character, kind))
+
+    def _best(self, character, kind):
+        best = None
+        for item_id, quantity in character.items.get('armor_shields', {}).items():
+            if quantity <= 0:
+                continue
+            _, armor = self._item_effects('armor_shields', item_id, character.dex_modifier)
+            if armor and armor[0] == kind and (best is None or armor[1] > best[0]):
+                best = (armor[1], item_id)
+        return best
+
+    #  --- changes ---------------------------------------------------------------------------
+
+    def _get(self, character_id):
+        self._ensure_loaded()
+        character = self.characters.get(character_id)
+        if character is None:
+            raise KeyError(f"No character with id {character_id}.")
+        return character
+
+    def get(self, character_id):
+        with self._lock:
+            self._check_reference()
+            return self._get(character_id).as_dict()
+
+    def list_characters(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [{"id": character.id, "name": character.name} for character in self.characters.values()]
+
+    def create(self, name, dex_modifier=0):
+        name = str(name or "").strip()
+        if not name:
+            raise ValueError("A character needs a name.")
+        self._ensure_loaded()
+        with self._lock:
+            character = Character(self._next_id, name, _integer(dex_modifier, "dex_modifier"))
+            self._next_id += 1
+            self.characters[character.id] = character
+            self._dirty_characters.add(character.id)
+        self._changed()
+        return character.as_dict()
+
+    def delete(self, character_id):
+        with self._lock:
+            self._get(character_id)
+            del self.characters[character_id]
+            self._dirty_characters.discard(character_id)
+            self._dirty_items = {key for key in self._dirty_items if key[0] != character_id}
+            self._deleted.add(character_id)
+        self._changed()
+
+    def update(self, character_id, name=None, dex_modifier=None):
+        with self._lock:
+            character = self._get(character_id)
+            if name is not None:
+                name = str(name).strip()
+                if not name:
+                    raise ValueError("A character needs a name.")
+                character.name = name
+            if dex_modifier is not None and _integer(dex_modifier, "dex_modifier") != character.dex_modifier:
+                character.dex_modifier = _integer(dex_modifier, "dex_modifier")
+                #  dex changes every armor's AC, this is the one change that starts over
+                self._recompute(character)
+            self._dirty_characters.add(character_id)
+            result = character.as_dict()
+        self._changed()
+        return result
+
+    #  adds (or with a negative quantity removes) copies of one item, returns the new count and stats
+    def add_item(self, character_id, table, item_id, quantity=1):
+        if table not in ITEM_TABLES:
+            raise ValueError(f"Characters can't hold {table}, pick from {', '.join(ITEM_TABLES)}.")
+        item_id, quantity = _integer(item_id, "id"), _integer(quantity, "quantity")
+
+        with self._lock:
+            self._check_reference()
+            character = self._get(character_id)
+            items = character.items.setdefault(table, {})
+            held = items.get(item_id, 0)
+            if quantity < 0 and held + quantity < 0:
+                raise ValueError(f"Only {held} of {table} {item_id} to remove.")
+            #  raises KeyError for an id that isn't in the table, before anything changes
+            self._item_effects(table, item_id, character.dex_modifier)
+
+            if held + quantity:
+                items[item_id] = held + quantity
+            else:
+                items.pop(item_id, None)
+            self._apply(character, table, item_id, quantity)
+            self._dirty_items.add((character_id, table, item_id))
+            result = {"table": table, "id": item_id, "quantity": held + quantity, "stats": character.stats()}
+        self._changed()
+        return result
+
+    def remove_item(self, character_id, table, item_id, quantity=1):
+        return self.add_item(character_id, table, item_id, -_integer(quantity, "quantity"))
+
+    def add_coins(self, character_id, **amounts):
+        changes = [_integer(amounts.get(coin) or 0, coin) for coin in COIN_TYPES]
+        with self._lock:
+            character = self._get(character_id)
+            for position, change in enumerate(changes):
+                character.coins[position] += change
+            self._dirty_characters.add(character_id)
+            result = dict(zip(COIN_TYPES, character.coins))
+        self._changed()
+        return result
+
+    #  --- write-behind ----------------------------------------------------------------------
+
+    def pending(self):
+        return len(self._dirty_characters) + len(self._dirty_items) + len(self._deleted)
+
+    def _changed(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="character-writer", daemon=True)
+                    self._writer.start()
+        if self.pending() >= self.flush_batch:
+            self._wake.set()
+
+    def _write_loop(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"An error occurred: {e}")
+
+    #  writes every waiting change in one transaction, returns how many rows were touched
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending():
+                    return 0
+                deleted, self._deleted = self._deleted, set()
+                dirty_characters, self._dirty_characters = self._dirty_characters, set()
+                dirty_items, self._dirty_items = self._dirty_items, set()
+
+                characters = [(c.id, c.name, c.dex_modifier, *c.coins)
+                              for c in map(self.characters.get, dirty_characters) if c is not None]
+                replaced, removed = [], []
+                for character_id, table, item_id in dirty_items:
+                    character = self.characters.get(character_id)
+                    if character is None:
+                        continue
+                    quantity = character.items.get(table, {}).get(item_id, 0)
+                    if quantity:
+                        replaced.append((character_id, table, item_id, quantity))
+                    else:
+                        removed.append((character_id, table, item_id))
+
+            try:
+                with self.connection() as connection:
+                    cursor = connection.cursor()
+                    try:
+                        if deleted:
+                            gone = [(character_id,) for character_id in deleted]
+                            cursor.executemany("DELETE FROM character_items WHERE character_id = %s", gone)
+                            cursor.executemany("DELETE FROM characters WHERE id = %s", gone)
+                        if characters:
+                            cursor.executemany("REPLACE INTO characters (id, name, dex_modifier, gp, sp, cp) "
+                                               "VALUES (%s, %s, %s, %s, %s, %s)", characters)
+                        if replaced:
+                            cursor.executemany("REPLACE INTO character_items (character_id, item_table, item_id, quantity) "
+                                               "VALUES (%s, %s, %s, %s)", replaced)
+                        if removed:
+                            cursor.executemany("DELETE FROM character_items "
+                                               "WHERE character_id = %s AND item_table = %s AND item_id = %s", removed)
+                        connection.commit()
+                    finally:
+                        cursor.close()
+            except Exception:
+                #  put everything back so the next flush retries it
+                with self._lock:
+                    self._deleted |= deleted - set(self.characters)
+                    self._dirty_characters |= dirty_characters
+                    self._dirty_items |= dirty_items
+                    self.metrics["failed_flushes"] += 1
+                raise
+
+            written = len(deleted) + len(characters) + len(replaced) + len(removed)
+            with self._lock:
+                self.metrics["flushes"] += 1
+                self.metrics["rows_written"] += written
+            return written
+
+    #  flush what's left and stop the writer thread
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if self._loaded:
+            self.flush()
+
+    #  forget the in-memory state, configure_pool doesn't do this so call it yourself
+    #  after pointing the pool at another database
+    def reset(self):
+        self.close()
+        with self._lock:
+            self.characters = {}
+            self._loaded = False
+            self._stopped.clear()
+
+
+#  request values arrive as whatever the JSON held, int() on them would leak its own error text
+def _integer(value, field):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{field} must be an integer.")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer.") from None
+
+
+store = CharacterStore()
+atexit.register(store.close)
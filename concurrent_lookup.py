@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from connections import ranked_matches
+from request_metrics import timed
+
+#  fans one search out over several tables on a shared thread pool and merges the rankings
+#
+#      search_tables("sword")                          # from a sync Flask view
+#      await search_tables_async("sword", ("weapons", "magic_items"))
+#
+#  the in-memory reference searches only take microseconds, what the pool buys is overlapping
+#  the database round trips (consumables, a table's first load) instead of paying them one after another
+
+#  the tables the inventory page looks items up in
+ITEM_TABLES = ('armor_shields', 'weapons', 'equipment', 'consumables', 'magic_items')
+SEARCHABLE_TABLES = ITEM_TABLES + ('spells', 'monsters')
+
+LOOKUP_WORKERS = 8
+LOOKUP_TIMEOUT = 10.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+#  created on first use so importing this module doesn't start threads
+def executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="lookup")
+    return _executor
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def _lookup(table, user_input, limit):
+    with timed('table_search', table=table):
+        return ranked_matches(table, user_input, limit)
+
+
+def submit_lookup(table, user_input, limit=10):
+    if table not in SEARCHABLE_TABLES:
+        raise ValueError(f"Can't search {table}, pick from {', '.join(SEARCHABLE_TABLES)}.")
+    return executor().submit(_lookup, table, user_input, limit)
+
+
+#  one ranking over every table, ties go to the order the tables were asked for
+#  outcomes is [(table, [(score, row), ...] or the exception it raised)]
+def merge_ranked(outcomes, limit=10):
+    merged = []
+    errors = {}
+    for table_position, (table, outcome) in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            errors[table] = str(outcome) or type(outcome).__name__
+            continue
+        for rank, (score, row) in enumerate(outcome):
+            merged.append((-score, table_position, rank, table, score, row))
+
+    merged.sort(key=lambda entry: entry[:3])
+    results = [{"table": table, "score": score, "row": row} for _, _, _, table, score, row in merged[:limit]]
+    return {"results": results, "errors": errors}
+
+
+#  blocking version for sync callers, every table is searched at the same time
+#  tables that fail or don't answer within timeout seconds are reported under "errors"
+def search_tables(user_input, tables=ITEM_TABLES, limit=10, timeout=LOOKUP_TIMEOUT):
+    futures = [(table, submit_lookup(table, user_input, limit)) for table in tables]
+    wait([future for _, future in futures], timeout=timeout)
+
+    outcomes = []
+    for table, future in futures:
+        if not future.done():
+            future.cancel()
+            outcomes.append((table, TimeoutError(f"{table} lookup timed out after {timeout} seconds.")))
+        elif future.exception() is not None:
+            outcomes.append((table, future.exception()))
+        else:
+            outcomes.append((table, future.result()))
+    return merge_ranked(outcomes, limit)
+
+
+#  asyncio version, the lookups still run on the thread pool so the event loop never blocks
+async def search_tables_async(user_input, tables=ITEM_TABLES, limit=10, timeout=LOOKUP_TIMEOUT):
+    futures = [asyncio.wrap_future(submit_lookup(table, user_input, limit)) for table in tables]
+    done, pending = await asyncio.wait(futures, timeout=timeout) if futures else (set(), set())
+
+    outcomes = []
+    for table, future in zip(tables, futures):
+        if future in pending:
+            future.cancel()
+            outcomes.append((table, TimeoutError(f"{table} lookup timed out after {timeout} seconds.")))
+        elif future.exception() is not None:
+            outcomes.append((table, future.exception()))
+        else:
+            outcomes.append((table, future.result()))
+    return merge_ranked(outcomes, limit)
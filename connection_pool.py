@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+#  keeps a fixed number of long lived connections around so lookups don't pay
+#  for a new tcp + auth handshake every time
+#  connect is any function that returns a DB-API connection (mysql, sqlite stand-in, etc.)
+class ConnectionPool:
+
+    def __init__(self, connect, size=5, timeout=10.0, recycle=3600.0, check_after=30.0,
+                 health_query="SELECT 1", observe=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_after = check_after
+        self.health_query = health_query
+        #  optional observe(phase, seconds) hook, called with db_connect, db_acquire and db_hold timings
+        self.observe = observe
+
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._opened = 0
+        self._closed = False
+
+        self.metrics = {
+            "acquired": 0,
+            "released": 0,
+            "opened": 0,
+            "recycled": 0,
+            "failed_checks": 0,
+            "timeouts": 0,
+            "acquire_seconds_total": 0.0,
+            "acquire_seconds_max": 0.0,
+            "hold_seconds_total": 0.0,
+            "hold_seconds_max": 0.0,
+        }
+
+    #  borrow a connection, waiting up to timeout seconds if every connection is checked out
+    def acquire(self, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+
+        start = time.perf_counter()
+        deadline = start + timeout
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed.")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    #  reserve the slot now, the actual connect happens outside the lock
+                    self._opened += 1
+                    entry = None
+                    break
+
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.metrics["timeouts"] += 1
+                    raise PoolTimeout(f"No connection available after {timeout} seconds.")
+                self._lock.wait(remaining)
+
+        try:
+            if entry is None:
+                entry = self._open()
+            else:
+                entry = self._revalidate(entry)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+                self._lock.notify()
+            raise
+
+        now = time.perf_counter()
+        waited = now - start
+        with self._lock:
+            self._in_use[id(entry[0])] = (entry, now)
+            self.metrics["acquired"] += 1
+            self.metrics["acquire_seconds_total"] += waited
+            self.metrics["acquire_seconds_max"] = max(self.metrics["acquire_seconds_max"], waited)
+        if self.observe is not None:
+            self.observe("db_acquire", waited)
+
+        return entry[0]
+
+    #  hand a connection back, broken ones are thrown away and their slot is freed up
+    #  releasing twice is a no-op and a connection the pool never handed out is just closed,
+    #  raising here would hide whatever error the caller's finally block is unwinding from
+    def release(self, connection, broken=False):
+        with self._lock:
+            borrowed = self._in_use.pop(id(connection), None)
+            idle = borrowed is None and any(entry[0] is connection for entry in self._idle)
+        if borrowed is None:
+            if not idle:
+                self._close_quietly(connection)
+            return
+        entry, acquired_at = borrowed
+
+        if not broken:
+            #  don't let an open transaction (or a stale read snapshot) leak to the next borrower
+            try:
+                connection.rollback()
+            except Exception:
+                broken = True
+
+        now = time.perf_counter()
+        held = now - acquired_at
+
+        with self._lock:
+            self.metrics["released"] += 1
+            self.metrics["hold_seconds_total"] += held
+            self.metrics["hold_seconds_max"] = max(self.metrics["hold_seconds_max"], held)
+
+            if broken or self._closed:
+                self._opened -= 1
+                discard = True
+            else:
+                entry[2] = now
+                self._idle.append(entry)
+                discard = False
+            self._lock.notify()
+
+        if self.observe is not None:
+            self.observe("db_hold", held)
+        if discard:
+            self._close_quietly(connection)
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._lock.notify_all()
+
+        for entry in idle:
+            self._close_quietly(entry[0])
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["size"] = self.size
+            stats["open"] = self._opened
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = len(self._in_use)
+
+        if stats["acquired"]:
+            stats["acquire_seconds_avg"] = stats["acquire_seconds_total"] / stats["acquired"]
+        if stats["released"]:
+            stats["hold_seconds_avg"] = stats["hold_seconds_total"] / stats["released"]
+        return stats
+
+    #  entries are [connection, created_at, last_used]
+    def _open(self):
+        start = time.perf_counter()
+        connection = self.connect()
+        now = time.perf_counter()
+        if self.observe is not None:
+            self.observe("db_connect", now - start)
+        with self._lock:
+            self.metrics["opened"] += 1
+        return [connection, now, now]
+
+    #  old connections get swapped for fresh ones, ones that sat idle a while get pinged first
+    def _revalidate(self, entry):
+        connection, created_at, last_used = entry
+        now = time.perf_counter()
+
+        if self.recycle is not None and now - created_at > self.recycle:
+            self._close_quietly(connection)
+            with self._lock:
+                self.metrics["recycled"] += 1
+            return self._open()
+
+        if self.check_after is not None and now - last_used > self.check_after:
+            if not self._healthy(connection):
+                self._close_quietly(connection)
+                with self._lock:
+                    self.metrics["failed_checks"] += 1
+                return self._open()
+
+        return entry
+
+    def _healthy(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.health_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
@@ -1,5 +1,11 @@
 import mysql.connector
 import json
+from itertools import islice
+from connection_pool import ConnectionPool
+from reference_cache import ReferenceCache, ReferenceTable
+from search_index import SearchIndex, normalize
+from reference_etl import build_typed_columns
+from request_metrics import observe, timed
 
 def make_connection():
   mydb = mysql.connector.connect(
@@ -10,6 +16,19 @@ def make_connection():
   )
   return mydb
 
+#one pool shared by every lookup, nothing is opened until the first query needs it
+#connect/acquire/hold times go into the db_* histograms served at /metrics
+pool = ConnectionPool(make_connection, observe=observe)
+
+#swap in a different pool size or connection factory (e.g. a local stand-in database for tests)
+def configure_pool(connect=make_connection, **options):
+  global pool
+  pool.close_all()
+  options.setdefault('observe', observe)
+  pool = ConnectionPool(connect, **options)
+  reference.invalidate()
+  return pool
+
 def input_validation():
   user_input = input().strip()
 
@@ -19,224 +38,252 @@ def input_validation():
   except ValueError:
       return f"%{user_input.lower()}%"
 
+#borrow a pooled connection for a single row lookup
+def fetch_one(full_query, column_parameters):
+  with pool.connection() as connection:
+    cursor = connection.cursor()
+    try:
+      with timed('db_query', query='fetch_one'):
+        cursor.execute(full_query, column_parameters)
+        return cursor.fetchone()
+    finally:
+      cursor.close()
+
+#pull a whole table in one go, used to fill the reference data cache
+def fetch_table(table):
+  with pool.connection() as connection:
+    cursor = connection.cursor()
+    try:
+      with timed('db_query', query='fetch_table'):
+        cursor.execute(f"SELECT * FROM {table} ORDER BY id")
+        rows = cursor.fetchall()
+      columns = [column[0] for column in cursor.description]
+      return columns, rows
+    finally:
+      cursor.close()
+
+#the SRD tables never change between dump imports so they are served from memory
+#the free text numbers (cost, weight, AC, attacks...) are parsed once on load, see reference_etl
+reference = ReferenceCache(fetch_table, transform=build_typed_columns)
+
+#ranked search over one of the reference tables, best match first
+def search_reference(table, user_input, limit=10):
+  with timed('reference_search', table=table):
+    return list(reference.search(table, user_input, limit))
+
+#exact name lookup, for when a near miss would be the wrong row (the simulator's monsters)
+def find_by_name(table, name):
+  with timed('reference_search', table=table):
+    return reference.by_name(table, name)
+
+#the row as the json text the endpoints hand back
+def encode_row(row):
+  with timed('serialize', stage='row'):
+    return json.dumps(row)
+
+#rows matching every (column, op, value) condition on the typed columns
+#e.g. filter_reference('weapons', [('cost_gp', '<', 50), ('weight_lb', '<=', 10)])
+def filter_reference(table, conditions):
+  return reference.table(table).typed.filter(conditions)
+
+#structured attacks and multiattack count for a monsters row, parsed once when the table was loaded
+def monster_attacks(row):
+  table = reference.table('monsters')
+  position = table.position(row.id)
+  if position is None:
+    return None, None
+  return table.typed.attacks.for_monster(position), int(table.typed['multiattack'][position])
+
+#consumables is not part of the dump so it is still searched in the database
+DATABASE_COLUMNS = {
+  'consumables': ['id', 'name', 'effect', 'duration', 'value', 'uses', 'restores', 'rarity'],
+}
+
+#every row matching user_input in id order starting after after_id, one dict at a time
+#rows are never all held at once, the database path reads the cursor in batches
+def iter_matches(table, user_input, after_id=None, limit=None, batch_size=100):
+  if table in reference.tables:
+    rows = reference.iter_matching(table, user_input, after_id)
+    for record in islice(rows, limit):
+      yield record.as_dict()
+    return
+
+  if not isinstance(user_input, int) and '%' not in str(user_input):
+    user_input = f"%{str(user_input).lower()}%"
+
+  column_names = DATABASE_COLUMNS[table]
+  query = " OR ".join(f'{column} LIKE %s' for column in column_names)
+  column_parameters = [user_input] * len(column_names)
+
+  full_query = f"SELECT * FROM {table} WHERE ({query})"
+  if after_id is not None:
+    full_query += " AND id > %s"
+    column_parameters.append(after_id)
+  full_query += " ORDER BY id"
+  if limit is not None:
+    full_query += " LIMIT %s"
+    column_parameters.append(limit)
+
+  with pool.connection() as connection:
+    cursor = connection.cursor()
+    try:
+      with timed('db_query', query='iter_matches'):
+        cursor.execute(full_query, tuple(column_parameters))
+      columns = [column[0] for column in cursor.description]
+      while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+          break
+        for row in rows:
+          yield dict(zip(columns, row))
+    finally:
+      cursor.close()
+
+#one page of matches plus the id to pass as after_id for the next page (None on the last page)
+def page_matches(table, user_input, after_id=None, page_size=25):
+  rows = list(iter_matches(table, user_input, after_id, limit=page_size + 1))
+  next_after = rows[page_size - 1]['id'] if len(rows) > page_size else None
+  return rows[:page_size], next_after
+
+#(score, row dict) pairs best first, scored the same way for every table so rankings can be merged
+#the database tables only have LIKE, the first RANKED_SCAN_LIMIT matching rows get a throwaway SearchIndex
+#a score only depends on the row and the query (column weights and name bonus, nothing counted over the
+#table), so a row scores the same in the throwaway index as in one over the whole table or a reference table
+#what differs is which rows are candidates: LIKE only finds rows containing the query as typed
+RANKED_SCAN_LIMIT = 1000
+
+def ranked_matches(table, user_input, limit=10):
+  if table in reference.tables:
+    return [(score, record.as_dict()) for score, record in reference.scored_search(table, user_input, limit)]
+
+  if not normalize(user_input):
+    return []
+  rows = list(iter_matches(table, user_input, limit=RANKED_SCAN_LIMIT))
+  if not rows:
+    return []
+  scanned = ReferenceTable(table, rows[0].keys(), [tuple(row.values()) for row in rows])
+  return [(score, record.as_dict()) for score, record in SearchIndex(scanned).scored(user_input, limit)]
+
+#call this after re-importing the SQL dump
+def reload_reference_data(table=None):
+  reference.invalidate(table)
+
+#the reference tables are answered from the search index, consumables still goes to the database
+#the endpoints can pass what the user typed, otherwise it is read from input() like before
 #will likely need to customize one per table for efficiency
 #have a list of column names prepared and combine them into one query
 
-def get_info_equipment():
+def get_info_equipment(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-  
-    cursor = connection.cursor()
-    column_names = ['id', 'name', 'type', 'description', 'weight', 'cost', 'tags']
-    
-    #combine all queries into one
-    query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM equipment WHERE {query}"
-    column_parameters = tuple([f'%{user_input}%' for column in column_names])
-    
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
+    if user_input is None:
+      user_input = input_validation()
+
+    record = search_reference('equipment', user_input, limit=1)
+    result = encode_row(record[0].as_tuple() if record else None)
 
     return result
  
-  except:
-    print("An error occurred")
-
-  finally:
-    cursor.close()
-    connection.close()
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
 
-def get_info_armor_shields():
+def get_info_armor_shields(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-  
-    cursor = connection.cursor()
-    column_names = ['id', 'type', 'name', 'AC', 'strength', 'stealth', 'weight', 'cost', 'don_time', 'doff_time']
-    
-    #combine all queries into one
-    query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM armor_shields WHERE {query}"
-    column_parameters = tuple([user_input] * len(column_names))
-    
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
+    if user_input is None:
+      user_input = input_validation()
+
+    record = search_reference('armor_shields', user_input, limit=1)
+    result = encode_row(record[0].as_tuple() if record else None)
 
     return result
  
-  except:
-    print("An error occurred")
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
 
-  finally:
-    cursor.close()
-    connection.close()
-
-def get_info_consumables():
+def get_info_consumables(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-
-    cursor = connection.cursor()
-    column_names = ['id', 'name', 'effect', 'duration', 'value', 'uses', 'restores', 'rarity']
+    if user_input is None:
+      user_input = input_validation()
+    elif not isinstance(user_input, int) and '%' not in str(user_input):
+      user_input = f"%{str(user_input).lower()}%"
+    column_names = DATABASE_COLUMNS['consumables']
 
     #combine all queries into one
     query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM table WHERE {query}"
+    full_query = f"SELECT * FROM consumables WHERE {query} LIMIT 1"
     column_parameters = tuple([user_input] * len(column_names))
 
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
+    record = fetch_one(full_query, column_parameters)
+    result = encode_row(record)
 
     return result
  
-  except:
-    print("An error occurred")
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
 
-  finally:
-    cursor.close()
-    connection.close()
-
-def get_info_weapons():
+def get_info_weapons(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-  
-    cursor = connection.cursor()
-    column_names = ['id', 'name', 'type', 'cost', 'damage', 'weight', 'properties']
-    
-    #combine all queries into one
-    query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM weapons WHERE {query}"
-    column_parameters = tuple([user_input] * len(column_names))
-    
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
+    if user_input is None:
+      user_input = input_validation()
+
+    record = search_reference('weapons', user_input, limit=1)
+    result = encode_row(record[0].as_tuple() if record else None)
 
     return result
  
-  except:
-    print("An error occurred")
-
-  finally:
-    cursor.close()
-    connection.close()
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
 
 
-def get_info_monsters():
+def get_info_monsters(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-  
-    cursor = connection.cursor()
-    column_names = ['id', 'name', 'size', 'type', 'alignment', 'armor_class', 'armor_type', 'hit_points', 'hit_dice', 'hit_points_roll', 'speed_walk', 
-                    'strength', 'dexterity', 'constitution', 'intelligence', 'wisdom', 'charisma', 'saving_throws', 'damage_vulnerabilities', 
-                    'damage_resistances', 'damage_immunities', 'condition_immunities', 'darkvision', 'passive_perception', 'languages', 'challenge_rating',
-                    'proficiency_bonus', 'xp', 'special_abilities', 'actions', 'legendary_actions', 'image_url']
-    
-    #combine all queries into one
-    query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM monsters WHERE {query}"
-    column_parameters = tuple([user_input] * len(column_names))
-    
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
+    if user_input is None:
+      user_input = input_validation()
+
+    record = search_reference('monsters', user_input, limit=1)
+    result = encode_row(record[0].as_tuple() if record else None)
 
     return result
  
-  except:
-    print("An error occurred")
-
-  finally:
-    cursor.close()
-    connection.close()
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
 
-def get_info_spells():
-    connection = None
-    cursor = None
+def get_info_spells(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-  
-    cursor = connection.cursor()
-    column_names = ['id', 'name', 'level', 'school', 'casting_time', 'range', 'duration', 'description', 'components',
-                    'concentration', 'ritual', 'attack_type', 'damage', 'higher_level', 'classes', 'subclasses']
-    
-    #combine all queries into one
-    query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM spells WHERE {query}"
-    column_parameters = tuple([user_input] * len(column_names))
-    
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
-
-        cursor = connection.cursor()
-        column_names = ['id', 'name', 'level', 'school', 'casting_time', 'range', 'duration', 'description', 'components',
-                        'concentration', 'ritual', 'attack_type', 'damage', 'higher_level', 'classes', 'subclasses']
-        
-        query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-        full_query = f"SELECT * FROM table WHERE {query}"
-        column_parameters = tuple([user_input] * len(column_names))
-        
-        cursor.execute(full_query, column_parameters)
-        record = cursor.fetchone()
-        result = json.dumps(record)
-
-        return result
+    if user_input is None:
+      user_input = input_validation()
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    record = search_reference('spells', user_input, limit=1)
+    result = encode_row(record[0].as_tuple() if record else None)
 
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+    return result
+ 
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
 
 
-def get_info_magic_items():
+def get_info_magic_items(user_input=None):
 
   try:
-    user_input = input_validation()
-    connection = make_connection()
-    result = []
-  
-    cursor = connection.cursor()
-    column_names = ['id', 'name', 'category', 'rarity', 'description', 'image_url']
-    
-    #combine all queries into one
-    query = " OR ".join(f'{column} LIKE %s' for column in column_names)
-    full_query = f"SELECT * FROM magic_items WHERE {query}"
-    column_parameters = tuple([user_input] * len(column_names))
-    
-    cursor.execute(full_query, column_parameters)
-    record = cursor.fetchone()
-    result = json.dumps(record)
+    if user_input is None:
+      user_input = input_validation()
+
+    record = search_reference('magic_items', user_input, limit=1)
+    result = encode_row(record[0].as_tuple() if record else None)
 
     return result
  
-  except:
-    print("An error occurred")
-
-  finally:
-    cursor.close()
-    connection.close()
+  except Exception as e:
+    print(f"An error occurred: {e}")
+    return None
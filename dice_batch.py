@@ -0,0 +1,181 @@
+import numpy as np
+
+from dice_expr import MAX_EXPLOSIONS, compile_expression
+
+#  rolls are drawn in blocks of about this many dice when per die detail isn't needed
+CHUNK_DICE = 1 << 22
+
+
+def make_generator(seed=None):
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+#  parsed (cached) expression for anything dice_expr understands
+def parse_expression(dice_input):
+    return compile_expression(dice_input).expression
+
+
+#  rolls every expression repeat times with numpy instead of one randint per die
+#  expressions can be a single dice string or a list of them, in the full dice_expr notation
+#  seed is an int (reproducible), None (fresh entropy) or an existing numpy Generator
+#
+#  returns {"expressions", "modifiers", "totals"} and "rolls"/"dropped" when detail=True
+#      totals:  shape (repeat,) for a single expression, (len(expressions), repeat) for a list
+#      rolls:   per expression arrays of shape (repeat, kept dice) in term order
+#      dropped: same for the dice keep/drop left out, (repeat, 0) when nothing was dropped
+def roll_batch(expressions, repeat=1, seed=None, detail=False):
+    single = isinstance(expressions, str)
+    if single:
+        expressions = [expressions]
+    if repeat < 1:
+        raise ValueError("repeat must be at least 1.")
+
+    plan = BatchPlan([parse_expression(expression) for expression in expressions])
+    rng = make_generator(seed)
+
+    if detail:
+        totals, rolls, dropped = plan.roll(rng, repeat, detail=True)
+    else:
+        totals = np.empty((len(expressions), repeat), dtype=np.int64)
+        block = max(1, CHUNK_DICE // max(1, plan.dice_per_roll))
+        for start in range(0, repeat, block):
+            stop = min(repeat, start + block)
+            totals[:, start:stop], _, _ = plan.roll(rng, stop - start)
+
+    result = {
+        "expressions": list(expressions),
+        "modifiers": plan.modifiers,
+        "totals": totals[0] if single else totals,
+    }
+    if detail:
+        result["rolls"] = rolls[0] if single else rolls
+        result["dropped"] = dropped[0] if single else dropped
+    return result
+
+
+#  how a list of expressions gets rolled
+#  plain NdS terms from every expression share one draw and are summed with reduceat,
+#  terms with keep/drop, rerolls or exploding dice get their own vectorized pass
+class BatchPlan:
+
+    def __init__(self, parsed):
+        self.count = len(parsed)
+        self.modifiers = np.array([expression.modifier for expression in parsed], dtype=np.int64)
+
+        #  (expression index, position in that expression, sign, node)
+        self.plain = []
+        self.special = []
+        for owner, expression in enumerate(parsed):
+            for position, (sign, node) in enumerate(expression.dice):
+                target = self.plain if node.plain else self.special
+                target.append((owner, position, sign, node))
+
+        counts = np.array([node.count for _, _, _, node in self.plain], dtype=np.int64)
+        sides = np.array([node.sides for _, _, _, node in self.plain], dtype=np.int64)
+        self.plain_owners = np.array([owner for owner, _, _, _ in self.plain], dtype=np.int64)
+        self.plain_signs = np.array([sign for _, _, sign, _ in self.plain], dtype=np.int64)
+        self.die_sides = np.repeat(sides, counts)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self.dice_per_roll = int(counts.sum()) + sum(node.count for _, _, _, node in self.special)
+
+    def roll(self, rng, repeat, detail=False):
+        totals = np.zeros((self.count, repeat), dtype=np.int64)
+        totals += self.modifiers[:, None]
+        pieces = [[] for _ in range(self.count)] if detail else None
+        lost = [[] for _ in range(self.count)] if detail else None
+
+        if self.plain:
+            draws = rng.integers(1, self.die_sides + 1, size=(repeat, self.die_sides.size))
+            sums = np.add.reduceat(draws, self.offsets, axis=1)
+            np.add.at(totals, self.plain_owners, (sums * self.plain_signs).T)
+            if detail:
+                for (owner, position, _, node), offset in zip(self.plain, self.offsets):
+                    pieces[owner].append((position, draws[:, offset:offset + node.count]))
+
+        for owner, position, sign, node in self.special:
+            kept, dropped = roll_special(rng, node, repeat)
+            totals[owner] += sign * kept.sum(axis=1)
+            if detail:
+                pieces[owner].append((position, kept))
+                lost[owner].append((position, dropped))
+
+        if not detail:
+            return totals, None, None
+        return totals, _in_term_order(pieces, repeat), _in_term_order(lost, repeat)
+
+
+#  per expression (position, dice) pieces joined into one (repeat, dice) array in term order
+def _in_term_order(pieces, repeat):
+    joined = []
+    for owner_pieces in pieces:
+        owner_pieces.sort(key=lambda piece: piece[0])
+        arrays = [piece for _, piece in owner_pieces]
+        joined.append(np.concatenate(arrays, axis=1) if arrays else np.empty((repeat, 0), dtype=np.int64))
+    return joined
+
+
+#  a keep/drop, reroll or exploding term rolled repeat times
+#  returns the kept dice (repeat, keep_count) and the dropped ones (repeat, count - keep_count)
+def roll_special(rng, node, repeat):
+    shape = (repeat, node.count)
+    dice = rng.integers(1, node.sides + 1, size=shape)
+
+    if node.reroll_once:
+        again = rng.integers(1, node.sides + 1, size=shape)
+        dice = np.where(dice <= node.reroll, again, dice)
+    elif node.reroll:
+        #  only the dice still at or under the reroll value are drawn again
+        low = dice <= node.reroll
+        while low.any():
+            dice[low] = rng.integers(1, node.sides + 1, size=int(low.sum()))
+            low = dice <= node.reroll
+
+    if node.explode:
+        last = dice
+        chain = 0
+        while chain < MAX_EXPLOSIONS:
+            exploding = last == node.sides
+            if not exploding.any():
+                break
+            last = np.where(exploding, rng.integers(1, node.sides + 1, size=shape), 0)
+            dice = dice + last
+            chain += 1
+
+    if node.keep is None:
+        return dice, dice[:, :0]
+
+    ordered = np.sort(dice, axis=1)
+    if node.keep == "h":
+        split = node.count - node.keep_count
+        return ordered[:, split:], ordered[:, :split]
+    return ordered[:, :node.keep_count], ordered[:, node.keep_count:]
+
+
+#  turn row i of a batch back into the dict roll_dice returns
+def roll_dict(batch, index=0, expression=0):
+    if "rolls" not in batch:
+        raise ValueError("Batch was rolled without detail=True.")
+
+    totals = batch["totals"]
+    rolls = batch["rolls"]
+    dropped = batch.get("dropped")
+    if totals.ndim == 1:
+        roll_row, total = rolls[index], totals[index]
+        dropped_row = dropped[index] if dropped is not None else None
+        modifier = batch["modifiers"][0]
+    else:
+        roll_row, total = rolls[expression][index], totals[expression][index]
+        dropped_row = dropped[expression][index] if dropped is not None else None
+        modifier = batch["modifiers"][expression]
+
+    result = {
+        "rolls": roll_row.tolist(),
+        "modifier": int(modifier),
+        "total": int(total)
+    }
+    #  same as roll_dice, only there when dice were kept/dropped
+    if dropped_row is not None and len(dropped_row):
+        result["dropped"] = dropped_row.tolist()
+    return result
@@ -0,0 +1,261 @@
+import random
+import re
+from functools import lru_cache
+
+#  full dice notation, parsed once per distinct string and kept as a ready to call closure
+#
+#      2d6+1d4+3      sums of any number of dice and constant terms (+ or -)
+#      4d6kh3  4d6k3  keep highest, 2d20kl1 keep lowest
+#      4d6dl1  4d6dh1 drop lowest / drop highest
+#      2d6r2          reroll any die showing 2 or less until it shows more
+#      2d6ro2         reroll any die showing 2 or less, once
+#      1d6!           exploding, a max roll adds another die
+#      d20 / d%       count defaults to 1, d% is a d100
+#      1d20+5 adv     advantage (or dis), turns the first d20 into 2d20kh1 / 2d20kl1
+
+MAX_DICE = 10000
+MAX_EXPLOSIONS = 100
+CACHE_SIZE = 1024
+
+TERM = re.compile(r'([+-])?(?:(\d*)d(\d+|%)((?:kh|kl|dl|dh|ro|k|r|!)\d*)*|(\d+))')
+OPTION = re.compile(r'(kh|kl|dl|dh|ro|k|r|!)(\d*)')
+ADVANTAGE = re.compile(r'\s+(adv|advantage|dis|disadvantage)\s*$')
+
+
+class Constant:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return str(self.value)
+
+
+#  keep is 'h' or 'l' (or None for every die) and keep_count how many of them stay
+#  reroll is the highest face that gets rerolled, reroll_once stops after one reroll (ro) instead of
+#  rerolling until the die shows more (r)
+class Dice:
+    __slots__ = ('count', 'sides', 'keep', 'keep_count', 'reroll', 'reroll_once', 'explode')
+
+    def __init__(self, count, sides, keep=None, keep_count=None, reroll=0, explode=False, reroll_once=False):
+        self.count = count
+        self.sides = sides
+        self.keep = keep
+        self.keep_count = count if keep_count is None else keep_count
+        self.reroll = reroll
+        self.reroll_once = reroll_once
+        self.explode = explode
+
+    @property
+    def plain(self):
+        return self.keep is None and not self.reroll and not self.explode
+
+    def __repr__(self):
+        text = f"{self.count}d{self.sides}"
+        if self.keep:
+            text += f"k{self.keep}{self.keep_count}"
+        if self.reroll:
+            text += f"{'ro' if self.reroll_once else 'r'}{self.reroll}"
+        if self.explode:
+            text += "!"
+        return text
+
+
+#  terms is a list of (sign, node) pairs, sign is 1 or -1
+class Expression:
+    __slots__ = ('text', 'terms')
+
+    def __init__(self, text, terms):
+        self.text = text
+        self.terms = terms
+
+    @property
+    def modifier(self):
+        return sum(sign * node.value for sign, node in self.terms if isinstance(node, Constant))
+
+    @property
+    def dice(self):
+        return [(sign, node) for sign, node in self.terms if isinstance(node, Dice)]
+
+    def __repr__(self):
+        parts = []
+        for sign, node in self.terms:
+            parts.append(("-" if sign < 0 else "+") + repr(node))
+        return "".join(parts).lstrip("+")
+
+
+def parse(dice_input):
+    if not isinstance(dice_input, str):
+        raise ValueError(f"Invalid dice format: {dice_input}")
+
+    text = dice_input.strip().lower()
+    advantage = None
+    match = ADVANTAGE.search(text)
+    if match:
+        advantage = match.group(1)[:3]
+        text = text[:match.start()]
+
+    text = text.replace(" ", "")
+    if not text:
+        raise ValueError(f"Invalid dice format: {dice_input}")
+
+    terms = []
+    position = 0
+    while position < len(text):
+        match = TERM.match(text, position)
+        if not match or match.end() == position or (terms and not match.group(1)):
+            raise ValueError(f"Invalid dice format: {dice_input}")
+        position = match.end()
+
+        sign = -1 if match.group(1) == "-" else 1
+        if match.group(5) is not None:
+            terms.append((sign, Constant(int(match.group(5)))))
+        else:
+            terms.append((sign, _dice_term(match, dice_input)))
+
+    expression = Expression(dice_input, terms)
+    if not expression.dice:
+        raise ValueError(f"Invalid dice format: {dice_input}")
+    if advantage:
+        _apply_advantage(expression, advantage)
+    return expression
+
+
+def _dice_term(match, dice_input):
+    count = int(match.group(2)) if match.group(2) else 1
+    sides = 100 if match.group(3) == "%" else int(match.group(3))
+
+    if count < 1 or sides < 2:
+        raise ValueError("Number of dice must be at least 1 and sides at least 2.")
+    if count > MAX_DICE:
+        raise ValueError(f"At most {MAX_DICE} dice can be rolled at once.")
+
+    node = Dice(count, sides)
+    options = match.string[match.end(3):match.end()]
+    for option, amount in OPTION.findall(options):
+        amount = int(amount) if amount else None
+
+        if option in ("kh", "k", "kl", "dl", "dh"):
+            if node.keep is not None:
+                raise ValueError(f"Only one keep or drop is allowed per dice term: {dice_input}")
+            amount = 1 if amount is None else amount
+            if option in ("kh", "k"):
+                node.keep, node.keep_count = "h", amount
+            elif option == "kl":
+                node.keep, node.keep_count = "l", amount
+            elif option == "dl":
+                node.keep, node.keep_count = "h", count - amount
+            else:
+                node.keep, node.keep_count = "l", count - amount
+            if not 1 <= node.keep_count <= count:
+                raise ValueError(f"Can't keep {node.keep_count} of {count} dice: {dice_input}")
+
+        elif option in ("r", "ro"):
+            if amount is None or not 1 <= amount < sides:
+                raise ValueError(f"Reroll needs a value between 1 and {sides - 1}: {dice_input}")
+            if node.reroll:
+                raise ValueError(f"Only one reroll is allowed per dice term: {dice_input}")
+            node.reroll = amount
+            node.reroll_once = option == "ro"
+
+        else:
+            node.explode = True
+
+    return node
+
+
+def _apply_advantage(expression, mode):
+    for sign, node in expression.dice:
+        if node.sides == 20 and node.count == 1 and node.keep is None:
+            node.count = 2
+            node.keep = "h" if mode == "adv" else "l"
+            node.keep_count = 1
+            return
+    raise ValueError(f"Advantage and disadvantage need a single d20 to roll: {expression.text}")
+
+
+#  one dice term as a function of randint, returns (kept dice, dropped dice)
+def _compile_dice(node):
+    count, sides, reroll, explode, reroll_once = node.count, node.sides, node.reroll, node.explode, node.reroll_once
+
+    if not reroll and not explode:
+        def roll_all(randint):
+            return [randint(1, sides) for _ in range(count)]
+    else:
+        def roll_one(randint):
+            value = randint(1, sides)
+            if reroll_once and value <= reroll:
+                value = randint(1, sides)
+            while not reroll_once and value <= reroll:
+                value = randint(1, sides)
+            total = value
+            chain = 0
+            while explode and value == sides and chain < MAX_EXPLOSIONS:
+                value = randint(1, sides)
+                total += value
+                chain += 1
+            return total
+
+        def roll_all(randint):
+            return [roll_one(randint) for _ in range(count)]
+
+    if node.keep is None:
+        def roll(randint):
+            return roll_all(randint), []
+        return roll
+
+    keep_count, highest = node.keep_count, node.keep == "h"
+
+    def roll(randint):
+        rolls = roll_all(randint)
+        order = sorted(range(count), key=rolls.__getitem__, reverse=highest)
+        kept = set(order[:keep_count])
+        return ([value for i, value in enumerate(rolls) if i in kept],
+                [value for i, value in enumerate(rolls) if i not in kept])
+    return roll
+
+
+class CompiledExpression:
+    __slots__ = ('expression', 'modifier', '_terms')
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.modifier = expression.modifier
+        self._terms = [(sign, _compile_dice(node)) for sign, node in expression.dice]
+
+    #  same dict roll_dice has always returned, plus "dropped" when dice were kept/dropped
+    #  rng is anything with randint (random.Random(seed) for repeatable rolls)
+    def roll(self, rng=None):
+        randint = (rng or random).randint
+        rolls = []
+        dropped = []
+        total = self.modifier
+
+        for sign, term in self._terms:
+            kept, lost = term(randint)
+            rolls.extend(kept)
+            dropped.extend(lost)
+            total += sign * sum(kept)
+
+        result = {
+            "rolls": rolls,
+            "modifier": self.modifier,
+            "total": total
+        }
+        if dropped:
+            result["dropped"] = dropped
+        return result
+
+
+#  hot expressions cost one cache lookup, errors are not cached
+#  anything but a string is refused before the cache, lists and dicts can't be hashed
+def compile_expression(dice_input):
+    if not isinstance(dice_input, str):
+        raise ValueError(f"Invalid dice format: {dice_input}")
+    return _compile(dice_input)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile(dice_input):
+    return CompiledExpression(parse(dice_input))
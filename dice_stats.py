@@ -0,0 +1,248 @@
+from functools import lru_cache
+from itertools import combinations_with_replacement
+from math import comb, factorial
+
+import numpy as np
+
+from dice_expr import compile_expression
+
+#  above this many outcomes on both sides, convolutions go through the FFT instead of np.convolve
+FFT_THRESHOLD = 512
+CACHE_SIZE = 1024
+
+#  exploding dice have no upper bound, the chain is cut off after this many extra dice
+#  (the leftover probability is well below 1e-12 for anything d4 or bigger at this depth)
+EXPLODE_DEPTH = 20
+
+
+#  exact distribution of a dice expression
+#  pmf[i] is the chance of rolling exactly offset + i
+class Distribution:
+    __slots__ = ('pmf', 'offset', '_cdf')
+
+    def __init__(self, pmf, offset):
+        self.pmf = pmf
+        self.offset = offset
+        self._cdf = None
+
+    @property
+    def minimum(self):
+        return self.offset
+
+    @property
+    def maximum(self):
+        return self.offset + len(self.pmf) - 1
+
+    @property
+    def values(self):
+        return np.arange(self.offset, self.offset + len(self.pmf))
+
+    @property
+    def cdf(self):
+        if self._cdf is None:
+            self._cdf = np.minimum(np.cumsum(self.pmf), 1.0)
+        return self._cdf
+
+    @property
+    def mean(self):
+        return float(np.dot(self.values, self.pmf))
+
+    @property
+    def variance(self):
+        deviation = self.values - self.mean
+        return float(np.dot(deviation * deviation, self.pmf))
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+    def probability(self, total):
+        position = total - self.offset
+        if 0 <= position < len(self.pmf):
+            return float(self.pmf[position])
+        return 0.0
+
+    #  chance of rolling total or lower
+    def at_most(self, total):
+        position = total - self.offset
+        if position < 0:
+            return 0.0
+        if position >= len(self.pmf):
+            return 1.0
+        return float(self.cdf[position])
+
+    #  "what's the chance 8d6 >= 30"
+    def at_least(self, total):
+        return 1.0 - self.at_most(total - 1)
+
+    #  smallest total with at least q of the rolls at or below it, q in [0, 1]
+    def percentile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError("Percentile must be between 0 and 1.")
+        position = int(np.searchsorted(self.cdf, q - 1e-12))
+        return self.offset + min(position, len(self.pmf) - 1)
+
+    def __add__(self, other):
+        return Distribution(convolve(self.pmf, other.pmf), self.offset + other.offset)
+
+    def __neg__(self):
+        return Distribution(self.pmf[::-1].copy(), -self.maximum)
+
+    def shifted(self, amount):
+        return Distribution(self.pmf, self.offset + amount)
+
+    def summary(self, percentiles=(0.1, 0.25, 0.5, 0.75, 0.9)):
+        return {
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": self.mean,
+            "variance": self.variance,
+            "std": self.std,
+            "percentiles": {str(q): self.percentile(q) for q in percentiles},
+        }
+
+
+def convolve(left, right):
+    if min(len(left), len(right)) < FFT_THRESHOLD:
+        return np.convolve(left, right)
+
+    size = len(left) + len(right) - 1
+    result = np.fft.irfft(np.fft.rfft(left, size) * np.fft.rfft(right, size), size)
+    #  FFT round off leaves tiny negatives and a total a hair off 1
+    result = np.clip(result, 0.0, None)
+    return result / result.sum()
+
+
+#  one die, outcomes 1..sides, after a reroll (until above reroll, or just once) and/or explosion
+@lru_cache(maxsize=CACHE_SIZE)
+def single_die(sides, reroll=0, explode=False, reroll_once=False):
+    pmf = np.full(sides, 1.0 / sides)
+
+    if reroll and reroll_once:
+        rerolled = np.full(sides, (reroll / sides) / sides)
+        pmf[:reroll] = 0.0
+        pmf = pmf + rerolled
+    elif reroll:
+        pmf[:reroll] = 0.0
+        pmf[reroll:] = 1.0 / (sides - reroll)
+
+    if explode:
+        #  a max roll keeps the sides and rolls again (rerolls only apply to the first die)
+        plain = np.full(sides, 1.0 / sides)
+        chain = np.zeros(sides * (EXPLODE_DEPTH + 1))
+        chain[:sides - 1] = plain[:sides - 1]
+        carry = 1.0 / sides
+        for depth in range(1, EXPLODE_DEPTH + 1):
+            start = depth * sides
+            chain[start:start + sides - 1] += carry * plain[:sides - 1]
+            carry /= sides
+        chain[EXPLODE_DEPTH * sides + sides - 1] += carry
+        head = pmf[:sides - 1]
+        max_chance = pmf[sides - 1]
+        pmf = np.zeros_like(chain)
+        pmf[:sides - 1] = head
+        pmf[sides:] += max_chance * chain[:len(chain) - sides]
+
+    pmf.setflags(write=False)
+    return pmf
+
+
+#  sum of count identical dice, built by squaring so 100d6 needs ~7 convolutions not 100
+@lru_cache(maxsize=CACHE_SIZE)
+def dice_sum(count, sides, reroll=0, explode=False, reroll_once=False):
+    if count == 1:
+        return single_die(sides, reroll, explode, reroll_once)
+
+    half = dice_sum(count // 2, sides, reroll, explode, reroll_once)
+    pmf = convolve(half, half)
+    if count % 2:
+        pmf = convolve(pmf, single_die(sides, reroll, explode, reroll_once))
+    pmf.setflags(write=False)
+    return pmf
+
+
+#  keep the highest (or lowest) one of count dice: P(max <= k) = (k / sides) ** count
+@lru_cache(maxsize=CACHE_SIZE)
+def keep_one(count, sides, highest=True):
+    faces = np.arange(0, sides + 1) / sides
+    if highest:
+        cdf = faces ** count
+    else:
+        cdf = 1.0 - (1.0 - faces) ** count
+    pmf = np.diff(cdf)
+    pmf.setflags(write=False)
+    return pmf
+
+
+#  general keep highest/lowest m of n by walking every sorted outcome, only used for small pools (4d6kh3)
+@lru_cache(maxsize=CACHE_SIZE)
+def keep_many(count, sides, keep_count, highest=True):
+    pmf = np.zeros(keep_count * sides + 1)
+    total_outcomes = float(sides) ** count
+    for faces in combinations_with_replacement(range(1, sides + 1), count):
+        ways = factorial(count)
+        for face in set(faces):
+            ways //= factorial(faces.count(face))
+        kept = faces[count - keep_count:] if highest else faces[:keep_count]
+        pmf[sum(kept)] += ways / total_outcomes
+    pmf = pmf[keep_count:]
+    pmf.setflags(write=False)
+    return pmf
+
+
+#  keep pools bigger than this (in sorted outcomes) are refused instead of enumerated
+MAX_KEEP_OUTCOMES = 200000
+
+
+def term_distribution(node):
+    if node.keep is None:
+        pmf = dice_sum(node.count, node.sides, node.reroll, node.explode, node.reroll_once)
+        return Distribution(pmf, node.count)
+
+    if node.reroll or node.explode:
+        raise ValueError(f"Exact odds for {node!r} are not supported, keep/drop can't be combined with rerolls or exploding dice.")
+
+    highest = node.keep == "h"
+    if node.keep_count == node.count:
+        return Distribution(dice_sum(node.count, node.sides), node.count)
+    if node.keep_count == 1:
+        return Distribution(keep_one(node.count, node.sides, highest), 1)
+
+    if comb(node.count + node.sides - 1, node.count) > MAX_KEEP_OUTCOMES:
+        raise ValueError(f"Exact odds for {node!r} would take too long to work out.")
+    return Distribution(keep_many(node.count, node.sides, node.keep_count, highest), node.keep_count)
+
+
+#  exact distribution for anything dice_expr can parse, memoized per expression string
+def distribution(dice_input):
+    if not isinstance(dice_input, str):
+        raise ValueError(f"Invalid dice format: {dice_input}")
+    return _distribution(dice_input)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _distribution(dice_input):
+    expression = compile_expression(dice_input).expression
+
+    result = Distribution(np.ones(1), expression.modifier)
+    for sign, node in expression.dice:
+        term = term_distribution(node)
+        result = result + (term if sign > 0 else -term)
+    return result
+
+
+#  dict version for the dice roller, same error shape as roll_dice
+#  pmf is [total, probability] for every total that can come up, lowest first
+def analyze_dice(dice_input, at_least=None):
+    if at_least is not None and (isinstance(at_least, bool) or not isinstance(at_least, int)):
+        return {"error": "at_least must be a whole number."}
+    try:
+        odds = distribution(dice_input)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    result = odds.summary()
+    result["pmf"] = [[int(total), float(chance)] for total, chance in zip(odds.values, odds.pmf) if chance > 0]
+    if at_least is not None:
+        result["at_least"] = {"total": at_least, "probability": odds.at_least(at_least)}
+    return result
@@ -1,67 +1,50 @@
-import random
-import re
+import argparse
+import multiprocessing
+import time
 import mysql.connector
 import json
-from connections import get_info_spells
+from dice_expr import compile_expression
+from dice_stats import analyze_dice
+from spell_damage import damage_formula, parse_level, MAX_SLOT_LEVEL
 
+#expressions are compiled once and cached, see dice_expr for the notation
 def roll_dice(dice_input):
-    match = re.match(r'(\d+)d(\d+)(\s*([+-]\s*\d+))?', dice_input)
-    if not match:
-        return {"error": f"Invalid dice format: {dice_input}"}
-
-    num_dice = int(match.group(1))
-    num_sides = int(match.group(2))
-    modifier = match.group(3)
-
-    if num_dice < 1 or num_sides < 2:
-        return {"error": "Number of dice must be at least 1 and sides at least 2."}
-
-    rolls = [random.randint(1, num_sides) for _ in range(num_dice)]
-    total = sum(rolls)
-
-    if modifier:
-        modifier = int(modifier.replace(" ", ""))
-        total += modifier
-    else:
-        modifier = 0
-
-    return {
-        "rolls": rolls,
-        "modifier": modifier,
-        "total": total
-    }
-
-def get_damage_formula_from_spell(spell_name):
-    spell_data_json = get_info_spells()
-    
-    if not spell_data_json:
-        return None
-
     try:
-        spell_data = json.loads(spell_data_json)
+        compiled = compile_expression(dice_input)
+    except ValueError as e:
+        return {"error": str(e)}
 
-        if isinstance(spell_data, (list, tuple)):
-            damage = spell_data[DAMAGE_INDEX] if len(spell_data) > DAMAGE_INDEX else None
-        elif isinstance(spell_data, dict):
-            damage = spell_data.get('damage')
-        else:
-            damage = None
+    return compiled.roll()
 
-        return damage
+#exact odds of an expression instead of a roll: pmf, mean, variance, percentiles
+#and the chance of rolling at_least or more when it's given, see dice_stats
+def dice_odds(dice_input, at_least=None):
+    return analyze_dice(dice_input, at_least)
 
-    except json.JSONDecodeError:
-        print("Failed to parse spell data")
-        return None
+#spell damage comes from a name -> formula map built once from the cached spells table, no db or input() per roll
+#slot_level scales the dice the way the spell's higher_level text describes
+def get_damage_formula_from_spell(spell_name, slot_level=None):
+    return damage_formula(spell_name, slot_level)
 
-def process_input_file(input_filename="rollinput.json", output_filename="rolloutput.json"):
-    with open(input_filename, "r") as f:
-        input_data = json.load(f)
+#one request dict in, one result dict out
+#spell_formulas is an optional name -> dice expression map so batch runs only look a spell up once
+def process_request(input_data, spell_formulas=None):
+    if not isinstance(input_data, dict):
+        return {"error": "Invalid input type."}
 
     input_type = input_data.get("input_type")
     value = input_data.get("value")
 
     if input_type == "spell":
-        dice_expression = get_damage_formula_from_spell(value)
+        slot_level = input_data.get("slot_level")
+        key = spell_key(input_data)
+        try:
+            if spell_formulas is not None and key in spell_formulas:
+                dice_expression = spell_formulas[key]
+            else:
+                dice_expression = get_damage_formula_from_spell(value, slot_level)
+        except (ValueError, TypeError) as e:
+            return {"error": str(e)}
 
         if dice_expression is None:
             output_data = {"error": f"Spell '{value}' not found in database."}
@@ -73,6 +56,8 @@ def process_input_file(input_filename="rollinput.json", output_filename="rollout
                 "dice_expression": dice_expression,
                 "roll_result": result
             }
+            if slot_level is not None:
+                output_data["slot_level"] = slot_level
 
     elif input_type == "manual":
         result = roll_dice(value)
@@ -81,12 +66,140 @@ def process_input_file(input_filename="rollinput.json", output_filename="rollout
             "dice_expression": value,
             "roll_result": result
         }
+    elif input_type == "odds":
+        output_data = {
+            "input_type": "odds",
+            "dice_expression": value,
+            "odds": dice_odds(value, input_data.get("at_least"))
+        }
     else:
         output_data = {"error": "Invalid input type."}
 
+    return output_data
+
+#a request that blows up becomes its own error line instead of taking the rest of the batch with it
+def process_requests(requests, spell_formulas=None):
+    results = []
+    for request in requests:
+        try:
+            results.append(process_request(request, spell_formulas))
+        except Exception as e:
+            results.append({"error": str(e) or type(e).__name__})
+    return results
+
+def process_input_file(input_filename="rollinput.json", output_filename="rolloutput.json"):
+    with open(input_filename, "r") as f:
+        input_data = json.load(f)
+
+    output_data = process_request(input_data)
+
     with open(output_filename, "w") as f:
         json.dump(output_data, f, indent=4)
 
+def is_error(output_data):
+    return "error" in output_data or "error" in output_data.get("roll_result", output_data.get("odds", {}))
+
+#json lines in, json lines out, one result line per request line in the same order
+#the input is read chunk_size lines at a time so any file size runs in the same memory
+#each distinct spell is looked up once in this process and handed to the workers,
+#a lookup that fails is recorded once and every line asking for that spell gets the error
+def process_batch_file(input_filename="rollinput.jsonl", output_filename="rolloutput.jsonl", workers=1, chunk_size=1000):
+    start = time.perf_counter()
+    spell_formulas = {}
+    spell_errors = {}
+    stats = {"processed": 0, "errors": 0}
+
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        with open(input_filename, "r") as infile, open(output_filename, "w") as outfile:
+            for chunk in read_chunks(infile, chunk_size):
+                for request in chunk:
+                    key = spell_key(request)
+                    if key is not None and key not in spell_formulas and key not in spell_errors:
+                        try:
+                            spell_formulas[key] = get_damage_formula_from_spell(*key)
+                        except Exception as e:
+                            spell_errors[key] = {"error": str(e) or type(e).__name__}
+                chunk = [spell_errors.get(spell_key(request), request) for request in chunk]
+
+                results = roll_chunk(pool, workers, chunk, spell_formulas)
+
+                for output_data in results:
+                    stats["processed"] += 1
+                    if is_error(output_data):
+                        stats["errors"] += 1
+                    outfile.write(json.dumps(output_data) + "\n")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["per_second"] = stats["processed"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["distinct_spells"] = len(spell_formulas)
+
+    print(f"Processed {stats['processed']} requests ({stats['errors']} errors) in "
+          f"{stats['seconds']:.2f}s, {stats['per_second']:.0f} requests/s")
+    return stats
+
+#(spell name, slot level) for spell requests that can be looked up ahead of time, None otherwise
+#the slot level is read the way spell_damage reads it so "5" and 5 share one lookup
+def spell_key(request):
+    if request.get("input_type") != "spell":
+        return None
+    value, slot_level = request.get("value"), request.get("slot_level")
+    if not isinstance(value, str):
+        return None
+    if slot_level is not None:
+        try:
+            slot_level = parse_level(slot_level, "slot_level", 0, MAX_SLOT_LEVEL)
+        except ValueError:
+            return None
+    return (value, slot_level)
+
+#bad json lines come out as their own error so every input line still gets an output line
+def read_chunks(infile, chunk_size):
+    chunk = []
+    for line_number, line in enumerate(infile, start=1):
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            request = {"error": f"Invalid JSON on line {line_number}."}
+        chunk.append(request if isinstance(request, dict) else {"error": "Invalid input type."})
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def roll_chunk(pool, workers, chunk, spell_formulas):
+    requests = [request for request in chunk if "error" not in request]
+    if pool is None:
+        results = iter(process_requests(requests, spell_formulas))
+    else:
+        #only send the spells this chunk actually uses to the workers
+        keys = {spell_key(request) for request in requests}
+        needed = {key: spell_formulas[key] for key in keys if key in spell_formulas}
+        size = max(1, -(-len(requests) // workers))
+        slices = [requests[i:i + size] for i in range(0, len(requests), size)]
+        results = iter([output for part in pool.starmap(process_requests, [(part, needed) for part in slices]) for output in part])
+
+    return [request if "error" in request else next(results) for request in chunk]
+
 
 if __name__ == "__main__":
-    process_input_file()
+    parser = argparse.ArgumentParser(description="Roll dice from a request file.")
+    parser.add_argument("input", nargs="?", default="rollinput.json")
+    parser.add_argument("output", nargs="?", default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    #.jsonl files run in batch mode, anything else is the single request file like before
+    if args.input.endswith(".jsonl"):
+        process_batch_file(args.input, args.output or "rolloutput.jsonl", args.workers, args.chunk_size)
+    else:
+        process_input_file(args.input, args.output or "rolloutput.json")
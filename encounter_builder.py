@@ -0,0 +1,263 @@
+import random
+import time
+from itertools import product
+
+import numpy as np
+
+from connections import reference
+
+#  balanced encounter building from the monsters table
+#
+#  the index groups monsters by XP (there are only ~30 distinct values), so the search runs over
+#  "2 at 1,800 XP + 3 at 200 XP" patterns instead of every combination of 300+ monsters, and
+#  only the patterns that fit the budget are expanded into actual monsters
+#
+#  XP budgets and the group-size multiplier follow the DMG encounter building rules
+
+#  per character level: easy, medium, hard, deadly
+XP_THRESHOLDS = {
+    1: (25, 50, 75, 100), 2: (50, 100, 150, 200), 3: (75, 150, 225, 400), 4: (125, 250, 375, 500),
+    5: (250, 500, 750, 1100), 6: (300, 600, 900, 1400), 7: (350, 750, 1100, 1700), 8: (450, 900, 1400, 2100),
+    9: (550, 1100, 1600, 2400), 10: (600, 1200, 1900, 2800), 11: (800, 1600, 2400, 3600),
+    12: (1000, 2000, 3000, 4500), 13: (1100, 2200, 3400, 5100), 14: (1250, 2500, 3800, 5700),
+    15: (1400, 2800, 4300, 6400), 16: (1600, 3200, 4800, 7200), 17: (2000, 3900, 5900, 8800),
+    18: (2100, 4200, 6300, 9500), 19: (2400, 4900, 7300, 10900), 20: (2800, 5700, 8500, 12700),
+}
+DIFFICULTIES = ('easy', 'medium', 'hard', 'deadly')
+
+#  1 monster x1, 2 x1.5, 3-6 x2, 7-10 x2.5, 11-14 x3, 15+ x4, one step up for parties under 3
+#  and one step down for parties of 6 or more (the ends of the list are only reached that way)
+MULTIPLIERS = (0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0, 5.0)
+GROUP_STEPS = ((15, 6), (11, 5), (7, 4), (3, 3), (2, 2), (1, 1))
+
+MAX_MONSTERS = 8
+MAX_KINDS = 3
+#  groups below this share of the budget are too easy to be worth listing
+DEFAULT_FLOOR = 0.5
+#  the search stops at whichever comes first, patterns kept or branches tried, most of the branches
+#  of a big search never reach the floor so capping only the patterns kept doesn't bound the time
+MAX_PATTERNS = 200000
+MAX_NODES = 1000000
+#  the biggest budget a party can have: the deadly threshold of MAX_PARTY_SIZE level 20 characters
+MAX_PARTY_SIZE = 12
+MAX_BUDGET = MAX_PARTY_SIZE * XP_THRESHOLDS[20][-1]
+
+
+def multiplier(monsters, party_size=4):
+    if monsters < 1:
+        return 1.0
+    step = next(step for at_least, step in GROUP_STEPS if monsters >= at_least)
+    if party_size < 3:
+        step += 1
+    elif party_size >= 6:
+        step -= 1
+    return MULTIPLIERS[step]
+
+
+#  {difficulty: total XP threshold} for a party given as character levels
+def party_thresholds(levels):
+    if not levels:
+        raise ValueError("The party needs at least one character.")
+    if len(levels) > MAX_PARTY_SIZE:
+        raise ValueError(f"The party can have at most {MAX_PARTY_SIZE} characters.")
+    totals = [0, 0, 0, 0]
+    for level in levels:
+        level = int(level)
+        if level not in XP_THRESHOLDS:
+            raise ValueError(f"Character level {level} is outside 1-20.")
+        for position, threshold in enumerate(XP_THRESHOLDS[level]):
+            totals[position] += threshold
+    return dict(zip(DIFFICULTIES, totals))
+
+
+#  hardest difficulty the adjusted XP reaches, 'trivial' below easy
+def rate(adjusted_xp, thresholds):
+    rating = 'trivial'
+    for difficulty in DIFFICULTIES:
+        if adjusted_xp >= thresholds[difficulty]:
+            rating = difficulty
+    return rating
+
+
+class EncounterIndex:
+
+    def __init__(self, table):
+        self.table = table
+        typed = table.typed
+        xp = np.nan_to_num(typed['xp'], nan=0.0).astype(np.int64)
+        self.xp = xp
+        self.challenge_rating = typed['challenge_rating']
+        self.types = np.array([str(row.type or '').strip().lower() for row in table.rows])
+        self.sizes = np.array([str(row.size or '').strip().lower() for row in table.rows])
+
+        #  monsters worth no XP can't be budgeted, they'd pad every encounter forever
+        usable = np.nonzero(xp > 0)[0]
+        order = usable[np.lexsort((self.challenge_rating[usable], xp[usable]))]
+        self.order = order
+        #  distinct XP values ascending, and where each one's monsters start/stop in order
+        self.levels, starts = np.unique(xp[order], return_index=True)
+        self.bounds = np.append(starts, len(order))
+
+    #  monster positions per XP level after the filters, empty levels dropped
+    #  types and sizes are lists of names, a single name on its own is taken as a list of one
+    def candidates(self, types=None, sizes=None, cr_min=None, cr_max=None):
+        mask = np.ones(len(self.xp), dtype=bool)
+        if types:
+            mask &= np.isin(self.types, _names(types, 'types'))
+        if sizes:
+            mask &= np.isin(self.sizes, _names(sizes, 'sizes'))
+        if cr_min is not None:
+            mask &= self.challenge_rating >= float(cr_min)
+        if cr_max is not None:
+            mask &= self.challenge_rating <= float(cr_max)
+
+        levels = []
+        for level, start, stop in zip(self.levels, self.bounds[:-1], self.bounds[1:]):
+            positions = self.order[start:stop]
+            positions = positions[mask[positions]]
+            if len(positions):
+                levels.append((int(level), positions))
+        return levels
+
+    #  every (xp level index, count) pattern whose adjusted XP is between floor and budget,
+    #  and False if MAX_PATTERNS or MAX_NODES cut the search short
+    #  levels are walked from the most expensive down, a branch stops as soon as even the
+    #  cheapest remaining monster would push the group over budget
+    def patterns(self, levels, budget, floor=0.0, party_size=4, max_monsters=MAX_MONSTERS,
+                 max_kinds=MAX_KINDS, use_multiplier=True):
+        xp_values = [level for level, _ in levels]
+        cheapest = xp_values[0] if xp_values else 0
+        found = []
+        visited = 0
+
+        factors = [multiplier(count, party_size) if use_multiplier else 1.0 for count in range(max_monsters + 1)]
+
+        def adjusted(raw, count):
+            return raw * factors[count]
+
+        def walk(position, raw, count, chosen):
+            nonlocal visited
+            visited += 1
+            if visited > MAX_NODES:
+                return True
+            if chosen and adjusted(raw, count) >= floor:
+                found.append((adjusted(raw, count), raw, count, tuple(chosen)))
+                if len(found) >= MAX_PATTERNS:
+                    return True
+            if count >= max_monsters or len(chosen) >= max_kinds:
+                return False
+            if adjusted(raw + cheapest, count + 1) > budget:
+                return False
+
+            for next_position in range(position - 1, -1, -1):
+                xp = xp_values[next_position]
+                for extra in range(1, max_monsters - count + 1):
+                    if adjusted(raw + xp * extra, count + extra) > budget:
+                        break
+                    chosen.append((next_position, extra))
+                    stop = walk(next_position, raw + xp * extra, count + extra, chosen)
+                    chosen.pop()
+                    if stop:
+                        return True
+            return False
+
+        stopped = walk(len(xp_values), 0, 0, [])
+        return found, not stopped
+
+    def _group(self, pattern, picks, thresholds):
+        adjusted, raw, count, entries = pattern
+        monsters = []
+        for (_, quantity), position in zip(entries, picks):
+            row = self.table.rows[position]
+            monsters.append({
+                "id": row.id,
+                "name": row.name,
+                "challenge_rating": float(self.challenge_rating[position]),
+                "xp": int(self.xp[position]),
+                "count": quantity,
+            })
+        group = {
+            "monsters": monsters,
+            "count": count,
+            "xp": int(raw),
+            "adjusted_xp": float(adjusted),
+        }
+        if thresholds:
+            group["difficulty"] = rate(adjusted, thresholds)
+        return group
+
+    #  up to limit groups, closest to the budget first
+    #  sample=True picks random patterns and random monsters for them instead (seeded)
+    def build(self, budget, party_levels=None, limit=20, sample=False, seed=None, floor=DEFAULT_FLOOR,
+              max_monsters=MAX_MONSTERS, max_kinds=MAX_KINDS, use_multiplier=True, **filters):
+        start = time.perf_counter()
+        party_size = len(party_levels) if party_levels else 4
+        thresholds = party_thresholds(party_levels) if party_levels else None
+        levels = self.candidates(**filters)
+        found, complete = self.patterns(levels, budget, budget * floor, party_size, max_monsters, max_kinds,
+                                        use_multiplier)
+
+        groups = []
+        if sample:
+            rng = random.Random(seed)
+            seen = set()
+            attempts = 0
+            while found and len(groups) < limit and attempts < limit * 20:
+                attempts += 1
+                pattern = rng.choice(found)
+                picks = tuple(int(rng.choice(levels[level_position][1])) for level_position, _ in pattern[3])
+                if (pattern[3], picks) in seen:
+                    continue
+                seen.add((pattern[3], picks))
+                groups.append(self._group(pattern, picks, thresholds))
+        else:
+            found.sort(key=lambda pattern: (-pattern[0], pattern[2]))
+            for pattern in found:
+                choices = [levels[level_position][1] for level_position, _ in pattern[3]]
+                for picks in product(*choices):
+                    groups.append(self._group(pattern, picks, thresholds))
+                    if len(groups) >= limit:
+                        break
+                if len(groups) >= limit:
+                    break
+
+        return {
+            "budget": budget,
+            "thresholds": thresholds,
+            "patterns": len(found),
+            "complete": complete,
+            "encounters": groups,
+            "seconds": time.perf_counter() - start,
+        }
+
+
+def _names(values, field):
+    if isinstance(values, str):
+        values = [values]
+    if not isinstance(values, (list, tuple, set)):
+        raise ValueError(f"{field} must be a list of names.")
+    return [str(value).strip().lower() for value in values]
+
+
+_index = None
+
+
+#  rebuilt automatically after connections.reload_reference_data() swaps the monsters table out
+def encounter_index():
+    global _index
+    table = reference.table('monsters')
+    if _index is None or _index.table is not table:
+        _index = EncounterIndex(table)
+    return _index
+
+
+#  budget is either given straight or taken from the party's threshold for difficulty
+def build_encounters(party_levels=None, difficulty=None, budget=None, **options):
+    if budget is None:
+        if not party_levels or difficulty not in DIFFICULTIES:
+            raise ValueError(f"Give either a budget or party levels and a difficulty ({', '.join(DIFFICULTIES)}).")
+        budget = party_thresholds(party_levels)[difficulty]
+    budget = int(budget)
+    if budget < 1:
+        raise ValueError("The XP budget must be at least 1.")
+    return encounter_index().build(budget, party_levels, **options)
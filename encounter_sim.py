@@ -0,0 +1,264 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from dice_batch import roll_batch
+from dice_stats import distribution
+from reference_etl import multiattack_count, parse_attacks
+
+#  Monte-Carlo fights between a party and a group of monsters, thousands of combats at once
+#
+#  a combatant is a plain dict so it can be shipped to worker processes:
+#      {"name", "hp", "ac", "attack_bonus", "damage" (dice expression), "attacks" (per round)}
+#  party members are passed in directly, monsters are built from rows of the monsters table
+#
+#  the fight itself is kept simple: each round the side that won initiative goes first,
+#  everyone attacks the first enemy still standing, a natural 20 doubles the damage dice,
+#  a natural 1 always misses, and the fight ends when one side is down (or max_rounds is hit)
+
+MAX_ROUNDS = 50
+PERCENTILES = (5, 25, 50, 75, 95)
+
+#  every combatant is a column in the (combats, combatants) arrays, so these bound the memory of one run
+MAX_PARTY_SIZE = 12
+MAX_MONSTERS = 50
+MAX_ATTACKS = 10
+
+SIMULATION_WORKERS = min(8, os.cpu_count() or 1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+#  one worker pool for the whole process, created on first use
+#  workers are spawned rather than forked so they never inherit a threaded web server's threads and locks
+def executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=SIMULATION_WORKERS,
+                                                mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _discard(pool):
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+    pool.shutdown(wait=False)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+#  a monsters table row as a combatant, using its hardest hitting attack for every multiattack swing
+#  attacks/multiattack can be passed in when they were already parsed (connections.monster_attacks)
+def monster_combatant(row, attacks=None, multiattack=None):
+    if attacks is None:
+        attacks = parse_attacks(row.actions)
+    if multiattack is None:
+        multiattack = multiattack_count(row.actions)
+
+    if attacks:
+        attack = max(attacks, key=lambda attack: distribution(attack["damage"]).mean)
+        attack_bonus, damage = attack["to_hit"], attack["damage"]
+    else:
+        #  nothing parseable (spellcasters, auras...), fall back to a basic strength attack
+        modifier = ((row.strength or 10) - 10) // 2
+        attack_bonus = (row.proficiency_bonus or 2) + modifier
+        damage = f"1d6{modifier:+d}" if modifier else "1d6"
+
+    return {
+        "name": row.name,
+        "hp": int(row.hit_points or 1),
+        "ac": int(row.armor_class or 10),
+        "attack_bonus": int(attack_bonus),
+        "damage": damage,
+        "attacks": multiattack,
+    }
+
+
+#  party member from request data, anything missing gets a level 1-ish default
+def party_member(data):
+    member = {
+        "name": str(data.get("name", "Adventurer")),
+        "hp": int(data.get("hp", 10)),
+        "ac": int(data.get("ac", 12)),
+        "attack_bonus": int(data.get("attack_bonus", 4)),
+        "damage": str(data.get("damage", "1d8+2")),
+        "attacks": int(data.get("attacks", 1)),
+    }
+    if member["hp"] < 1 or member["attacks"] < 1:
+        raise ValueError(f"{member['name']} needs at least 1 hp and 1 attack.")
+    if member["attacks"] > MAX_ATTACKS:
+        raise ValueError(f"{member['name']} can make at most {MAX_ATTACKS} attacks a round.")
+    #  raises ValueError for a bad dice expression
+    distribution(member["damage"])
+    return member
+
+
+#  [{"name": "Goblin", "count": 4}, ...] -> combatants, find_monster(name) returns a monsters row or None
+#  (or raises ValueError itself to explain why), attacks_for(row), if given, returns the row's
+#  pre-parsed (attacks, multiattack)
+def build_monsters(requested, find_monster, attacks_for=None):
+    combatants = []
+    for entry in requested:
+        name = entry.get("name")
+        count = int(entry.get("count", 1))
+        if not 1 <= count <= MAX_MONSTERS:
+            raise ValueError(f"count for '{name}' must be between 1 and {MAX_MONSTERS}.")
+        if len(combatants) + count > MAX_MONSTERS:
+            raise ValueError(f"An encounter can have at most {MAX_MONSTERS} monsters.")
+        row = find_monster(name)
+        if row is None:
+            raise ValueError(f"Monster '{name}' not found in database.")
+        attacks, multiattack = attacks_for(row) if attacks_for else (None, None)
+        combatants.extend([monster_combatant(row, attacks, multiattack)] * count)
+    return combatants
+
+
+#  one block of combats, runs inside a worker process
+def simulate_chunk(party, monsters, combats, seed, max_rounds=MAX_ROUNDS):
+    rng = np.random.default_rng(seed)
+
+    party_hp = np.tile(np.array([member["hp"] for member in party], dtype=np.int64), (combats, 1))
+    monster_hp = np.tile(np.array([monster["hp"] for monster in monsters], dtype=np.int64), (combats, 1))
+    party_ac = np.array([member["ac"] for member in party], dtype=np.int64)
+    monster_ac = np.array([monster["ac"] for monster in monsters], dtype=np.int64)
+
+    rounds = np.full(combats, max_rounds, dtype=np.int64)
+    party_damage = np.zeros(combats, dtype=np.int64)
+    monster_damage = np.zeros(combats, dtype=np.int64)
+    party_first = rng.integers(0, 2, size=combats).astype(bool)
+    active = np.ones(combats, dtype=bool)
+
+    for round_number in range(1, max_rounds + 1):
+        #  party first where it won initiative, monsters every round, then the party where it lost
+        _side_attacks(rng, party, party_hp, monster_hp, monster_ac, active & party_first, party_damage)
+        _side_attacks(rng, monsters, monster_hp, party_hp, party_ac, active, monster_damage)
+        _side_attacks(rng, party, party_hp, monster_hp, monster_ac, active & ~party_first, party_damage)
+
+        finished = active & (((monster_hp > 0).sum(axis=1) == 0) | ((party_hp > 0).sum(axis=1) == 0))
+        rounds[finished] = round_number
+        active &= ~finished
+        if not active.any():
+            break
+
+    won = (monster_hp > 0).sum(axis=1) == 0
+    return {
+        "won": won,
+        "rounds": rounds,
+        "party_damage": party_damage,
+        "monster_damage": monster_damage,
+        "survivors": (party_hp > 0).sum(axis=1),
+    }
+
+
+#  every living attacker on one side swings at the first standing enemy, acting masks the combats whose turn it is
+def _side_attacks(rng, attackers, attacker_hp, target_hp, target_ac, acting, damage_dealt):
+    if not acting.any():
+        return
+    combats = len(acting)
+
+    for position, attacker in enumerate(attackers):
+        for _ in range(attacker.get("attacks", 1)):
+            alive_targets = target_hp > 0
+            can_act = acting & (attacker_hp[:, position] > 0) & alive_targets.any(axis=1)
+            if not can_act.any():
+                break
+
+            target = alive_targets.argmax(axis=1)
+            d20 = rng.integers(1, 21, size=combats)
+            hits = can_act & (d20 != 1) & ((d20 == 20) | (d20 + attacker["attack_bonus"] >= target_ac[target]))
+            if not hits.any():
+                continue
+
+            damage = _roll_totals(attacker["damage"], combats, rng)
+            crit_dice = _roll_totals(attacker["damage"], combats, rng, dice_only=True)
+            damage = np.maximum(damage + np.where(d20 == 20, crit_dice, 0), 0) * hits
+
+            rows = np.nonzero(hits)[0]
+            target_hp[rows, target[rows]] -= damage[rows]
+            damage_dealt += damage
+
+
+def _roll_totals(expression, repeat, rng, dice_only=False):
+    batch = roll_batch(expression, repeat=repeat, seed=rng)
+    totals = batch["totals"]
+    if dice_only:
+        totals = totals - batch["modifiers"][0]
+    return totals
+
+
+#  runs combats split into workers chunks on the shared pool (1 keeps it in this process)
+#  the same seed and number of workers always gives the same results
+def simulate(party, monsters, combats=10000, workers=1, seed=None, max_rounds=MAX_ROUNDS):
+    if not party or not monsters:
+        raise ValueError("Both the party and the monsters need at least one combatant.")
+    if len(party) > MAX_PARTY_SIZE:
+        raise ValueError(f"The party can have at most {MAX_PARTY_SIZE} members.")
+    if len(monsters) > MAX_MONSTERS:
+        raise ValueError(f"An encounter can have at most {MAX_MONSTERS} monsters.")
+    if combats < 1:
+        raise ValueError("combats must be at least 1.")
+
+    start = time.perf_counter()
+    workers = max(1, min(workers, combats))
+    sizes = [combats // workers + (1 if i < combats % workers else 0) for i in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+
+    if workers == 1:
+        chunks = [simulate_chunk(party, monsters, sizes[0], seeds[0], max_rounds)]
+    else:
+        pool = executor()
+        try:
+            chunks = list(pool.map(simulate_chunk, [party] * workers, [monsters] * workers,
+                                   sizes, seeds, [max_rounds] * workers))
+        except BrokenProcessPool:
+            #  a worker died, start a fresh pool next time instead of failing every later run
+            _discard(pool)
+            raise
+
+    results = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    summary = summarize(results)
+    summary["seconds"] = time.perf_counter() - start
+    summary["rounds_per_second"] = summary["rounds_simulated"] / summary["seconds"]
+    return summary
+
+
+def summarize(results):
+    won = results["won"]
+    rounds = results["rounds"]
+    per_round = results["party_damage"] / rounds
+
+    summary = {
+        "combats": int(len(won)),
+        "win_rate": float(won.mean()),
+        "rounds_simulated": int(rounds.sum()),
+        "rounds": _describe(rounds),
+        "party_damage_per_round": _describe(per_round),
+        "damage_taken": _describe(results["monster_damage"]),
+        "average_survivors": float(results["survivors"].mean()),
+    }
+    if won.any():
+        summary["rounds_to_kill"] = _describe(rounds[won])
+    return summary
+
+
+def _describe(values):
+    return {
+        "mean": float(np.mean(values)),
+        "percentiles": {str(q): float(value) for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+    }
@@ -0,0 +1,226 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from decimal import Decimal
+
+from search_index import SearchIndex, normalize
+
+#  the SRD tables from Complete Database.sql, these only change when the dump is re-imported
+REFERENCE_TABLES = ('monsters', 'spells', 'magic_items', 'armor_shields', 'weapons', 'equipment')
+
+
+#  base for the per table row classes, each table gets its own subclass with one slot per column
+class Record:
+    __slots__ = ()
+
+    def as_tuple(self):
+        return tuple(getattr(self, column) for column in self.__slots__)
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.as_tuple()!r}"
+
+
+def make_record_type(table, columns):
+    return type(f"{table}_row", (Record,), {"__slots__": tuple(columns)})
+
+
+#  one table held in memory, rows are searched through SearchIndex
+#  typed holds whatever the cache's transform built from the rows (see reference_etl)
+#  serialized holds the encoded rows, version hash and snapshots (see serialization)
+class ReferenceTable:
+    __slots__ = ('name', 'columns', 'record_type', 'rows', 'typed', 'serialized')
+
+    def __init__(self, name, columns, raw_rows):
+        self.name = name
+        self.columns = tuple(columns)
+        self.record_type = make_record_type(name, self.columns)
+        self.rows = []
+        self.typed = None
+        self.serialized = {}
+
+        for raw in raw_rows:
+            values = [_plain(value) for value in raw]
+            record = self.record_type.__new__(self.record_type)
+            for column, value in zip(self.columns, values):
+                setattr(record, column, value)
+            self.rows.append(record)
+
+    #  position of the row with this id, rows are kept in id order
+    def position(self, row_id):
+        position = bisect_left(self.rows, row_id, key=lambda row: row.id)
+        if position < len(self.rows) and self.rows[position].id == row_id:
+            return position
+        return None
+
+
+#  small thread safe LRU for lookup results
+class LRUCache:
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+#  process wide cache of the reference tables, each table is loaded on first use
+#  load_table(name) must return (column_names, rows)
+#  transform(table), if given, runs once per load and its result is kept on table.typed
+class ReferenceCache:
+
+    def __init__(self, load_table, tables=REFERENCE_TABLES, maxsize=1024, transform=None):
+        self.load_table = load_table
+        self.transform = transform
+        self.tables = tuple(tables)
+        self.results = LRUCache(maxsize)
+        self._loaded = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        #  one lock per table so concurrent lookups can load different tables at the same time
+        self._table_locks = {name: threading.Lock() for name in self.tables}
+        #  bumped by invalidate(), a load or index that started before it is thrown away instead of published
+        self._generation = 0
+
+    def table(self, name):
+        if name not in self.tables:
+            raise KeyError(f"{name} is not a cached reference table.")
+
+        loaded = self._loaded.get(name)
+        if loaded is None:
+            with self._table_locks[name]:
+                loaded = self._loaded.get(name)
+                while loaded is None:
+                    generation = self._generation
+                    columns, raw_rows = self.load_table(name)
+                    fresh = ReferenceTable(name, columns, raw_rows)
+                    if self.transform is not None:
+                        fresh.typed = self.transform(fresh)
+                    with self._lock:
+                        #  invalidated while loading, the rows may predate the re-import so load again
+                        if generation == self._generation:
+                            self._loaded[name] = loaded = fresh
+        return loaded
+
+    #  search index over a table, built the first time the table is searched
+    def index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            table = self.table(name)
+            with self._table_locks[name]:
+                index = self._indexes.get(name)
+                if index is None or index.table is not table:
+                    index = SearchIndex(table)
+                    with self._lock:
+                        if self._loaded.get(name) is table:
+                            self._indexes[name] = index
+        return index
+
+    #  ranked matches from the search index, best first
+    def search(self, name, query, limit=10):
+        return self._cached(('search', name, query, limit), lambda: tuple(self.index(name).search(query, limit)))
+
+    #  the row whose name is exactly query (case and spacing aside), None when no name matches
+    def by_name(self, name, query):
+        index = self.index(name)
+        positions = index.names.get(normalize(query))
+        return index.table.rows[positions[0]] if positions else None
+
+    #  (score, record) pairs for merging rankings across tables, see SearchIndex.scored
+    def scored_search(self, name, query, limit=10):
+        return self._cached(('scored', name, query, limit), lambda: tuple(self.index(name).scored(query, limit)))
+
+    #  a result is only cached if no invalidate() ran while it was being worked out,
+    #  so nothing computed from the old rows outlives the clear
+    def _cached(self, key, compute):
+        with self._lock:
+            generation = self._generation
+        key = (generation,) + key
+        value = self.results.get(key)
+        if value is None:
+            value = compute()
+            with self._lock:
+                if generation == self._generation:
+                    self.results.put(key, value)
+        return value
+
+    #  matching rows in id order, resuming after after_id (keyset pagination)
+    #  an empty query walks the whole table, nothing here copies the rows
+    def iter_matching(self, name, query, after_id=None):
+        index = self.index(name)
+        rows = index.table.rows
+
+        start = 0
+        if after_id is not None:
+            start = bisect_right(rows, after_id, key=lambda row: row.id)
+
+        if normalize(query):
+            matches = index.matching_indexes(query)
+            positions = matches[bisect_right(matches, start - 1):]
+        else:
+            positions = range(start, len(rows))
+
+        for position in positions:
+            yield rows[position]
+
+    #  call after the SQL dump has been re-imported, tables reload lazily on next use
+    def invalidate(self, name=None):
+        with self._lock:
+            self._generation += 1
+            if name is None:
+                self._loaded.clear()
+                self._indexes.clear()
+            else:
+                self._loaded.pop(name, None)
+                self._indexes.pop(name, None)
+            self.results.clear()
+
+    #  same as invalidate but pulls the tables back in straight away
+    def reload(self, name=None):
+        self.invalidate(name)
+        for table in (self.tables if name is None else (name,)):
+            self.table(table)
+
+    def stats(self):
+        return {
+            "loaded": {name: len(table.rows) for name, table in self._loaded.items()},
+            "indexed": sorted(self._indexes),
+            "cached_results": len(self.results),
+            "hits": self.results.hits,
+            "misses": self.results.misses,
+        }
+
+
+#  decimals (challenge_rating) can't go through json.dumps, everything else is kept as is
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode()
+    return value
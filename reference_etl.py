@@ -0,0 +1,307 @@
+import operator
+import re
+
+import numpy as np
+
+#  typed copies of the free text columns in the reference tables, built once when a table is loaded
+#  numbers live in numpy arrays (one entry per row, NaN when the text couldn't be read) so filters
+#  like "cost under 50 gp" are array comparisons instead of string parsing on every request
+#
+#      armor_shields:  ac_base, ac_bonus, dex_bonus, dex_max, strength_required,
+#                      stealth_disadvantage, weight_lb, cost_gp, don_minutes, doff_minutes
+#      weapons:        cost_gp, weight_lb, damage_count, damage_sides, damage_type
+#      equipment:      cost_gp, weight_lb
+#      magic_items:    rarity_rank
+#      spells:         level, concentration, ritual
+#      monsters:       speed_walk_ft, darkvision_ft, challenge_rating, xp, hit_points, armor_class,
+#                      multiattack, saving_throws / skills / special_abilities / legendary_actions (tuples)
+#                      plus an attack table (see MonsterAttacks)
+
+COIN_VALUES = {"cp": 0.01, "sp": 0.1, "ep": 0.5, "gp": 1.0, "pp": 10.0}
+RARITY_RANKS = {"common": 0, "uncommon": 1, "rare": 2, "very rare": 3, "legendary": 4, "artifact": 5}
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+
+COST = re.compile(r'([\d,]+(?:\.\d+)?)\s*(cp|sp|ep|gp|pp)', re.IGNORECASE)
+WEIGHT = re.compile(r'(\d+(?:\.\d+)?)(?:\s*/\s*(\d+))?\s*(?:lb|lbs|pounds?)?\.?\s*$', re.IGNORECASE)
+ARMOR_CLASS = re.compile(r'^\s*(\+)?\s*(\d+)\s*(\+\s*Dex\w*\s*Mod\w*)?\s*(?:\(max\s*(\d+)\))?', re.IGNORECASE)
+DURATION = re.compile(r'(\d+)\s*(action|min|minute|hour)', re.IGNORECASE)
+DICE_DAMAGE = re.compile(r'(\d+)d(\d+)\s*([a-z]+)?', re.IGNORECASE)
+FEET = re.compile(r'(\d+)\s*ft', re.IGNORECASE)
+
+ACTION_SPLIT = re.compile(r';\s*(?=[A-Z][^:;]{0,60}:)')
+ATTACK = re.compile(r'(?:Melee|Ranged) (?:or Ranged )?(?:Weapon|Spell) Attack: \+(\d+) to hit.*?'
+                    r'Hit: \d+ \((\d+d\d+(?:\s*[+-]\s*\d+)?)\)\s*([a-z]+) damage', re.DOTALL)
+MULTIATTACK = re.compile(r'makes (one|two|three|four|five|six) (?:[a-z]+ )*?attacks', re.IGNORECASE)
+DICE = re.compile(r'(\d+)d(\d+)(?:\s*([+-])\s*(\d+))?')
+
+COMPARISONS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "=": operator.eq, "==": operator.eq, "!=": operator.ne,
+}
+
+
+def parse_cost(text):
+    match = COST.search(str(text or ""))
+    if not match:
+        return np.nan
+    return float(match.group(1).replace(",", "")) * COIN_VALUES[match.group(2).lower()]
+
+
+def parse_weight(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = WEIGHT.search(str(value or "").strip())
+    if not match:
+        return np.nan
+    weight = float(match.group(1))
+    if match.group(2):
+        weight /= float(match.group(2))
+    return weight
+
+
+#  '13 + Dex Modifier (max 2)' -> (13, 0, True, 2), '+2' (shield) -> (0, 2, False, nan)
+def parse_armor_class(text):
+    match = ARMOR_CLASS.match(str(text or ""))
+    if not match:
+        return np.nan, 0, False, np.nan
+    value = int(match.group(2))
+    dex_max = float(match.group(4)) if match.group(4) else np.nan
+    if match.group(1):
+        return 0, value, False, dex_max
+    return value, 0, bool(match.group(3)), dex_max
+
+
+#  don/doff times in minutes, an action is 6 seconds
+def parse_minutes(text):
+    match = DURATION.search(str(text or ""))
+    if not match:
+        return np.nan
+    amount, unit = int(match.group(1)), match.group(2).lower()
+    if unit == "action":
+        return amount / 10
+    if unit == "hour":
+        return amount * 60.0
+    return float(amount)
+
+
+def parse_feet(text):
+    match = FEET.search(str(text or ""))
+    return float(match.group(1)) if match else np.nan
+
+
+#  (name, text) pairs out of '; ' separated columns like actions and special_abilities
+def split_actions(actions):
+    entries = []
+    for part in ACTION_SPLIT.split(actions or ""):
+        name, _, text = part.partition(":")
+        if text:
+            entries.append((name.strip(), text.strip()))
+    return entries
+
+
+#  every "+N to hit ... Hit: X (dice) type damage" in a monster's actions
+def parse_attacks(actions):
+    attacks = []
+    for name, text in split_actions(actions):
+        match = ATTACK.search(text)
+        if match:
+            attacks.append({
+                "name": name,
+                "to_hit": int(match.group(1)),
+                "damage": match.group(2).replace(" ", ""),
+                "damage_type": match.group(3),
+            })
+    return attacks
+
+
+def multiattack_count(actions):
+    for name, text in split_actions(actions):
+        if name.lower() == "multiattack":
+            match = MULTIATTACK.search(text)
+            if match:
+                return NUMBER_WORDS[match.group(1).lower()]
+    return 1
+
+
+#  'Saving Throw: CON, Saving Throw: INT, Skill: History' -> (('CON', 'INT'), ('History',))
+def parse_proficiencies(text):
+    saves, skills = [], []
+    for part in str(text or "").split(","):
+        kind, _, value = part.partition(":")
+        kind, value = kind.strip().lower(), value.strip()
+        if kind == "saving throw" and value:
+            saves.append(value.upper())
+        elif kind == "skill" and value:
+            skills.append(value)
+    return tuple(saves), tuple(skills)
+
+
+def _number(value):
+    if value is None or value == "":
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+#  the typed columns of one table, index i lines up with table.rows[i]
+class TypedColumns:
+
+    def __init__(self, table, columns, attacks=None):
+        self.table = table
+        self.columns = columns
+        self.attacks = attacks
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    #  row positions where column <op> value, e.g. where("cost_gp", "<", 50)
+    #  NaN (unreadable text) never matches
+    def where(self, column, op, value):
+        if column not in self.columns:
+            raise KeyError(f"{self.table.name} has no typed column {column}.")
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown comparison {op}.")
+        values = self.columns[column]
+        with np.errstate(invalid="ignore"):
+            return np.nonzero(COMPARISONS[op](values, value))[0]
+
+    #  several (column, op, value) conditions and'ed together, returns the matching rows
+    def filter(self, conditions):
+        mask = np.ones(len(self.table.rows), dtype=bool)
+        for column, op, value in conditions:
+            hits = np.zeros(len(mask), dtype=bool)
+            hits[self.where(column, op, value)] = True
+            mask &= hits
+        return [self.table.rows[position] for position in np.nonzero(mask)[0]]
+
+
+#  attack records for every monster, one entry per parsed attack
+#  monster[i] is the row position of the monster the attack belongs to
+class MonsterAttacks:
+
+    def __init__(self, records):
+        self.monster = np.array([record[0] for record in records], dtype=np.int32)
+        self.to_hit = np.array([record[1]["to_hit"] for record in records], dtype=np.int16)
+        self.damage_count = np.array([record[2] for record in records], dtype=np.int16)
+        self.damage_sides = np.array([record[3] for record in records], dtype=np.int16)
+        self.damage_bonus = np.array([record[4] for record in records], dtype=np.int16)
+        self.damage_type = [record[1]["damage_type"] for record in records]
+        self.name = [record[1]["name"] for record in records]
+        self.damage = [record[1]["damage"] for record in records]
+
+        average = self.damage_count * (self.damage_sides + 1) / 2 + self.damage_bonus
+        self.average_damage = average
+
+    def __len__(self):
+        return len(self.monster)
+
+    #  attack dicts for one monster row position
+    def for_monster(self, position):
+        start, stop = np.searchsorted(self.monster, [position, position + 1])
+        return [{
+            "name": self.name[i],
+            "to_hit": int(self.to_hit[i]),
+            "damage": self.damage[i],
+            "damage_type": self.damage_type[i],
+            "average_damage": float(self.average_damage[i]),
+        } for i in range(start, stop)]
+
+
+def _armor_shields(table):
+    armor = [parse_armor_class(row.AC) for row in table.rows]
+    return {
+        "ac_base": np.array([ac[0] for ac in armor], dtype=float),
+        "ac_bonus": np.array([ac[1] for ac in armor], dtype=float),
+        "dex_bonus": np.array([ac[2] for ac in armor], dtype=bool),
+        "dex_max": np.array([ac[3] for ac in armor], dtype=float),
+        "strength_required": np.array([_number(row.strength) for row in table.rows], dtype=float),
+        "stealth_disadvantage": np.array([bool(row.stealth) for row in table.rows], dtype=bool),
+        "weight_lb": np.array([parse_weight(row.weight) for row in table.rows], dtype=float),
+        "cost_gp": np.array([parse_cost(row.cost) for row in table.rows], dtype=float),
+        "don_minutes": np.array([parse_minutes(row.don_time) for row in table.rows], dtype=float),
+        "doff_minutes": np.array([parse_minutes(row.doff_time) for row in table.rows], dtype=float),
+    }
+
+
+def _weapons(table):
+    damage = [DICE_DAMAGE.search(str(row.damage or "")) for row in table.rows]
+    return {
+        "cost_gp": np.array([parse_cost(row.cost) for row in table.rows], dtype=float),
+        "weight_lb": np.array([parse_weight(row.weight) for row in table.rows], dtype=float),
+        "damage_count": np.array([int(match.group(1)) if match else 0 for match in damage], dtype=np.int16),
+        "damage_sides": np.array([int(match.group(2)) if match else 0 for match in damage], dtype=np.int16),
+        "damage_type": [match.group(3).lower() if match and match.group(3) else None for match in damage],
+    }
+
+
+def _equipment(table):
+    return {
+        "cost_gp": np.array([parse_cost(row.cost) for row in table.rows], dtype=float),
+        "weight_lb": np.array([parse_weight(row.weight) for row in table.rows], dtype=float),
+    }
+
+
+def _magic_items(table):
+    return {
+        "rarity_rank": np.array([RARITY_RANKS.get(str(row.rarity or "").strip().lower(), np.nan)
+                                 for row in table.rows], dtype=float),
+    }
+
+
+def _spells(table):
+    return {
+        "level": np.array([_number(row.level) for row in table.rows], dtype=float),
+        "concentration": np.array([bool(row.concentration) for row in table.rows], dtype=bool),
+        "ritual": np.array([bool(row.ritual) for row in table.rows], dtype=bool),
+    }
+
+
+def _monsters(table):
+    proficiencies = [parse_proficiencies(row.saving_throws) for row in table.rows]
+    columns = {
+        "speed_walk_ft": np.array([parse_feet(row.speed_walk) for row in table.rows], dtype=float),
+        "darkvision_ft": np.array([parse_feet(row.darkvision) for row in table.rows], dtype=float),
+        "challenge_rating": np.array([_number(row.challenge_rating) for row in table.rows], dtype=float),
+        "xp": np.array([_number(row.xp) for row in table.rows], dtype=float),
+        "hit_points": np.array([_number(row.hit_points) for row in table.rows], dtype=float),
+        "armor_class": np.array([_number(row.armor_class) for row in table.rows], dtype=float),
+        "multiattack": np.array([multiattack_count(row.actions) for row in table.rows], dtype=np.int8),
+        "saving_throws": [saves for saves, _ in proficiencies],
+        "skills": [skills for _, skills in proficiencies],
+        "special_abilities": [tuple(split_actions(row.special_abilities)) for row in table.rows],
+        "legendary_actions": [tuple(split_actions(row.legendary_actions)) for row in table.rows],
+    }
+
+    records = []
+    for position, row in enumerate(table.rows):
+        for attack in parse_attacks(row.actions):
+            dice = DICE.match(attack["damage"])
+            bonus = int(dice.group(4)) * (-1 if dice.group(3) == "-" else 1) if dice.group(3) else 0
+            records.append((position, attack, int(dice.group(1)), int(dice.group(2)), bonus))
+    return columns, MonsterAttacks(records)
+
+
+TRANSFORMS = {
+    "armor_shields": _armor_shields,
+    "weapons": _weapons,
+    "equipment": _equipment,
+    "magic_items": _magic_items,
+    "spells": _spells,
+}
+
+
+#  ReferenceCache calls this once per table load
+def build_typed_columns(table):
+    if table.name == "monsters":
+        columns, attacks = _monsters(table)
+        return TypedColumns(table, columns, attacks)
+
+    transform = TRANSFORMS.get(table.name)
+    if transform is None:
+        return TypedColumns(table, {})
+    return TypedColumns(table, transform(table))
@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+#  per-phase latency histograms for the web app and the database layer
+#
+#      with timed("db_query", table="consumables"):
+#          cursor.execute(...)
+#
+#  every (phase, labels) pair gets its own histogram, /metrics serves them in the Prometheus
+#  text format (or as json), percentiles are estimated from the buckets
+
+#  bucket upper bounds in seconds, roughly 1-2.5-5 steps from 10 microseconds to 10 seconds
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'maximum', '_lock')
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        #  one extra bucket for everything above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        position = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.maximum:
+                self.maximum = seconds
+
+    #  linear interpolation inside the bucket the q-th observation falls in, q in [0, 1]
+    def percentile(self, q):
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            maximum = self.maximum
+        if not count:
+            return 0.0
+
+        rank = q * count
+        seen = 0
+        for position, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[position - 1] if position else 0.0
+                upper = self.bounds[position] if position < len(self.bounds) else maximum
+                upper = min(upper, maximum)
+                return lower + (upper - lower) * max(rank - seen, 0) / bucket_count
+            seen += bucket_count
+        return maximum
+
+    def summary(self):
+        with self._lock:
+            count, total, maximum = self.count, self.total, self.maximum
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "max": maximum,
+            "percentiles": {str(q): self.percentile(q) for q in PERCENTILES},
+        }
+
+
+class Metrics:
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, phase, **labels):
+        key = (phase, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(key, Histogram(self.bounds))
+        return histogram
+
+    def observe(self, phase, seconds, **labels):
+        self.histogram(phase, **labels).observe(seconds)
+
+    @contextmanager
+    def timed(self, phase, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def _sorted(self):
+        with self._lock:
+            items = list(self.histograms.items())
+        return sorted(items, key=lambda item: (item[0][0], [(key, str(value)) for key, value in item[0][1]]))
+
+    #  {phase: [{"labels": {...}, "count": ..., "percentiles": {...}}, ...]}
+    def snapshot(self):
+        phases = {}
+        for (phase, labels), histogram in self._sorted():
+            entry = {"labels": dict(labels)}
+            entry.update(histogram.summary())
+            phases.setdefault(phase, []).append(entry)
+        return phases
+
+    #  Prometheus text exposition, one <phase>_seconds histogram per phase
+    def prometheus(self, prefix="dnd"):
+        lines = []
+        described = set()
+        for (phase, labels), histogram in self._sorted():
+            name = f"{prefix}_{phase}_seconds"
+            if name not in described:
+                lines.append(f"# TYPE {name} histogram")
+                described.add(name)
+
+            with histogram._lock:
+                counts = list(histogram.counts)
+                count, total = histogram.count, histogram.total
+
+            cumulative = 0
+            for bound, bucket_count in zip(list(histogram.bounds) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    text = ",".join(f'{key}="{str(value)}"' for key, value in pairs)
+    return "{" + text + "}"
+
+
+#  the process-wide registry the app and connections.py record into
+metrics = Metrics()
+timed = metrics.timed
+observe = metrics.observe
@@ -0,0 +1,163 @@
+import re
+from bisect import bisect_left
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+#  how much a word counts depending on where it was found
+#  weights are per row, nothing is counted across the table, so scores from different indexes compare directly
+NAME_WEIGHT = 8
+FIELD_WEIGHT = 1
+EXACT_NAME_BONUS = 100
+NAME_PREFIX_BONUS = 20
+NAME_SUBSTRING_BONUS = 10
+
+
+#  inverted index over one ReferenceTable
+#  tokens:   word -> {row index: weight}   (every column, name counts extra)
+#  names:    lowercased full name -> [row index]   (exact name fast path)
+#  trigrams: three letter chunk of a name -> {row index}   (substring matches like "sword" in "Greatsword")
+class SearchIndex:
+
+    def __init__(self, table, name_column='name'):
+        self.table = table
+        self.tokens = {}
+        self.names = {}
+        self.trigrams = {}
+        self.lower_names = []
+
+        for index, row in enumerate(table.rows):
+            for column in table.columns:
+                weight = NAME_WEIGHT if column == name_column else FIELD_WEIGHT
+                for word in set(TOKEN.findall(_text(getattr(row, column)))):
+                    postings = self.tokens.setdefault(word, {})
+                    postings[index] = postings.get(index, 0) + weight
+
+            name = " ".join(_text(getattr(row, name_column, None)).split())
+            self.lower_names.append(name)
+            if name:
+                self.names.setdefault(name, []).append(index)
+                for gram in _trigrams(name):
+                    self.trigrams.setdefault(gram, set()).add(index)
+
+        self.vocabulary = sorted(self.tokens)
+
+    #  best matches first, ties go to the lower row (same order the table was loaded in)
+    def search(self, query, limit=10):
+        if limit == 1:
+            exact = self.names.get(normalize(query))
+            if exact:
+                return [self.table.rows[exact[0]]]
+        return [row for score, row in self.scored(query, limit)]
+
+    #  (score, row) pairs best first, the scores are comparable between tables so
+    #  results from several indexes can be merged into one ranking
+    def scored(self, query, limit=10):
+        text = normalize(query)
+        if not text:
+            return []
+
+        scores = self._token_scores(TOKEN.findall(text))
+        for index in self._name_substring(text):
+            scores.setdefault(index, 0)
+        for index in self.names.get(text, ()):
+            scores.setdefault(index, 0)
+
+        for index in scores:
+            scores[index] += name_bonus(self.lower_names[index], text)
+
+        ranked = sorted(scores, key=lambda index: (-scores[index], index))
+        if limit is not None:
+            ranked = ranked[:limit]
+        rows = self.table.rows
+        return [(scores[index], rows[index]) for index in ranked]
+
+    #  every row matching all the words, the last word is allowed to be a prefix ("fire" -> "fireball")
+    def matching_indexes(self, query):
+        text = normalize(query)
+        if not text:
+            return []
+        scores = self._token_scores(TOKEN.findall(text))
+        return sorted(scores.keys() | self._name_substring(text))
+
+    #  the last word expands to every vocabulary word it starts, a one letter prefix on the
+    #  biggest table is ~1-3 ms, cheaper than explaining why ranked and paged results differ
+    def _token_scores(self, words):
+        scores = None
+        for position, word in enumerate(words):
+            if position == len(words) - 1:
+                postings = self._prefix_postings(word)
+            else:
+                postings = self.tokens.get(word, {})
+
+            if scores is None:
+                scores = dict(postings)
+            else:
+                if len(postings) < len(scores):
+                    scores = {index: scores[index] + weight for index, weight in postings.items() if index in scores}
+                else:
+                    scores = {index: score + postings[index] for index, score in scores.items() if index in postings}
+            if not scores:
+                return {}
+        return scores or {}
+
+    #  exact word counts double, words that only start with it count once
+    def _prefix_postings(self, prefix):
+        merged = {}
+        exact = self.tokens.get(prefix)
+        if exact:
+            for index, weight in exact.items():
+                merged[index] = weight * 2
+
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(prefix):
+            word = self.vocabulary[position]
+            if word != prefix:
+                for index, weight in self.tokens[word].items():
+                    merged[index] = max(merged.get(index, 0), weight)
+            position += 1
+        return merged
+
+    def _name_substring(self, text):
+        grams = _trigrams(text)
+        if not grams:
+            return {index for index, name in enumerate(self.lower_names) if text in name}
+
+        candidates = None
+        for gram in sorted(grams, key=lambda gram: len(self.trigrams.get(gram, ()))):
+            postings = self.trigrams.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return {index for index in candidates if text in self.lower_names[index]}
+
+
+#  input_validation hands over either an int or a "%text%" LIKE pattern, both are accepted here
+def normalize(query):
+    if query is None:
+        return ""
+    return " ".join(str(query).strip().strip('%').lower().split())
+
+
+#  extra score for how well a lowercased name matches the normalized query
+def name_bonus(name, text):
+    if name == text:
+        return EXACT_NAME_BONUS
+    if name.startswith(text):
+        return NAME_PREFIX_BONUS
+    if text in name:
+        return NAME_SUBSTRING_BONUS
+    return 0
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).lower()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
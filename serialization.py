@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import math
+from decimal import Decimal
+
+#  response encoding for the reference data
+#
+#  each row is encoded to JSON bytes once per table load and spliced into responses as is,
+#  the version of a table is a hash of those bytes so it only changes when the dump is
+#  re-imported, which is what the ETags and snapshot caching hang off
+#
+#  orjson and brotli are used when installed, json and gzip otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#  anything smaller goes out uncompressed, the headers would eat most of the saving
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+#  live responses trade ratio for speed, snapshots are compressed once so they get the best ratio
+BROTLI_QUALITY = 5
+SNAPSHOT_GZIP_LEVEL = 9
+SNAPSHOT_BROTLI_QUALITY = 11
+
+
+#  database rows can still carry decimals, simulator summaries numpy scalars
+def _default(value):
+    if isinstance(value, Decimal):
+        return _finite(float(value))
+    if hasattr(value, 'item'):
+        return _finite(value.item())
+    raise TypeError(f"{type(value).__name__} can't be turned into JSON.")
+
+
+#  NaN and Infinity aren't JSON, orjson writes them as null and the json fallback does the same,
+#  otherwise the bytes (and the ETags hashed from them) would depend on which package is installed
+def _finite(value):
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return _encoder.encode(_finite(value)).encode('utf-8')
+
+
+def encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body, encoding, snapshot=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=SNAPSHOT_BROTLI_QUALITY if snapshot else BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=SNAPSHOT_GZIP_LEVEL if snapshot else GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unknown content encoding {encoding}.")
+
+
+#  every row of a ReferenceTable as JSON array bytes, same layout as Record.as_tuple()
+def encoded_rows(table):
+    rows = table.serialized.get('rows')
+    if rows is None:
+        rows = [dumps(row.as_tuple()) for row in table.rows]
+        table.serialized['rows'] = rows
+    return rows
+
+
+def encoded_row(table, record):
+    position = table.position(record.id)
+    if position is None or table.rows[position] is not record:
+        return dumps(record.as_tuple())
+    return encoded_rows(table)[position]
+
+
+#  short content hash of a table, changes only when the rows do
+def table_version(table):
+    version = table.serialized.get('version')
+    if version is None:
+        digest = hashlib.sha1(dumps(table.columns))
+        for row in encoded_rows(table):
+            digest.update(row)
+            digest.update(b'\n')
+        version = digest.hexdigest()[:16]
+        table.serialized['version'] = version
+    return version
+
+
+#  {"result": <row>} around an already encoded row (or JSON text), nothing is encoded twice
+def result_body(encoded):
+    if encoded is None:
+        encoded = b'null'
+    elif isinstance(encoded, str):
+        encoded = encoded.encode('utf-8')
+    return b'{"result":' + encoded + b'}'
+
+
+#  the whole table in one payload, columns listed once and rows as arrays
+def snapshot(table):
+    body = table.serialized.get('snapshot')
+    if body is None:
+        header = dumps({"table": table.name, "version": table_version(table), "columns": list(table.columns)})
+        body = header[:-1] + b',"rows":[' + b','.join(encoded_rows(table)) + b']}'
+        table.serialized['snapshot'] = body
+    return body
+
+
+#  snapshot bytes for one content encoding (None for identity), compressed once per table load
+def encoded_snapshot(table, encoding=None):
+    if encoding is None:
+        return snapshot(table)
+    key = ('snapshot', encoding)
+    body = table.serialized.get(key)
+    if body is None:
+        body = compress(snapshot(table), encoding, snapshot=True)
+        table.serialized[key] = body
+    return body
@@ -0,0 +1,169 @@
+import re
+
+from connections import reference
+
+#  the spells table keeps the damage type in `damage` ('Acid', 'None', ...), the dice themselves
+#  are only in the free text, these pull them out once when the table is loaded
+#      description:   "...the target takes 4d4 acid damage..."
+#                     "...takes 4d6 fire damage and 4d6 radiant damage..." (every clause in the sentence counts)
+#      higher_level:  "...the damage increases by 1d4 for each slot level above 2nd."
+#      cantrips:      "...increases by 1d10 when you reach 5th level (2d10), 11th level (3d10)..."
+#                     (SRD wording, none of the cantrips in this dump describe their scaling so they keep their base dice)
+BASE_DAMAGE = re.compile(r'(\d+d\d+(?:\s*[+-]\s*\d+)?)\s+(?:([a-z]+)\s+)?damage', re.IGNORECASE)
+SLOT_SCALING = re.compile(r'(?:increases by|roll an additional)\s+(\d+d\d+)\s+for\s+(each|every two)\s+(?:spell\s+)?slot levels?\s+above\s+(\d+)', re.IGNORECASE)
+CANTRIP_SCALING = re.compile(r'(\d+)(?:st|nd|rd|th) level \((\d+d\d+)\)', re.IGNORECASE)
+DICE = re.compile(r'(\d+)d(\d+)(?:\s*([+-])\s*(\d+))?')
+SENTENCE = re.compile(r'(?<=[.!?])\s+')
+
+MAX_SLOT_LEVEL = 9
+
+
+#  damage of one spell broken into dice counts so every slot level is just arithmetic
+#  dice is one (count, sides, damage type) per damage clause, Flame Strike is 4d6 fire and 4d6 radiant
+class SpellDamage:
+    __slots__ = ('name', 'level', 'damage_type', 'dice', 'modifier',
+                 'extra_count', 'extra_sides', 'slot_step', 'cantrip_counts')
+
+    def __init__(self, name, level, damage_type, dice, modifier=0):
+        self.name = name
+        self.level = level
+        self.damage_type = damage_type
+        self.dice = tuple(dice)
+        self.modifier = modifier
+        self.extra_count = 0
+        self.extra_sides = 0
+        self.slot_step = 1
+        self.cantrip_counts = ()
+
+    @property
+    def damage_types(self):
+        return tuple(damage_type for _, _, damage_type in self.dice)
+
+    #  dice expression for casting at slot_level (defaults to the spell's own level),
+    #  cantrips scale with character_level instead
+    #  dice with the same sides are added up, 20d6 fire + 20d6 bludgeoning rolls as 40d6
+    def formula(self, slot_level=None, character_level=None):
+        counts = {}
+        for count, sides, _ in self.dice:
+            counts[sides] = counts.get(sides, 0) + count
+
+        if self.level == 0 and character_level is not None:
+            character_level = parse_level(character_level, "character_level", 1, 20)
+            for reached, dice_count in self.cantrip_counts:
+                if character_level >= reached:
+                    counts[self.dice[0][1]] = dice_count
+
+        if slot_level is not None and self.level > 0:
+            slot_level = parse_level(slot_level, "slot_level", self.level, MAX_SLOT_LEVEL)
+            steps = (slot_level - self.level) // self.slot_step
+            if steps and self.extra_count:
+                counts[self.extra_sides] = counts.get(self.extra_sides, 0) + steps * self.extra_count
+
+        text = "+".join(f"{count}d{sides}" for sides, count in counts.items())
+        if self.modifier:
+            text += f"{self.modifier:+d}"
+        return text
+
+    #  {slot level: dice expression} for every slot the spell can be cast with
+    def by_slot(self):
+        if self.level == 0:
+            return {0: self.formula()}
+        return {slot: self.formula(slot) for slot in range(self.level, MAX_SLOT_LEVEL + 1)}
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "level": self.level,
+            "damage_type": self.damage_type,
+            "damage_types": list(self.damage_types),
+            "formula": self.formula(),
+            "by_slot": self.by_slot(),
+        }
+
+
+#  levels come straight from JSON or a query string, so "5" is as good as 5
+def parse_level(value, name, lowest, highest):
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError
+        level = int(value)
+    except (TypeError, ValueError):
+        level = None
+    if level is None or not lowest <= level <= highest:
+        raise ValueError(f"{name} must be an integer between {lowest} and {highest}.")
+    return level
+
+
+def parse_spell(row):
+    description = row.description or ""
+    clauses = ()
+    for sentence in SENTENCE.split(description):
+        clauses = list(BASE_DAMAGE.finditer(sentence))
+        if clauses:
+            break
+    if not clauses:
+        return None
+
+    dice, modifier = [], 0
+    for clause in clauses:
+        parts = DICE.match(clause.group(1))
+        if parts.group(3):
+            modifier += int(parts.group(4)) * (-1 if parts.group(3) == "-" else 1)
+        dice.append((int(parts.group(1)), int(parts.group(2)), clause.group(2) and clause.group(2).lower()))
+    damage_type = row.damage if row.damage and row.damage != "None" else dice[0][2]
+    damage = SpellDamage(row.name, int(row.level or 0), damage_type, dice, modifier)
+
+    scaling = SLOT_SCALING.search(row.higher_level or "")
+    if scaling:
+        extra = DICE.match(scaling.group(1))
+        damage.extra_count = int(extra.group(1))
+        damage.extra_sides = int(extra.group(2))
+        damage.slot_step = 2 if scaling.group(2).lower() == "every two" else 1
+
+    if damage.level == 0:
+        damage.cantrip_counts = tuple(
+            (int(reached), int(DICE.match(dice_text).group(1)))
+            for reached, dice_text in CANTRIP_SCALING.findall(description)
+            if int(DICE.match(dice_text).group(2)) == damage.dice[0][1]
+        )
+
+    return damage
+
+
+#  name -> SpellDamage for every spell with a damage roll, built from the cached spells table
+class SpellDamageResolver:
+
+    def __init__(self, table):
+        self.table = table
+        self.spells = {}
+        for row in table.rows:
+            damage = parse_spell(row)
+            if damage is not None:
+                self.spells.setdefault(row.name.strip().lower(), damage)
+
+    def get(self, spell_name):
+        if not spell_name:
+            return None
+        return self.spells.get(str(spell_name).strip().lower())
+
+    def formula(self, spell_name, slot_level=None, character_level=None):
+        damage = self.get(spell_name)
+        if damage is None:
+            return None
+        return damage.formula(slot_level, character_level)
+
+
+_resolver = None
+
+
+#  rebuilt automatically after connections.reload_reference_data() swaps the spells table out
+def resolver():
+    global _resolver
+    table = reference.table('spells')
+    if _resolver is None or _resolver.table is not table:
+        _resolver = SpellDamageResolver(table)
+    return _resolver
+
+
+def damage_formula(spell_name, slot_level=None, character_level=None):
+    return resolver().formula(spell_name, slot_level, character_level)
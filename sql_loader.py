@@ -0,0 +1,315 @@
+import argparse
+import itertools
+import os
+import re
+import sqlite3
+import time
+from functools import lru_cache
+
+#  loads the MySQL dumps into SQLite so dev and test nodes don't need a MySQL server
+#
+#      database = load_dumps()                        # every dump in the repo, in memory
+#      connections.configure_pool(connect=database.connect)
+#
+#  the dumps are read a line at a time, INSERT rows are parsed into tuples and written with
+#  executemany in one transaction, and the connections speak the same %s placeholders as
+#  mysql.connector so nothing in connections.py has to change
+
+#  the dumps overlap, the first file to create a table wins and later copies of it are skipped
+#  (Complete Database.sql has every reference table, the prototype adds the empty consumables table)
+DUMP_DIR = os.path.dirname(os.path.abspath(__file__))
+DUMP_FILES = tuple(os.path.join(DUMP_DIR, name) for name in (
+    'Complete Database.sql',
+    'DnD.sql',
+    'D&D Database Prototype.sql',
+    'Monster, Spells and Magic Items.sql',
+))
+INDEXED_COLUMNS = ('name', 'type', 'level', 'school', 'challenge_rating', 'rarity')
+
+#  quotes, escapes, comment starts and statement ends, everything else is copied through as is
+STATEMENT_TOKEN = re.compile(r"\\.|''|\"\"|['\";]|--|#")
+CREATE_TABLE = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[`"]?(\w+)[`"]?\s*\((.*)\)[^)]*$', re.I | re.S)
+INSERT = re.compile(r'INSERT\s+(?:IGNORE\s+)?INTO\s+[`"]?(\w+)[`"]?\s*(?:\(([^)]*)\))?\s*VALUES\s*', re.I)
+VALUE_TOKEN = re.compile(
+    r"""\s*(?:'((?:[^'\\]|\\.|'')*)'|(NULL|TRUE|FALSE)\b|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|([(),]))""",
+    re.I | re.S)
+
+#  MySQL column types and options with no SQLite equivalent
+DDL_REWRITES = (
+    (re.compile(r'\bINT(?:EGER)?\s+(?:NOT\s+NULL\s+)?AUTO_INCREMENT\s+PRIMARY\s+KEY', re.I), 'INTEGER PRIMARY KEY'),
+    (re.compile(r'\bAUTO_INCREMENT\b', re.I), ''),
+    (re.compile(r'\bENUM\s*\([^)]*\)', re.I), 'TEXT'),
+    (re.compile(r'\bUNSIGNED\b', re.I), ''),
+    (re.compile(r'`'), '"'),
+)
+MYSQL_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+LITERALS = {'NULL': None, 'TRUE': 1, 'FALSE': 0}
+
+
+#  complete statements from a dump, comments stripped, read line by line so the file is never held whole
+def iter_statements(lines):
+    parts = []
+    quote = None
+    for line in lines:
+        start = 0
+        for token in STATEMENT_TOKEN.finditer(line):
+            text = token.group()
+            if quote:
+                if text == quote:
+                    quote = None
+            elif text in ("'", '"'):
+                quote = text
+            elif text in ('--', '#'):
+                #  MySQL only treats '-- ' as a comment, '--5' would be minus minus five
+                if text == '--' and line[token.end():token.end() + 1] not in (' ', '\t', '\n', '\r', ''):
+                    continue
+                parts.append(line[start:token.start()])
+                parts.append('\n')
+                start = len(line)
+                break
+            elif text == ';':
+                parts.append(line[start:token.start()])
+                statement = ''.join(parts).strip()
+                if statement:
+                    yield statement
+                parts = []
+                start = token.end()
+        parts.append(line[start:])
+
+    statement = ''.join(parts).strip()
+    if statement:
+        yield statement
+
+
+def translate_create_table(statement):
+    match = CREATE_TABLE.match(statement)
+    if not match:
+        raise ValueError(f"Can't read table definition: {statement[:80]}")
+    body = match.group(2)
+    for pattern, replacement in DDL_REWRITES:
+        body = pattern.sub(replacement, body)
+    return match.group(1), f'CREATE TABLE "{match.group(1)}" ({body})'
+
+
+def _unescape(text):
+    if "''" in text:
+        text = text.replace("''", "'")
+    if '\\' in text:
+        text = re.sub(r'\\(.)', lambda m: MYSQL_ESCAPES.get(m.group(1), m.group(1)), text, flags=re.S)
+    return text
+
+
+#  the row tuples of a multi-row VALUES list, starting at position
+def iter_rows(statement, position=0):
+    row = None
+    length = len(statement)
+    while position < length:
+        token = VALUE_TOKEN.match(statement, position)
+        if token is None:
+            if statement[position:].strip():
+                raise ValueError(f"Can't read INSERT values near: {statement[position:position + 40]!r}")
+            break
+        position = token.end()
+        string, literal, number, punctuation = token.groups()
+
+        if punctuation == '(':
+            row = []
+        elif punctuation == ')':
+            yield tuple(row)
+            row = None
+        elif punctuation == ',':
+            continue
+        elif string is not None:
+            row.append(_unescape(string))
+        elif literal is not None:
+            row.append(LITERALS[literal.upper()])
+        else:
+            row.append(float(number) if any(c in number for c in '.eE') else int(number))
+
+
+#  embedded stand-in for the MySQL database, shared by every connection made from it
+class StandInDatabase:
+    _names = itertools.count(1)
+
+    def __init__(self, path=None):
+        if path is None:
+            #  a named shared-cache memory database lives as long as one connection to it is open
+            path = f'file:dnd_standin_{next(self._names)}?mode=memory&cache=shared'
+        self.path = path
+        self.keeper = self._open()
+        self.tables = {}
+        self.stats = {}
+
+    def _open(self):
+        return sqlite3.connect(self.path, uri=self.path.startswith('file:'), check_same_thread=False)
+
+    #  a new DB-API connection, pass this as connections.configure_pool(connect=...)
+    def connect(self):
+        return StandInConnection(self._open())
+
+    def load(self, paths=DUMP_FILES, encoding='utf-8'):
+        start = time.perf_counter()
+        statements = skipped = 0
+        connection = self.keeper
+        skip_tables = set()
+
+        connection.execute('PRAGMA synchronous = OFF')
+        with connection:
+            for path in paths:
+                with open(path, encoding=encoding) as dump:
+                    for statement in iter_statements(dump):
+                        statements += 1
+                        keyword = statement.split(None, 1)[0].upper()
+
+                        if keyword == 'CREATE' and CREATE_TABLE.match(statement):
+                            name, ddl = translate_create_table(statement)
+                            if name in self.tables:
+                                skip_tables.add(name)
+                                skipped += 1
+                                continue
+                            connection.execute(ddl)
+                            self.tables[name] = 0
+                        elif keyword == 'INSERT':
+                            match = INSERT.match(statement)
+                            if match is None or match.group(1) in skip_tables or match.group(1) not in self.tables:
+                                skipped += 1
+                                continue
+                            self.tables[match.group(1)] += self._insert(connection, match, statement)
+                        else:
+                            #  CREATE DATABASE, USE, DROP, the SELECTs left at the end of the dump...
+                            skipped += 1
+
+            indexes = self._create_indexes(connection)
+
+        self.stats = {
+            'files': len(paths),
+            'statements': statements,
+            'skipped_statements': skipped,
+            'tables': dict(self.tables),
+            'indexes': indexes,
+            'seconds': time.perf_counter() - start,
+        }
+        return self.stats
+
+    def _insert(self, connection, match, statement):
+        table = match.group(1)
+        rows = list(iter_rows(statement, match.end()))
+        if not rows:
+            return 0
+        columns = match.group(2)
+        if columns:
+            names = ', '.join(f'"{column.strip().strip("`")}"' for column in columns.split(','))
+            target = f'"{table}" ({names})'
+        else:
+            target = f'"{table}"'
+        placeholders = ', '.join('?' * len(rows[0]))
+        connection.executemany(f'INSERT INTO {target} VALUES ({placeholders})', rows)
+        return len(rows)
+
+    def _create_indexes(self, connection):
+        created = []
+        for table in self.tables:
+            columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info("{table}")')}
+            for column in INDEXED_COLUMNS:
+                if column in columns:
+                    connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{column}" ON "{table}" ("{column}")')
+                    created.append(f'{table}.{column}')
+        return created
+
+    def close(self):
+        self.keeper.close()
+
+
+#  mysql.connector style %s placeholders to sqlite ? ones
+@lru_cache(maxsize=256)
+def translate_query(query):
+    return re.sub(r'%(s|%)', lambda m: '?' if m.group(1) == 's' else '%', query)
+
+
+class StandInCursor:
+    __slots__ = ('cursor',)
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def execute(self, query, params=()):
+        self.cursor.execute(translate_query(query), params or ())
+        return self
+
+    def executemany(self, query, seq_of_params):
+        self.cursor.executemany(translate_query(query), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+class StandInConnection:
+    __slots__ = ('connection',)
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self):
+        return StandInCursor(self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+#  a loaded stand-in database, path=None keeps it in memory
+#  an existing file at path is refused (the dump's CREATE TABLEs would fail on it) unless replace=True deletes it first
+def load_dumps(paths=DUMP_FILES, path=None, replace=False):
+    if path is not None and os.path.exists(path):
+        if not replace:
+            raise FileExistsError(f"{path} already exists, load into a new file or replace it (--replace).")
+        os.remove(path)
+    database = StandInDatabase(path)
+    database.load(paths)
+    return database
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the SQL dumps into a local SQLite database.")
+    parser.add_argument("dumps", nargs="*", default=list(DUMP_FILES), help="dump files, first one to define a table wins")
+    parser.add_argument("-o", "--output", help="SQLite file to write (default: in memory, just reports the load)")
+    parser.add_argument("--replace", action="store_true", help="delete the output file first if it already exists")
+    args = parser.parse_args()
+
+    try:
+        database = load_dumps(args.dumps, args.output, args.replace)
+    except FileExistsError as e:
+        parser.error(str(e))
+    stats = database.stats
+    for table, rows in stats['tables'].items():
+        print(f"  {table:<15} {rows:>6} rows")
+    print(f"{stats['statements']} statements ({stats['skipped_statements']} skipped), "
+          f"{len(stats['indexes'])} indexes, loaded in {stats['seconds'] * 1000:.0f} ms")
+    database.close()
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+import connections
+from sql_loader import load_dumps
+
+
+#  the dumps loaded into an in-memory SQLite stand-in once per run, with connections.py pointed at it
+@pytest.fixture(scope="session")
+def database():
+    database = load_dumps()
+    connections.configure_pool(connect=database.connect)
+    yield database
+    connections.pool.close_all()
+    database.close()
+
+
+@pytest.fixture(scope="session")
+def reference(database):
+    return connections.reference
+
+
+#  the views blueprint on a bare app, WebDev isn't a package so its directory goes on the path
+@pytest.fixture(scope="session")
+def client(database):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "WebDev"))
+    from flask import Flask
+    from views import views
+
+    app = Flask(__name__)
+    app.register_blueprint(views, url_prefix="/")
+    return app.test_client()
@@ -0,0 +1,165 @@
+import time
+
+import pytest
+
+from character_store import CharacterStore, store as character_store
+from connection_pool import ConnectionPool
+from sql_loader import StandInDatabase
+
+LEATHER, HIDE, PLATE, SHIELD = 2, 4, 13, 14
+
+
+#  an empty database of its own for each test, the items still come from the shared reference cache
+@pytest.fixture
+def pool(reference):
+    database = StandInDatabase()
+    pool = ConnectionPool(database.connect)
+    yield pool
+    pool.close_all()
+    database.close()
+
+
+@pytest.fixture
+def characters(pool):
+    store = CharacterStore(pool.connection, flush_interval=60)
+    yield store
+    store.close()
+
+
+def stored_rows(pool, query):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query)
+            return sorted(cursor.fetchall())
+        finally:
+            cursor.close()
+
+
+def test_best_armor_and_shield_follow_the_inventory(characters):
+    character = characters.create("Tordek", dex_modifier=3)["id"]
+    assert characters.get(character)["stats"]["ac"] == 13
+
+    assert characters.add_item(character, "armor_shields", LEATHER)["stats"]["ac"] == 14
+    assert characters.add_item(character, "armor_shields", PLATE)["stats"]["ac"] == 18
+    stats = characters.add_item(character, "armor_shields", SHIELD)["stats"]
+    assert (stats["ac"], stats["armor_id"], stats["shield_id"]) == (20, PLATE, SHIELD)
+    assert stats["weight_lb"] == 10 + 65 + 6
+
+    stats = characters.remove_item(character, "armor_shields", PLATE)["stats"]
+    assert (stats["ac"], stats["armor_id"]) == (16, LEATHER)
+    stats = characters.remove_item(character, "armor_shields", SHIELD)["stats"]
+    assert (stats["ac"], stats["shield_id"], stats["weight_lb"]) == (14, None, 10)
+
+
+def test_dex_changes_recompute_capped_armor(characters):
+    character = characters.create("Vex", dex_modifier=1)["id"]
+    assert characters.add_item(character, "armor_shields", HIDE)["stats"]["ac"] == 13
+    assert characters.update(character, dex_modifier=4)["stats"]["ac"] == 14
+
+
+def test_extra_copies_only_count_toward_weight(characters):
+    character = characters.create("Pack mule")["id"]
+    characters.add_item(character, "armor_shields", SHIELD, 2)
+    stats = characters.remove_item(character, "armor_shields", SHIELD)["stats"]
+    assert (stats["ac"], stats["weight_lb"]) == (12, 6)
+
+
+@pytest.mark.parametrize("table, item_id, quantity, error", [
+    ("monsters", 1, 1, ValueError),
+    ("weapons", 10 ** 6, 1, KeyError),
+    ("weapons", 3, -1, ValueError),
+    ("weapons", "abc", 1, ValueError),
+])
+def test_bad_changes_leave_the_character_alone(characters, table, item_id, quantity, error):
+    character = characters.create("Tordek")["id"]
+    before = characters.get(character)
+    with pytest.raises(error):
+        characters.add_item(character, table, item_id, quantity)
+    assert characters.get(character) == before
+
+
+def test_flush_writes_the_changes_in_one_go(characters, pool):
+    tordek = characters.create("Tordek")["id"]
+    vex = characters.create("Vex")["id"]
+    characters.add_item(tordek, "weapons", 3, 2)
+    characters.add_item(vex, "armor_shields", PLATE)
+    characters.add_coins(tordek, gp=5, sp=3)
+    assert characters.pending() == 4
+
+    assert characters.flush() == 4
+    assert characters.pending() == 0
+    assert stored_rows(pool, "SELECT id, name, gp, sp FROM characters") == [(tordek, "Tordek", 5, 3), (vex, "Vex", 0, 0)]
+    assert stored_rows(pool, "SELECT character_id, item_table, item_id, quantity FROM character_items") == [
+        (tordek, "weapons", 3, 2), (vex, "armor_shields", PLATE, 1)]
+
+    characters.remove_item(tordek, "weapons", 3, 2)
+    characters.delete(vex)
+    characters.flush()
+    assert stored_rows(pool, "SELECT id FROM characters") == [(tordek,)]
+    assert stored_rows(pool, "SELECT character_id FROM character_items") == []
+
+
+def test_a_new_store_loads_what_was_flushed(characters, pool):
+    character = characters.create("Tordek", dex_modifier=2)["id"]
+    characters.add_item(character, "armor_shields", PLATE)
+    characters.flush()
+
+    reloaded = CharacterStore(pool.connection)
+    try:
+        assert reloaded.get(character) == characters.get(character)
+        assert reloaded.create("Vex")["id"] == character + 1
+    finally:
+        reloaded.close()
+
+
+def test_failed_flush_keeps_the_changes(characters, pool):
+    character = characters.create("Tordek")["id"]
+    working = characters.connection
+
+    def broken():
+        raise ConnectionError("database went away")
+
+    characters.connection = broken
+    with pytest.raises(ConnectionError):
+        characters.flush()
+    assert characters.pending() == 1
+    assert characters.metrics["failed_flushes"] == 1
+
+    characters.connection = working
+    assert characters.flush() == 1
+    assert stored_rows(pool, "SELECT id FROM characters") == [(character,)]
+
+
+def test_a_full_batch_wakes_the_writer(pool):
+    store = CharacterStore(pool.connection, flush_interval=60, flush_batch=2)
+    try:
+        store.create("Tordek")
+        store.create("Vex")
+        deadline = time.monotonic() + 5
+        while store.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.pending() == 0
+        assert store.metrics["rows_written"] == 2
+    finally:
+        store.close()
+
+
+@pytest.fixture
+def shared_store(client):
+    yield character_store
+    character_store.reset()
+
+
+def test_character_item_id_is_validated(client, shared_store):
+    character = client.post("/api/characters", json={"name": "Tordek"}).get_json()["result"]
+    items = f"/api/characters/{character['id']}/items"
+
+    for body in ({"table": "weapons"}, {"table": "weapons", "id": "abc"}):
+        response = client.post(items, json=body)
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "id must be an integer."
+
+    response = client.post(items, json={"table": "weapons", "id": "3"})
+    assert response.status_code == 200
+    assert response.get_json()["result"]["quantity"] == 1
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from concurrent_lookup import merge_ranked, search_tables, search_tables_async
+from reference_cache import ReferenceTable
+from search_index import SearchIndex
+
+
+def test_merge_ranked_orders_by_score_then_table_then_rank():
+    outcomes = [
+        ("weapons", [(30, "longsword"), (10, "shortsword")]),
+        ("magic_items", [(30, "sword of wounding"), (20, "flame tongue")]),
+    ]
+    merged = merge_ranked(outcomes, limit=3)
+    assert [(entry["table"], entry["row"]) for entry in merged["results"]] == [
+        ("weapons", "longsword"), ("magic_items", "sword of wounding"), ("magic_items", "flame tongue"),
+    ]
+    assert merged["errors"] == {}
+
+
+def test_merge_ranked_reports_failed_tables():
+    merged = merge_ranked([("weapons", [(5, "club")]), ("consumables", TimeoutError()),
+                           ("spells", RuntimeError("spells failed to load"))])
+    assert [entry["row"] for entry in merged["results"]] == ["club"]
+    assert merged["errors"] == {"consumables": "TimeoutError", "spells": "spells failed to load"}
+
+
+def test_scores_do_not_depend_on_the_rest_of_the_table(reference):
+    #  ranked_matches scores database rows in an index over just the rows LIKE found
+    table = reference.table('weapons')
+    full = {row.id: score for score, row in reference.index('weapons').scored('sword', None)}
+    subset = ReferenceTable('weapons', table.columns, [row.as_tuple() for row in table.rows if row.id in full][::2])
+    partial = {row.id: score for score, row in SearchIndex(subset).scored('sword', None)}
+    assert partial and all(full[row_id] == score for row_id, score in partial.items())
+
+
+def test_search_tables_merges_every_table(reference):
+    merged = search_tables("fire", ("spells", "magic_items"), limit=5)
+    scores = [entry["score"] for entry in merged["results"]]
+    assert len(scores) == 5 and scores == sorted(scores, reverse=True)
+    assert asyncio.run(search_tables_async("fire", ("spells", "magic_items"), limit=5))["results"] == merged["results"]
+
+
+def test_search_route(client):
+    body = client.get("/api/search?searchInput=sword&tables=weapons,magic_items&limit=3").get_json()
+    assert len(body["results"]) == 3
+    assert {entry["table"] for entry in body["results"]} <= {"weapons", "magic_items"}
+
+
+@pytest.mark.parametrize("tables", ["potions", ["spells", 5], [["spells"]], [None], {"spells": 1}, 7])
+def test_search_route_refuses_bad_tables(client, tables):
+    response = client.get("/api/search", json={"searchInput": "fire", "tables": tables})
+    assert response.status_code == 400
+    assert "error" in response.get_json()
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=()):
+        if not self.connection.healthy:
+            raise OSError("server has gone away")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    opened = 0
+
+    def __init__(self):
+        FakeConnection.opened += 1
+        self.healthy = True
+        self.closed = False
+        self.rollbacks = 0
+        self.fail_rollback = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.fail_rollback:
+            raise OSError("lost connection")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_connections_are_reused():
+    pool = ConnectionPool(FakeConnection, size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert first.rollbacks == 2
+    assert pool.stats()["opened"] == 1
+
+
+def test_old_connections_are_recycled():
+    pool = ConnectionPool(FakeConnection, size=1, recycle=0.0)
+    with pool.connection() as first:
+        pass
+    time.sleep(0.001)
+    with pool.connection() as second:
+        pass
+    assert first is not second
+    assert first.closed
+    assert pool.stats()["recycled"] == 1
+
+
+def test_failed_health_check_opens_a_new_connection():
+    pool = ConnectionPool(FakeConnection, size=1, check_after=0.0)
+    with pool.connection() as first:
+        pass
+    first.healthy = False
+    time.sleep(0.001)
+    with pool.connection() as second:
+        pass
+    assert second is not first
+    assert first.closed
+    assert pool.stats()["failed_checks"] == 1
+
+
+def test_acquire_times_out_when_every_connection_is_out():
+    pool = ConnectionPool(FakeConnection, size=1)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+
+    #  a waiter gets the connection as soon as it comes back
+    threading.Timer(0.05, pool.release, args=(held,)).start()
+    assert pool.acquire(timeout=2) is held
+
+
+def test_connection_that_fails_rollback_is_discarded():
+    pool = ConnectionPool(FakeConnection, size=1)
+    connection = pool.acquire()
+    connection.fail_rollback = True
+    pool.release(connection)
+    assert connection.closed
+    assert pool.stats()["open"] == 0
+    assert pool.acquire() is not connection
+
+
+def test_double_and_foreign_releases_are_harmless():
+    pool = ConnectionPool(FakeConnection, size=1)
+    connection = pool.acquire()
+    pool.release(connection)
+    pool.release(connection)
+    stranger = FakeConnection()
+    pool.release(stranger)
+
+    assert not connection.closed
+    assert stranger.closed
+    stats = pool.stats()
+    assert stats["released"] == 1
+    assert stats["open"] == 1 and stats["idle"] == 1 and stats["in_use"] == 0
+
+
+def test_release_does_not_mask_the_original_error():
+    pool = ConnectionPool(FakeConnection, size=1)
+    connection = pool.acquire()
+    pool.release(connection)
+    with pytest.raises(ZeroDivisionError):
+        try:
+            1 / 0
+        finally:
+            pool.release(connection)
+
+
+def test_closed_pool_refuses_new_borrowers():
+    pool = ConnectionPool(FakeConnection, size=1)
+    with pool.connection():
+        pass
+    pool.close_all()
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.01)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from dice_batch import roll_batch, roll_dict
+
+
+def test_batch_is_reproducible():
+    first = roll_batch("3d6+1d4", repeat=1000, seed=42)["totals"]
+    second = roll_batch("3d6+1d4", repeat=1000, seed=42)["totals"]
+    assert np.array_equal(first, second)
+
+
+def test_totals_stay_in_range():
+    totals = roll_batch(["3d6+2", "1d20", "2d6-1d4"], repeat=20000, seed=3)["totals"]
+    assert totals.shape == (3, 20000)
+    assert totals[0].min() >= 5 and totals[0].max() <= 20
+    assert totals[1].min() == 1 and totals[1].max() == 20
+    assert totals[2].min() >= -2 and totals[2].max() <= 11
+
+
+def test_detail_rows_add_up():
+    batch = roll_batch("2d8+3", repeat=100, seed=9, detail=True)
+    for index in range(100):
+        roll = roll_dict(batch, index)
+        assert len(roll["rolls"]) == 2
+        assert roll["total"] == sum(roll["rolls"]) + 3
+
+
+def test_roll_dict_needs_detail():
+    with pytest.raises(ValueError):
+        roll_dict(roll_batch("1d6", repeat=3, seed=1))
+
+
+@pytest.mark.parametrize("repeat", [0, -1])
+def test_repeat_must_be_positive(repeat):
+    with pytest.raises(ValueError):
+        roll_batch("1d6", repeat=repeat)
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from dice_batch import roll_batch, roll_dict
+from dice_expr import compile_expression, parse
+from diceroller import roll_dice
+
+
+@pytest.mark.parametrize("text", [
+    "", "   ", "abc", "3", "1d", "d", "0d6", "1d1", "1d6+", "1d6 2d8", "1d6++2",
+    "4d6kh5", "4d6dl4", "4d6kh3kl1", "1d6r6", "1d6r0", "1d6r", "1d6r2ro1", "1d6+3 adv", "10001d6",
+])
+def test_invalid_expressions_raise_value_error(text):
+    with pytest.raises(ValueError):
+        parse(text)
+
+
+@pytest.mark.parametrize("value", [None, 3, ["1d6"], {"a": 1}, ("1d6",)])
+def test_non_string_input_is_a_value_error(value):
+    with pytest.raises(ValueError):
+        compile_expression(value)
+    assert "error" in roll_dice(value)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2d6+1d4+3", "2d6+1d4+3"),
+    ("d20", "1d20"),
+    ("d%", "1d100"),
+    ("4d6k3", "4d6kh3"),
+    ("4d6dl1", "4d6kh3"),
+    ("4d6dh1", "4d6kl3"),
+    ("2d6r2", "2d6r2"),
+    ("2d6ro2", "2d6ro2"),
+    ("1d6!", "1d6!"),
+    ("1d20+5 adv", "2d20kh1+5"),
+    ("1d20 dis", "2d20kl1"),
+    ("1d8 - 2", "1d8-2"),
+])
+def test_notation(text, expected):
+    assert repr(parse(text)) == expected
+
+
+def test_roll_shape_and_totals():
+    rng = random.Random(7)
+    compiled = compile_expression("4d6dl1+2")
+    for _ in range(200):
+        result = compiled.roll(rng)
+        assert len(result["rolls"]) == 3
+        assert len(result["dropped"]) == 1
+        assert min(result["rolls"]) >= result["dropped"][0]
+        assert result["total"] == sum(result["rolls"]) + 2
+
+
+def test_plain_rolls_have_no_dropped_field():
+    assert "dropped" not in compile_expression("3d6").roll(random.Random(1))
+
+
+def test_reroll_until_never_keeps_low_faces():
+    rng = random.Random(3)
+    compiled = compile_expression("1d6r2")
+    assert {compiled.roll(rng)["total"] for _ in range(2000)} == {3, 4, 5, 6}
+
+
+def test_reroll_once_can_keep_low_faces():
+    rng = random.Random(3)
+    compiled = compile_expression("1d6ro2")
+    assert {compiled.roll(rng)["total"] for _ in range(2000)} == {1, 2, 3, 4, 5, 6}
+
+
+def test_batch_detail_reports_dropped_dice():
+    batch = roll_batch(["4d6dl1", "2d8"], repeat=50, seed=5, detail=True)
+    for index in range(50):
+        kept = roll_dict(batch, index, expression=0)
+        assert len(kept["rolls"]) == 3 and len(kept["dropped"]) == 1
+        assert min(kept["rolls"]) >= kept["dropped"][0]
+        assert kept["total"] == sum(kept["rolls"])
+        assert "dropped" not in roll_dict(batch, index, expression=1)
+
+
+@pytest.mark.parametrize("body", [{"diceInput": ["1d6"]}, {"diceInput": {"a": 1}}])
+def test_rolling_dice_with_json_containers_is_an_error_not_a_500(client, body):
+    response = client.get("/api/rollingdice", json=body)
+    assert response.status_code == 200
+    assert "error" in response.get_json()["result"]
@@ -0,0 +1,89 @@
+import random
+
+import numpy as np
+import pytest
+
+from dice_batch import roll_batch
+from dice_expr import compile_expression
+from dice_stats import analyze_dice, distribution
+from diceroller import is_error, process_request
+
+SAMPLES = 200000
+#  the largest gap allowed between an exact probability and its sampled frequency
+TOLERANCE = 0.006
+
+
+def sampled_pmf(totals, odds):
+    counts = np.bincount(totals - odds.minimum, minlength=len(odds.pmf))
+    assert len(counts) == len(odds.pmf), "a sampled total fell outside the exact range"
+    return counts / len(totals)
+
+
+@pytest.mark.parametrize("text", [
+    "3d6", "2d20kh1", "2d20kl1", "4d6kh3", "4d6dl1", "5d8dh2", "1d20+5 adv", "1d20 dis",
+    "1d6!", "2d4!+1", "2d6r2", "2d6ro2", "1d8r1!", "2d6-1d4", "1d10+1d6r1+3",
+])
+def test_exact_pmf_matches_batch_simulation(text):
+    odds = distribution(text)
+    assert odds.pmf.sum() == pytest.approx(1.0, abs=1e-9)
+
+    totals = roll_batch(text, repeat=SAMPLES, seed=1)["totals"]
+    totals = np.clip(totals, odds.minimum, odds.maximum)
+    assert np.abs(sampled_pmf(totals, odds) - odds.pmf).max() < TOLERANCE
+    assert totals.mean() == pytest.approx(odds.mean, abs=0.05 * max(1.0, odds.std))
+
+
+@pytest.mark.parametrize("text", ["4d6kh3", "2d6r2", "2d6ro2", "1d6!", "1d20+2 adv"])
+def test_exact_pmf_matches_closure_rolls(text):
+    odds = distribution(text)
+    compiled = compile_expression(text)
+    rng = random.Random(11)
+    totals = np.array([compiled.roll(rng)["total"] for _ in range(50000)])
+    totals = np.clip(totals, odds.minimum, odds.maximum)
+    assert np.abs(sampled_pmf(totals, odds) - odds.pmf).max() < 0.012
+
+
+def test_known_values():
+    assert distribution("2d6").probability(7) == pytest.approx(6 / 36)
+    assert distribution("1d20 adv").mean == pytest.approx(13.825)
+    assert distribution("1d6r2").mean == pytest.approx(4.5)
+    assert distribution("1d6ro2").mean == pytest.approx(25 / 6)
+    assert distribution("8d6").at_least(48) == pytest.approx(6 ** -8)
+    assert distribution("8d6").at_least(49) == pytest.approx(0.0, abs=1e-12)
+
+
+def test_keep_with_reroll_is_refused():
+    with pytest.raises(ValueError):
+        distribution("4d6r1kh3")
+    assert "error" in analyze_dice("4d6r1kh3")
+
+
+def test_analyze_dice_reports_errors_for_non_strings():
+    assert "error" in analyze_dice(["2d6"])
+
+
+def test_analyze_dice_reports_the_whole_distribution():
+    odds = analyze_dice("8d6", at_least=30)
+    assert odds["min"] == 8 and odds["max"] == 48
+    assert odds["at_least"]["probability"] == pytest.approx(distribution("8d6").at_least(30))
+    assert [total for total, _ in odds["pmf"]] == list(range(8, 49))
+    assert sum(chance for _, chance in odds["pmf"]) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("at_least", ["30", 2.5, True])
+def test_at_least_must_be_a_whole_number(at_least):
+    assert "error" in analyze_dice("8d6", at_least=at_least)
+
+
+def test_odds_requests():
+    output = process_request({"input_type": "odds", "value": "2d6", "at_least": 7})
+    assert not is_error(output)
+    assert output["odds"]["at_least"]["probability"] == pytest.approx(21 / 36)
+    assert is_error(process_request({"input_type": "odds", "value": "2d"}))
+
+
+def test_odds_route(client):
+    result = client.get("/api/diceodds?diceInput=8d6&atLeast=30").get_json()["result"]
+    assert result["at_least"]["probability"] == pytest.approx(distribution("8d6").at_least(30))
+    assert "error" in client.get("/api/diceodds?diceInput=8x6").get_json()["result"]
+    assert client.get("/api/diceodds?diceInput=8d6&atLeast=lots").status_code == 400
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import diceroller
+from diceroller import process_batch_file, process_request, spell_key
+
+
+def test_batch_keeps_going_past_bad_lines(tmp_path, database):
+    lines = [
+        {"input_type": "manual", "value": "2d6+1"},
+        {"input_type": "manual", "value": {"a": 1}},
+        {"input_type": "spell", "value": {"a": 1}},
+        {"input_type": "spell", "value": "Fireball", "slot_level": "x"},
+        [1, 2],
+        {"input_type": "spell", "value": "Fireball", "slot_level": 5},
+    ]
+    source = tmp_path / "rolls.jsonl"
+    source.write_text("\n".join(json.dumps(line) for line in lines) + "\nnot json\n", encoding="utf-8")
+    output = tmp_path / "out.jsonl"
+
+    for workers in (1, 2):
+        stats = process_batch_file(str(source), str(output), workers=workers, chunk_size=3)
+        results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        assert len(results) == len(lines) + 1
+        assert stats["processed"] == len(results)
+        assert stats["errors"] == 5
+        assert results[0]["roll_result"]["total"] >= 3
+        assert results[5]["dice_expression"] == "10d6"
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n", encoding="utf-8")
+
+
+def test_failed_spell_lookup_is_one_error_per_line(tmp_path, database, monkeypatch):
+    calls = []
+
+    def lookup(spell_name, slot_level=None):
+        calls.append(spell_name)
+        if spell_name == "Fireball":
+            raise RuntimeError("spells table failed to load")
+        return "1d6"
+
+    monkeypatch.setattr(diceroller, "get_damage_formula_from_spell", lookup)
+    source, output = tmp_path / "rolls.jsonl", tmp_path / "out.jsonl"
+    write_lines(source, [
+        {"input_type": "spell", "value": "Fireball"},
+        {"input_type": "spell", "value": "Sleep"},
+        {"input_type": "spell", "value": "Fireball"},
+    ])
+
+    stats = process_batch_file(str(source), str(output))
+    results = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert stats["processed"] == 3 and stats["errors"] == 2
+    assert results[0] == results[2] == {"error": "spells table failed to load"}
+    assert results[1]["dice_expression"] == "1d6"
+    assert calls == ["Fireball", "Sleep"]
+
+
+@pytest.mark.parametrize("slot_level", [5, "5", 5.0])
+def test_spell_key_reads_slot_levels_like_spell_damage(slot_level):
+    assert spell_key({"input_type": "spell", "value": "Fireball", "slot_level": slot_level}) == ("Fireball", 5)
+
+
+def test_spell_key_leaves_bad_requests_to_the_worker():
+    assert spell_key({"input_type": "spell", "value": "Fireball", "slot_level": "x"}) is None
+    assert spell_key({"input_type": "spell", "value": ["Fireball"]}) is None
+    assert spell_key({"input_type": "manual", "value": "1d6"}) is None
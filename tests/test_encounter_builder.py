@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import encounter_builder
+from encounter_builder import MAX_BUDGET, build_encounters, encounter_index, multiplier, party_thresholds
+
+
+def test_party_thresholds_add_up():
+    assert party_thresholds([5, 5, 5, 5]) == {"easy": 1000, "medium": 2000, "hard": 3000, "deadly": 4400}
+    with pytest.raises(ValueError):
+        party_thresholds([21])
+    with pytest.raises(ValueError):
+        party_thresholds([20] * 13)
+
+
+@pytest.mark.parametrize("monsters, party_size, expected", [
+    (1, 4, 1.0), (2, 4, 1.5), (6, 4, 2.0), (15, 4, 4.0), (1, 2, 1.5), (1, 6, 0.5), (15, 2, 5.0),
+])
+def test_group_multiplier(monsters, party_size, expected):
+    assert multiplier(monsters, party_size) == expected
+
+
+def test_encounters_fit_the_budget(database):
+    result = build_encounters([5, 5, 5, 5], "hard", limit=50)
+    assert result["complete"] and result["encounters"]
+    for group in result["encounters"]:
+        assert result["budget"] * 0.5 <= group["adjusted_xp"] <= result["budget"]
+        assert group["count"] == sum(monster["count"] for monster in group["monsters"])
+    adjusted = [group["adjusted_xp"] for group in result["encounters"]]
+    assert adjusted == sorted(adjusted, reverse=True)
+
+
+def test_node_cap_stops_the_search(database, monkeypatch):
+    monkeypatch.setattr(encounter_builder, "MAX_NODES", 1000)
+    index = encounter_index()
+    found, complete = index.patterns(index.candidates(), 10 ** 9, 10 ** 8, max_monsters=20, max_kinds=5)
+    assert not complete and found == []
+
+
+def test_oversized_budget_returns_quickly(client):
+    start = time.perf_counter()
+    response = client.post("/api/encounters", json={"budget": 1e9, "max_monsters": 20, "max_kinds": 5})
+    assert time.perf_counter() - start < 10
+    assert response.status_code == 200
+    assert response.get_json()["result"]["budget"] == MAX_BUDGET
+
+
+@pytest.mark.parametrize("body", ['{"budget": "lots"}', '{"budget": Infinity}'])
+def test_bad_budgets_are_400s(client, body):
+    assert client.post("/api/encounters", data=body, content_type="application/json").status_code == 400
+
+
+def test_encounter_types_accept_a_single_name(client):
+    single = client.post("/api/encounters", json={"party": [5, 5, 5, 5], "difficulty": "hard", "types": "undead"})
+    listed = client.post("/api/encounters", json={"party": [5, 5, 5, 5], "difficulty": "hard", "types": ["undead"]})
+    assert single.status_code == 200
+    assert single.get_json()["result"]["encounters"]
+    assert single.get_json()["result"]["patterns"] == listed.get_json()["result"]["patterns"]
+    assert client.post("/api/encounters", json={"party": [5], "difficulty": "hard", "types": 5}).status_code == 400
@@ -0,0 +1,69 @@
+import pytest
+
+from connections import find_by_name, monster_attacks
+from encounter_sim import MAX_ATTACKS, MAX_MONSTERS, MAX_PARTY_SIZE, build_monsters, party_member, simulate
+
+FIGHTER = {"name": "Fighter", "hp": 44, "ac": 18, "attack_bonus": 7, "damage": "1d8+4", "attacks": 2}
+
+
+def goblins(count):
+    return build_monsters([{"name": "Goblin", "count": count}], lambda name: find_by_name('monsters', name),
+                          monster_attacks)
+
+
+def test_simulation_is_reproducible(database):
+    party = [party_member(FIGHTER)] * 2
+    first = simulate(party, goblins(3), combats=500, seed=4)
+    second = simulate(party, goblins(3), combats=500, seed=4)
+    assert first["combats"] == 500
+    assert first["win_rate"] == second["win_rate"]
+    assert 0.0 <= first["win_rate"] <= 1.0
+
+
+def test_monsters_are_found_by_exact_name(reference):
+    assert find_by_name('monsters', '  goblin ').name == 'Goblin'
+    assert find_by_name('monsters', 'dragon') is None
+    with pytest.raises(ValueError, match="not found"):
+        build_monsters([{"name": "dragon"}], lambda name: find_by_name('monsters', name))
+
+
+@pytest.mark.parametrize("count", [0, MAX_MONSTERS + 1])
+def test_monster_count_is_capped(database, count):
+    with pytest.raises(ValueError):
+        goblins(count)
+
+
+def test_simulate_refuses_oversized_sides(database):
+    with pytest.raises(ValueError):
+        simulate([party_member(FIGHTER)] * (MAX_PARTY_SIZE + 1), goblins(1), combats=10)
+    with pytest.raises(ValueError):
+        simulate([party_member(FIGHTER)], goblins(1) * (MAX_MONSTERS + 1), combats=10)
+    with pytest.raises(ValueError):
+        simulate([party_member(FIGHTER)], goblins(1), combats=0)
+
+
+@pytest.mark.parametrize("change", [{"attacks": MAX_ATTACKS + 1}, {"hp": 0}, {"damage": "1d"}])
+def test_bad_party_members_are_refused(change):
+    with pytest.raises(ValueError):
+        party_member(dict(FIGHTER, **change))
+
+
+def test_simulate_needs_exact_monster_names(client):
+    response = client.post("/api/simulate", json={"party": [FIGHTER], "monsters": [{"name": "dragon"}]})
+    assert response.status_code == 400
+    assert "Dragon Turtle" in response.get_json()["error"]
+
+    response = client.post("/api/simulate", json={"party": [FIGHTER], "monsters": [{"name": "goblin", "count": 3}],
+                                                  "combats": 200, "seed": 1})
+    assert response.status_code == 200
+    assert response.get_json()["result"]["combats"] == 200
+
+
+@pytest.mark.parametrize("body", [
+    {"party": [FIGHTER], "monsters": [{"name": "Goblin", "count": 10 ** 7}]},
+    {"party": [FIGHTER], "monsters": [{"name": "Goblin", "count": 30}, {"name": "Ogre", "count": 30}]},
+    {"party": [FIGHTER] * 13, "monsters": [{"name": "Goblin"}]},
+    {"party": [dict(FIGHTER, attacks=1000)], "monsters": [{"name": "Goblin"}]},
+])
+def test_simulate_caps_are_400s(client, body):
+    assert client.post("/api/simulate", json=body).status_code == 400
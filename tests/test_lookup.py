@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+
+def walk_pages(client, path, page_size):
+    seen, after = [], None
+    while True:
+        url = f"{path}&page_size={page_size}" + (f"&after={after}" if after is not None else "")
+        body = client.get(url).get_json()
+        seen.extend(row["id"] for row in body["results"])
+        if body["next"] is None:
+            return seen
+        after = body["next"]
+
+
+def test_pages_walk_every_match(reference):
+    expected = [row.id for row in reference.iter_matching('spells', 'fire')]
+    assert expected
+    seen, after = [], None
+    while True:
+        page = list(reference.iter_matching('spells', 'fire', after))[:7]
+        if not page:
+            break
+        seen.extend(row.id for row in page)
+        after = page[-1].id
+    assert seen == expected
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 500])
+def test_paged_route_returns_every_match_once(client, reference, page_size):
+    expected = [row.id for row in reference.iter_matching('spells', 'fire')]
+    assert walk_pages(client, "/api/spelldata?spellInput=fire", page_size) == expected
+
+
+def test_streamed_route_is_one_row_per_line(client, reference):
+    response = client.get("/api/monsterdata?monsterInput=dragon&stream=1")
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row["id"] for row in rows] == [row.id for row in reference.iter_matching('monsters', 'dragon')]
+
+
+@pytest.mark.parametrize("query", ["after=abc", "page_size=1.5"])
+def test_bad_page_arguments_are_400s(client, query):
+    assert client.get(f"/api/weapondata?weaponInput=sword&{query}").status_code == 400
+
+
+def test_single_lookup_result_is_a_row_array(client):
+    response = client.get("/api/spelldata?spellInput=Fireball")
+    result = response.get_json()["result"]
+    assert isinstance(result, list)
+    assert result[1] == "Fireball"
+
+
+def test_lookup_etag_answers_304(client):
+    response = client.get("/api/spelldata?spellInput=Fireball")
+    etag = response.headers["ETag"]
+    assert response.cache_control.max_age > 0
+
+    cached = client.get("/api/spelldata?spellInput=Fireball", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.get_data() == b""
+    #  the tag covers what was asked for, another query gets its own
+    other = client.get("/api/spelldata?spellInput=Sleep", headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["ETag"] != etag
+
+
+def test_lookup_of_a_table_that_fails_to_load_is_not_a_500(client, reference, monkeypatch):
+    def broken(name):
+        raise ConnectionError("database went away")
+
+    monkeypatch.setattr(reference, "load_table", broken)
+    reference.invalidate("spells")
+    response = client.get("/api/spelldata?spellInput=Fireball")
+    assert response.status_code == 200
+    assert response.get_json() == {"result": None}
+    assert "ETag" not in response.headers
@@ -0,0 +1,88 @@
+import threading
+
+from reference_cache import LRUCache, ReferenceCache
+
+
+def test_lru_evicts_the_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert len(cache) == 2
+
+
+def versioned_loader(version, calls):
+    def load_table(name):
+        calls.append(name)
+        return ('id', 'name'), [(1, f'{name} v{version[0]}'), (2, 'other')]
+    return load_table
+
+
+def test_tables_load_once_and_reload_after_invalidate():
+    version, calls = [1], []
+    cache = ReferenceCache(versioned_loader(version, calls), tables=('t', 'u'))
+    assert cache.table('t') is cache.table('t')
+    assert cache.search('t', 't v1', 1)[0].id == 1
+    assert calls == ['t']
+
+    version[0] = 2
+    cache.invalidate('t')
+    assert len(cache.results) == 0
+    assert cache.search('t', 't v2', 1)[0].name == 't v2'
+    assert cache.search('t', 't v1', 1) == ()
+
+    cache.table('u')
+    cache.reload()
+    assert sorted(calls) == ['t', 't', 't', 'u', 'u']
+
+
+def test_unknown_tables_are_refused():
+    cache = ReferenceCache(versioned_loader([1], []), tables=('t',))
+    try:
+        cache.table('nope')
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("expected KeyError")
+
+
+def test_load_racing_an_invalidate_is_not_published():
+    version = [1]
+    started = threading.Event()
+    release = threading.Event()
+
+    def load_table(name):
+        loaded_version = version[0]
+        if loaded_version == 1:
+            started.set()
+            release.wait(5)
+        return ('id', 'name'), [(1, f'v{loaded_version}')]
+
+    cache = ReferenceCache(load_table, tables=('t',))
+    loader = threading.Thread(target=cache.table, args=('t',))
+    loader.start()
+    assert started.wait(5)
+
+    version[0] = 2
+    cache.invalidate('t')
+    release.set()
+    loader.join(5)
+
+    assert cache.table('t').rows[0].name == 'v2'
+    assert cache.search('t', 'v2', 1)[0].name == 'v2'
+
+
+def test_result_computed_across_an_invalidate_is_not_cached():
+    cache = ReferenceCache(versioned_loader([1], []), tables=('t',))
+    cache.table('t')
+
+    def compute():
+        cache.invalidate()
+        return ('stale',)
+
+    assert cache._cached(('search', 't', 'x', 1), compute) == ('stale',)
+    assert len(cache.results) == 0
@@ -0,0 +1,66 @@
+import math
+
+import pytest
+
+from connections import filter_reference
+from reference_etl import (multiattack_count, parse_armor_class, parse_attacks, parse_cost, parse_minutes,
+                           parse_proficiencies, parse_weight)
+
+
+@pytest.mark.parametrize("text, expected", [("50 gp", 50.0), ("5 sp", 0.5), ("1,500 gp", 1500.0), ("2 pp", 20.0)])
+def test_parse_cost(text, expected):
+    assert parse_cost(text) == pytest.approx(expected)
+
+
+def test_unreadable_text_is_nan():
+    assert math.isnan(parse_cost("priceless"))
+    assert math.isnan(parse_weight("-"))
+    assert math.isnan(parse_minutes(None))
+
+
+def test_parse_weight_and_minutes():
+    assert parse_weight("3 lb.") == 3.0
+    assert parse_weight("1/4 lb") == 0.25
+    assert parse_minutes("1 action") == pytest.approx(0.1)
+    assert parse_minutes("10 minutes") == 10.0
+
+
+def test_parse_armor_class():
+    assert parse_armor_class("13 + Dex Modifier (max 2)") == (13, 0, True, 2.0)
+    base, bonus, dex, dex_max = parse_armor_class("+2")
+    assert (base, bonus, dex) == (0, 2, False) and math.isnan(dex_max)
+
+
+def test_parse_monster_actions():
+    actions = ("Multiattack: The ogre makes two greatclub attacks.; "
+               "Greatclub: Melee Weapon Attack: +6 to hit, reach 5 ft., one target. Hit: 13 (2d8 + 4) bludgeoning damage.")
+    assert multiattack_count(actions) == 2
+    attack, = parse_attacks(actions)
+    assert attack["to_hit"] == 6 and attack["damage"] == "2d8+4"
+
+
+def test_parse_proficiencies():
+    assert parse_proficiencies("Saving Throw: CON, Saving Throw: int, Skill: History") == (("CON", "INT"), ("History",))
+
+
+def test_filter_reference_matches_the_text_columns(reference):
+    rows = filter_reference('weapons', [('cost_gp', '<', 5), ('weight_lb', '<=', 2)])
+    assert rows
+    for row in rows:
+        assert parse_cost(row.cost) < 5 and parse_weight(row.weight) <= 2
+
+    table = reference.table('weapons')
+    everything = [row for row in table.rows if parse_cost(row.cost) < 5 and parse_weight(row.weight) <= 2]
+    assert [row.id for row in rows] == [row.id for row in everything]
+
+
+def test_filter_reference_on_monsters(reference):
+    rows = filter_reference('monsters', [('challenge_rating', '>=', 20)])
+    assert rows and all(float(row.challenge_rating) >= 20 for row in rows)
+
+
+def test_filter_reference_refuses_unknown_columns_and_operators(reference):
+    with pytest.raises(KeyError):
+        filter_reference('weapons', [('colour', '=', 'red')])
+    with pytest.raises(ValueError):
+        filter_reference('weapons', [('cost_gp', '~', 5)])
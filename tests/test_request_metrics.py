@@ -0,0 +1,71 @@
+import pytest
+
+from request_metrics import BUCKETS, Histogram, Metrics
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(0.5) == 0.0
+    assert histogram.summary()["count"] == 0
+
+
+def test_percentiles_fall_in_the_right_bucket():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.observe(0.0008)
+    for _ in range(10):
+        histogram.observe(0.2)
+
+    assert 0.0005 < histogram.percentile(0.5) <= 0.001
+    assert 0.1 < histogram.percentile(0.99) <= 0.2
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["max"] == 0.2
+    assert summary["mean"] == pytest.approx((90 * 0.0008 + 10 * 0.2) / 100)
+
+
+def test_percentile_never_passes_the_maximum():
+    histogram = Histogram()
+    histogram.observe(30.0)
+    assert BUCKETS[-1] < histogram.percentile(0.99) <= 30.0
+    histogram = Histogram()
+    histogram.observe(0.0011)
+    assert histogram.percentile(1.0) == pytest.approx(0.0011)
+
+
+def test_labels_get_their_own_histogram():
+    metrics = Metrics()
+    with metrics.timed("db_query", table="spells"):
+        pass
+    metrics.observe("db_query", 0.01, table="monsters")
+    metrics.observe("db_query", 0.02, table="monsters")
+
+    entries = {entry["labels"]["table"]: entry["count"] for entry in metrics.snapshot()["db_query"]}
+    assert entries == {"spells": 1, "monsters": 2}
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = Metrics()
+    metrics.observe("request", 0.003, endpoint="views.roll", status=200)
+    metrics.observe("request", 20.0, endpoint="views.roll", status=200)
+    lines = metrics.prometheus().splitlines()
+
+    assert lines[0] == "# TYPE dnd_request_seconds histogram"
+    buckets = [line for line in lines if line.startswith("dnd_request_seconds_bucket")]
+    assert len(buckets) == len(BUCKETS) + 1
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts) and counts[-1] == 2
+    assert 'dnd_request_seconds_bucket{endpoint="views.roll",status="200",le="+Inf"} 2' in lines
+    assert 'dnd_request_seconds_count{endpoint="views.roll",status="200"} 2' in lines
+
+
+def test_metrics_routes(client):
+    client.get("/api/rollingdice?diceInput=2d6")
+
+    text = client.get("/metrics")
+    assert text.mimetype == "text/plain"
+    assert 'endpoint="views.roll"' in text.get_data(as_text=True)
+
+    body = client.get("/metrics?format=json").get_json()
+    assert any(entry["labels"]["endpoint"] == "views.roll" for entry in body["phases"]["request"])
+    assert "pool" in body and "reference" in body
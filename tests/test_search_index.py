@@ -0,0 +1,80 @@
+import pytest
+
+from reference_cache import REFERENCE_TABLES, ReferenceTable
+from search_index import TOKEN, SearchIndex, normalize
+
+
+def _words(row, columns):
+    words = set()
+    for column in columns:
+        value = getattr(row, column)
+        if value is None:
+            continue
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        words.update(TOKEN.findall(str(value).lower()))
+    return words
+
+
+#  what matching_indexes promises, worked out the slow way: every word in some column,
+#  the last one allowed to be a prefix, or the whole query inside the name
+def brute_force(index, query):
+    text = normalize(query)
+    words = TOKEN.findall(text)
+    table = index.table
+    matches = []
+    for position, row in enumerate(table.rows):
+        row_words = _words(row, table.columns)
+        found = all(word in row_words for word in words[:-1])
+        found = found and any(candidate.startswith(words[-1]) for candidate in row_words) if words else False
+        if found or text in index.lower_names[position]:
+            matches.append(position)
+    return matches
+
+
+@pytest.mark.parametrize("table", REFERENCE_TABLES)
+@pytest.mark.parametrize("query", ["s", "a", "fi", "sword", "fire b", "of", "1", "dragon"])
+def test_matching_indexes_is_complete(reference, table, query):
+    index = reference.index(table)
+    assert index.matching_indexes(query) == brute_force(index, query)
+
+
+def test_short_prefix_is_not_truncated(reference):
+    #  "s" expands to several hundred words in magic_items, every matching row has to come back
+    index = reference.index('magic_items')
+    assert len(index.matching_indexes('s')) == len(brute_force(index, 's'))
+    rows = list(reference.iter_matching('magic_items', 's'))
+    assert len(rows) == len(brute_force(index, 's'))
+
+
+def test_exact_name_ranks_first(reference):
+    assert reference.search('spells', 'fireball', 1)[0].name == 'Fireball'
+    assert reference.search('monsters', 'Goblin', 3)[0].name == 'Goblin'
+
+
+def test_scores_are_best_first(reference):
+    scored = reference.scored_search('weapons', 'sword', 10)
+    scores = [score for score, _ in scored]
+    assert scores == sorted(scores, reverse=True)
+    assert all('sword' in row.name.lower() for _, row in scored)
+
+
+def test_ranked_search_sees_the_whole_prefix_expansion():
+    #  300 filler words starting with "s" sort ahead of the only name that has one
+    rows = [(position, "red", f"s{position:03d}") for position in range(300)]
+    rows.append((300, "szzz red", ""))
+    index = SearchIndex(ReferenceTable('words', ('id', 'name', 'note'), rows))
+
+    assert index.search('red s', 1)[0].name == 'szzz red'
+    ranked = [row.id for _, row in index.scored('red s', None)]
+    assert ranked[0] == 300
+    assert sorted(ranked) == index.matching_indexes('red s')
+
+
+@pytest.mark.parametrize("table", REFERENCE_TABLES)
+@pytest.mark.parametrize("query", ["s", "c", "fire b"])
+def test_ranked_and_matching_agree(reference, table, query):
+    index = reference.index(table)
+    ranked = index.scored(query, None)
+    assert sorted(index.table.position(row.id) for _, row in ranked) == index.matching_indexes(query)
+    assert [row.id for _, row in index.scored(query, 5)] == [row.id for _, row in ranked[:5]]
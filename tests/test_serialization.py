@@ -0,0 +1,93 @@
+import gzip
+import json
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+import serialization
+from serialization import dumps, table_version
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+def test_non_finite_numbers_are_null(backend):
+    value = {"a": float("nan"), "b": [float("inf"), 1.5], "c": np.float64("-inf"), "d": Decimal("NaN"), "e": (2, "é")}
+    assert json.loads(dumps(value)) == {"a": None, "b": [None, 1.5], "c": None, "d": None, "e": [2, "é"]}
+
+
+def test_both_backends_encode_the_tables_the_same(reference, monkeypatch):
+    pytest.importorskip("orjson")
+    for name in reference.tables:
+        table = reference.table(name)
+        rows = [dumps(row.as_tuple()) for row in table.rows]
+        with monkeypatch.context() as patched:
+            patched.setattr(serialization, "orjson", None)
+            assert [dumps(row.as_tuple()) for row in table.rows] == rows
+
+
+def test_version_only_changes_with_the_rows(reference):
+    table = reference.table("weapons")
+    version = table_version(table)
+    assert table_version(table) == version
+    reference.invalidate("weapons")
+    assert table_version(reference.table("weapons")) == version
+
+
+def test_snapshot_versions(client, reference):
+    response = client.get("/api/snapshot")
+    assert response.cache_control.no_cache
+    versions = response.get_json()["tables"]
+    assert set(versions) == set(reference.tables)
+    assert versions["spells"] == table_version(reference.table("spells"))
+
+
+def test_snapshot_holds_every_row(client, reference):
+    body = client.get("/api/snapshot/spells").get_json()
+    table = reference.table("spells")
+    assert body["columns"] == list(table.columns)
+    assert [row[0] for row in body["rows"]] == [row.id for row in table.rows]
+
+
+def test_versioned_snapshot_is_cached_for_good(client):
+    version = client.get("/api/snapshot").get_json()["tables"]["monsters"]
+    response = client.get(f"/api/snapshot/monsters?v={version}")
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 31536000
+    assert client.get(f"/api/snapshot/monsters?v={version}", headers={"If-None-Match": f'W/"{version}"'}).status_code == 304
+    assert client.get("/api/snapshot/potions").status_code == 404
+
+
+def test_snapshot_is_gzipped_when_asked(client):
+    plain = client.get("/api/snapshot/monsters")
+    zipped = client.get("/api/snapshot/monsters", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in zipped.headers["Vary"]
+    assert gzip.decompress(zipped.get_data()) == plain.get_data()
+    assert len(zipped.get_data()) < len(plain.get_data())
+
+
+def test_brotli_is_preferred_when_installed(client):
+    brotli = pytest.importorskip("brotli")
+    response = client.get("/api/snapshot/spells", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(response.get_data()))["table"] == "spells"
+
+
+def test_big_responses_are_compressed_small_ones_are_not(client):
+    page = client.get("/api/monsterdata?monsterInput=dragon&page_size=50", headers={"Accept-Encoding": "gzip"})
+    assert page.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(page.get_data()))["results"]
+
+    small = client.get("/api/rollingdice?diceInput=1d6", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert "total" in small.get_json()["result"]
+
+    assert "Content-Encoding" not in client.get("/api/monsterdata?monsterInput=dragon&page_size=50").headers
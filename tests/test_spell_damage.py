@@ -0,0 +1,59 @@
+import pytest
+
+from diceroller import process_request
+from spell_damage import damage_formula, resolver
+
+
+def spell(name):
+    return resolver().get(name)
+
+
+@pytest.mark.parametrize("name, expected, types", [
+    ("Fireball", "8d6", ("fire",)),
+    ("Flame Strike", "8d6", ("fire", "radiant")),
+    ("Ice Storm", "2d8+4d6", ("bludgeoning", "cold")),
+    ("Meteor Swarm", "40d6", ("fire", "bludgeoning")),
+    ("Acid Arrow", "6d4", ("acid", "acid")),
+    ("Magic Missile", "1d4+1", ("force",)),
+    ("Fire Bolt", "1d10", ("fire",)),
+])
+def test_every_damage_clause_in_the_sentence_counts(database, name, expected, types):
+    assert damage_formula(name) == expected
+    assert spell(name).damage_types == types
+
+
+@pytest.mark.parametrize("name, slot_level, expected", [
+    ("Fireball", 5, "10d6"),
+    ("Flame Strike", 7, "10d6"),
+    ("Ice Storm", 6, "4d8+4d6"),
+    ("Meteor Swarm", 9, "40d6"),
+])
+def test_slot_scaling_adds_to_the_matching_dice(database, name, slot_level, expected):
+    assert damage_formula(name, slot_level) == expected
+
+
+def test_cantrips_in_this_dump_keep_their_base_dice(database):
+    #  the dump's cantrip rows don't describe how their damage scales
+    assert damage_formula("Fire Bolt", character_level=11) == "1d10"
+    assert spell("Fire Bolt").by_slot() == {0: "1d10"}
+    with pytest.raises(ValueError, match="character_level"):
+        damage_formula("Fire Bolt", character_level=21)
+
+
+def test_spell_request_rolls_the_whole_formula(database):
+    result = process_request({"input_type": "spell", "value": "Meteor Swarm"})
+    assert result["dice_expression"] == "40d6"
+    assert len(result["roll_result"]["rolls"]) == 40
+
+
+@pytest.mark.parametrize("slot_level, expected", [(3, "8d6"), ("5", "10d6"), (9.0, "14d6")])
+def test_slot_level_accepts_numbers_and_numeric_strings(database, slot_level, expected):
+    assert damage_formula("Fireball", slot_level) == expected
+
+
+@pytest.mark.parametrize("slot_level", ["x", 2, 10, 4.5, [5]])
+def test_bad_slot_level_is_explained(database, slot_level):
+    with pytest.raises(ValueError, match="slot_level must be an integer between 3 and 9"):
+        damage_formula("Fireball", slot_level)
+    result = process_request({"input_type": "spell", "value": "Fireball", "slot_level": slot_level})
+    assert "slot_level must be an integer" in result["error"]
@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+from sql_loader import iter_rows, iter_statements, load_dumps, translate_create_table, translate_query
+
+#  rows per table in the dumps shipped with the repo
+EXPECTED_ROWS = {
+    'monsters': 334,
+    'spells': 319,
+    'magic_items': 362,
+    'armor_shields': 14,
+    'weapons': 51,
+    'equipment': 112,
+    'consumables': 0,
+}
+
+
+def test_row_counts(database):
+    assert database.stats['tables'] == EXPECTED_ROWS
+    connection = database.connect()
+    cursor = connection.cursor()
+    try:
+        for table, rows in EXPECTED_ROWS.items():
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+            assert cursor.fetchone()[0] == rows
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def test_indexes_created(database):
+    assert 'monsters.name' in database.stats['indexes']
+    assert 'spells.level' in database.stats['indexes']
+
+
+def test_placeholders_are_translated(database):
+    connection = database.connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT name FROM spells WHERE name LIKE %s ORDER BY id", ("fireball",))
+        assert cursor.fetchall() == [("Fireball",)]
+    finally:
+        cursor.close()
+        connection.close()
+    assert translate_query("a = %s AND b LIKE '100%%'") == "a = ? AND b LIKE '100%'"
+
+
+def test_statements_split_on_quotes_and_comments(tmp_path):
+    dump = tmp_path / "dump.sql"
+    dump.write_text(
+        "-- a comment; with a semicolon\n"
+        "CREATE TABLE `t` (`id` int NOT NULL AUTO_INCREMENT, `name` varchar(20), PRIMARY KEY (`id`)) ENGINE=InnoDB;\n"
+        "INSERT INTO `t` VALUES (1,'it''s; fine'),(2,'back\\\\slash'),(3,NULL);\n",
+        encoding="utf-8",
+    )
+    with open(dump, encoding="utf-8") as handle:
+        statements = list(iter_statements(handle))
+    assert len(statements) == 2
+
+    name, ddl = translate_create_table(statements[0])
+    assert name == 't'
+    sqlite3.connect(':memory:').execute(ddl)
+
+    start = statements[1].index('VALUES') + len('VALUES')
+    assert list(iter_rows(statements[1], start)) == [(1, "it's; fine"), (2, "back\\slash"), (3, None)]
+
+
+def test_existing_output_file_is_refused(tmp_path):
+    path = str(tmp_path / "dnd.db")
+    load_dumps(path=path).close()
+    with pytest.raises(FileExistsError):
+        load_dumps(path=path)
+
+    database = load_dumps(path=path, replace=True)
+    assert database.stats['tables'] == EXPECTED_ROWS
+    database.close()